@@ -1,69 +1,38 @@
 
 from __future__ import annotations
-import logging
+import asyncio, logging
 from homeassistant.core import HomeAssistant, ServiceCall
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform, CONF_HOST, CONF_PORT
+from homeassistant.exceptions import ConfigEntryError
+from homeassistant.helpers.storage import STORAGE_DIR, Store
 from .const import (
     DOMAIN, CONF_UNIT_ID, CONF_SCAN_INTERVAL, DEFAULT_SCAN_SECONDS,
     DEFAULT_PORT, DEFAULT_UNIT_ID, CONF_MAPPING_PATH,
     CONF_TRANSPORT, DEFAULT_TRANSPORT, CONF_BAUDRATE, DEFAULT_BAUDRATE, CONF_BYTESIZE, DEFAULT_BYTESIZE,
     CONF_PARITY, DEFAULT_PARITY, CONF_STOPBITS, DEFAULT_STOPBITS,
     CONF_ADDR_OFFSET, DEFAULT_ADDR_OFFSET, MIN_SCAN_SECONDS, MAX_SCAN_SECONDS,
+    CONF_MAX_READ_REGISTERS, DEFAULT_MAX_READ_REGISTERS, CONF_PIPELINE_DEPTH, DEFAULT_PIPELINE_DEPTH,
+    CONF_HOLD_RESYNC, DEFAULT_HOLD_RESYNC_SECONDS, CONF_VERIFY_WRITES, DEFAULT_VERIFY_WRITES,
+    STORAGE_VERSION, STORAGE_KEY,
+    CONF_RAW_LOG, DEFAULT_RAW_LOG, CONF_RAW_LOG_MAX_MB, DEFAULT_RAW_LOG_MAX_MB, RAW_LOG_KEEP, CONF_EXTRA_UNITS,
+    CONF_MAX_WRITE_LATENCY, DEFAULT_MAX_WRITE_LATENCY_MS,
+    CONF_IMPORT_STATISTICS, DEFAULT_IMPORT_STATISTICS, AGGREGATE_BIN_SECONDS, CONF_STATE_INTERVAL, DEFAULT_STATE_INTERVAL,
+    CONF_METRICS_ENDPOINT, DEFAULT_METRICS_ENDPOINT, CONF_NATIVE_READS, DEFAULT_NATIVE_READS,
 )
-from .coordinator import GrowattModbusCoordinator, RegisterDef
-from .mapping import load_register_mapping
+from .aggregate import RingAggregator
+from .coordinator import GrowattModbusCoordinator
+from .device_helper import parse_extra_units
+from .exporter import register_view
+from .mapping import MappingError, load_compiled_mapping
+from .rawlog import RawRecorder
 _LOGGER = logging.getLogger(__name__)
-PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.SWITCH, Platform.SELECT, Platform.NUMBER]
+PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.BINARY_SENSOR, Platform.SWITCH, Platform.SELECT, Platform.NUMBER]
 
 async def async_setup(hass, config):
     """Allow discovery/config-flow only setup."""
     return True
 
-def _ensure_uid(base: str | None, prefix: str, address: int) -> str:
-    base = (base or "").strip()
-    return base if base else f"{prefix}_{address}"
-
-def _auto_inject_readbacks(sensors: list[dict], controls: list[dict]) -> tuple[list[dict], list[dict]]:
-    for s in sensors:
-        s["unique_id"] = _ensure_uid(s.get("unique_id"), "s", int(s.get("address", 0)))
-    sensor_uids = {s["unique_id"] for s in sensors}
-    for c in controls:
-        addr = c.get("address", c.get("base_address", 0))
-        c["unique_id"] = _ensure_uid(c.get("unique_id"), c.get("type","c"), int(addr))
-        rtype = c.get("register_type", "holding")
-        if c.get("type") == "select32":
-            rb_uid = c.get("read_unique_id") or f"rb_{c['unique_id']}"
-            if rb_uid not in sensor_uids:
-                sensors.append({
-                    "name": f"RB {c.get('name', c['unique_id'])}",
-                    "unique_id": rb_uid,
-                    "register_type": "holding",
-                    "address": int(c["base_address"]),
-                    "count": 2,
-                    "scale": 1.0
-                })
-                sensor_uids.add(rb_uid)
-            c["read_unique_id"] = rb_uid
-            continue
-        if rtype != "holding" or not addr:
-            continue
-        if not c.get("read_unique_id"):
-            rb_uid = f"rb_{c['unique_id']}"
-            if rb_uid not in sensor_uids:
-                sensors.append({
-                    "name": f"RB {c.get('name', c['unique_id'])}",
-                    "unique_id": rb_uid,
-                    "register_type": "holding",
-                    "address": int(addr),
-                    "count": 1,
-                    "scale": 1.0
-                })
-                sensor_uids.add(rb_uid)
-            c["read_unique_id"] = rb_uid
-            c.setdefault("read_factor", 1.0)
-    return sensors, controls
-
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     host = entry.data[CONF_HOST]
     port = entry.data.get(CONF_PORT, DEFAULT_PORT)
@@ -73,55 +42,169 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     transport = entry.options.get(CONF_TRANSPORT, entry.data.get(CONF_TRANSPORT, DEFAULT_TRANSPORT))
     mapping_path = entry.options.get(CONF_MAPPING_PATH, entry.data.get(CONF_MAPPING_PATH, ""))
     addr_offset = entry.options.get(CONF_ADDR_OFFSET, DEFAULT_ADDR_OFFSET)
+    max_read = entry.options.get(CONF_MAX_READ_REGISTERS, DEFAULT_MAX_READ_REGISTERS)
+    pipeline_depth = entry.options.get(CONF_PIPELINE_DEPTH, DEFAULT_PIPELINE_DEPTH)
+    hold_resync = entry.options.get(CONF_HOLD_RESYNC, DEFAULT_HOLD_RESYNC_SECONDS)
+    verify_writes = entry.options.get(CONF_VERIFY_WRITES, DEFAULT_VERIFY_WRITES)
+    max_write_latency = entry.options.get(CONF_MAX_WRITE_LATENCY, DEFAULT_MAX_WRITE_LATENCY_MS)
+    state_interval = entry.options.get(CONF_STATE_INTERVAL, DEFAULT_STATE_INTERVAL)
+    native_reads = entry.options.get(CONF_NATIVE_READS, DEFAULT_NATIVE_READS)
     serial_params = {
         "baudrate": entry.options.get(CONF_BAUDRATE, DEFAULT_BAUDRATE),
         "bytesize": entry.options.get(CONF_BYTESIZE, DEFAULT_BYTESIZE),
         "parity": entry.options.get(CONF_PARITY, DEFAULT_PARITY),
         "stopbits": entry.options.get(CONF_STOPBITS, DEFAULT_STOPBITS),
     }
-    mapping = await hass.async_add_executor_job(load_register_mapping, mapping_path)
-    sensors_cfg = list(mapping.get("sensors", []))
-    controls_cfg = list(mapping.get("controls", []))
-    sensors_cfg, controls_cfg = _auto_inject_readbacks(sensors_cfg, controls_cfg)
-    _LOGGER.info("Growatt mapping path: %s", mapping.get("path"))
-    _LOGGER.info("Growatt sensors: %s, controls: %s (after auto-readback)", len(sensors_cfg), len(controls_cfg))
-    registers = [RegisterDef(**r) for r in sensors_cfg]
-    coordinator = GrowattModbusCoordinator(
-        hass, host, port, unit_id, registers, scan_interval,
-        transport=transport, serial_params=serial_params, address_offset=addr_offset
-    )
+    try:
+        extra_units = parse_extra_units(entry.options.get(CONF_EXTRA_UNITS, ""))
+    except ValueError as err:
+        raise ConfigEntryError(f"Invalid extra unit ids: {err}") from err
+    async def _build_unit(unit: int, unit_key: str, path: str) -> dict:
+        """Mapping, warm-start store, raw log and coordinator of one unit id; suffix keeps the first unit's files unchanged."""
+        suffix = f".{unit_key}" if unit_key else ""
+        try:
+            mapping = await hass.async_add_executor_job(load_compiled_mapping, path, hass.config.path(STORAGE_DIR))
+        except MappingError as err:
+            raise ConfigEntryError(str(err)) from err
+        except OSError as err:
+            raise ConfigEntryError(f"Cannot read mapping {path or 'EMBEDDED'}: {err}") from err
+        registers = list(mapping.sensors)
+        controls_cfg = list(mapping.controls)
+        _LOGGER.info("Growatt unit %s mapping path: %s", unit, mapping.path)
+        _LOGGER.info("Growatt unit %s sensors: %s, controls: %s (after auto-readback)", unit, len(registers), len(controls_cfg))
+        store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry.entry_id}{suffix}")
+        try:
+            warm_state = await store.async_load()
+        except Exception as err:
+            _LOGGER.warning("Warm-start cache unreadable, starting cold: %s", err); warm_state = None
+        recorder = None
+        if entry.options.get(CONF_RAW_LOG, DEFAULT_RAW_LOG):
+            recorder = RawRecorder(hass.config.path(f"growatt_modbus_raw.{entry.entry_id}{suffix}.gwr"),
+                                   int(entry.options.get(CONF_RAW_LOG_MAX_MB, DEFAULT_RAW_LOG_MAX_MB)) << 20, RAW_LOG_KEEP)
+        aggregator = None
+        if entry.options.get(CONF_IMPORT_STATISTICS, DEFAULT_IMPORT_STATISTICS):
+            aggregator = RingAggregator(registers, AGGREGATE_BIN_SECONDS, max_gap=3 * scan_interval)
+        coordinator = GrowattModbusCoordinator(
+            hass, host, port, unit, registers, scan_interval,
+            transport=transport, serial_params=serial_params, address_offset=addr_offset,
+            max_read_registers=max_read, pipeline_depth=pipeline_depth,
+            hold_resync=hold_resync, verify_writes=verify_writes, store=store, warm_state=warm_state,
+            recorder=recorder, unit_key=unit_key, max_write_latency_ms=max_write_latency,
+            aggregator=aggregator, statistic_prefix=f"{DOMAIN}:{entry.entry_id.lower()}{'_' + unit_key if unit_key else ''}",
+            state_interval=state_interval, native_reads=native_reads,
+        )
+        return {"coordinator": coordinator, "registers": registers, "controls": controls_cfg, "unit_id": unit,
+                "mapping": mapping, "warm": coordinator.restore_state(warm_state)}
+    primary = await _build_unit(unit_id, "", mapping_path)
+    units = [primary]
+    for unit, path in extra_units:
+        if unit != unit_id:
+            units.append(await _build_unit(unit, f"u{unit}", path or mapping_path))
+    coordinator: GrowattModbusCoordinator = primary["coordinator"]
+    registers, controls_cfg, mapping = primary["registers"], primary["controls"], primary["mapping"]
     hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][entry.entry_id] = {"coordinator": coordinator, "registers": registers, "controls": controls_cfg}
-    await coordinator.async_config_entry_first_refresh()
+    hass.data[DOMAIN][entry.entry_id] = {"coordinator": coordinator, "registers": registers, "controls": controls_cfg,
+                                         "units": units, "tasks": []}
+    if entry.options.get(CONF_METRICS_ENDPOINT, DEFAULT_METRICS_ENDPOINT):
+        for u in units:
+            u["coordinator"].enable_export([("entry", entry.entry_id), ("unit_id", u["unit_id"])])
+        register_view(hass, DOMAIN)
+    if primary["warm"]:
+        # entities start from the stored snapshot; a background refresh revalidates it
+        _LOGGER.info("Warm start from stored cache, revalidating in background")
+        hass.async_create_task(coordinator.async_refresh())
+    else:
+        await coordinator.async_config_entry_first_refresh()
+    # Extra units share the link (one socket, one transaction queue). Unit k of n polls at phase
+    # k * interval / n: the first refresh is delayed by it and every later one is rescheduled onto it
+    # (coordinator._schedule_refresh), so the polls stay spread over the interval instead of queueing.
+    if len(units) > 1:
+        for k, unit in enumerate(units):
+            unit["coordinator"].poll_phase = k * scan_interval / len(units)
+    async def _staggered_start(coord: GrowattModbusCoordinator, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await coord.async_refresh()
+    for k, unit in enumerate(units[1:], start=1):
+        hass.data[DOMAIN][entry.entry_id]["tasks"].append(
+            hass.async_create_task(_staggered_start(unit["coordinator"], k * scan_interval / len(units))))
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    def _unit(call: ServiceCall) -> GrowattModbusCoordinator:
+        """Coordinator of the service call's unit_id (default: the entry's first unit)."""
+        if "unit_id" not in call.data:
+            return coordinator
+        unit = int(call.data["unit_id"])
+        for u in units:
+            if u["unit_id"] == unit:
+                return u["coordinator"]
+        raise ValueError(f"unit_id {unit} is not configured (have {[u['unit_id'] for u in units]})")
     async def _svc_write_register(call: ServiceCall):
-        ok = await coordinator.write_single_register(int(call.data["address"]), int(call.data["value"]))
+        ok = await _unit(call).write_single_register(int(call.data["address"]), int(call.data["value"]))
         _LOGGER.info("write_register %s", ok)
     async def _svc_write_registers(call: ServiceCall):
         addr = int(call.data["address"])
         values = [int(v) for v in call.data["values"]]
-        ok = await coordinator.write_multiple_registers(addr, values)
+        ok = await _unit(call).write_multiple_registers(addr, values)
         _LOGGER.info("write_registers %s", ok)
     async def _svc_write_u32(call: ServiceCall):
         addr = int(call.data["address"])
         value = int(call.data["value"])
         word_order = call.data.get("word_order", "high_low")
-        ok = await coordinator.write_u32(addr, value, word_order)
+        ok = await _unit(call).write_u32(addr, value, word_order)
         _LOGGER.info("write_u32 %s", ok)
+    async def _svc_write_batch(call: ServiceCall):
+        writes: list[tuple[int, int]] = []
+        for item in call.data["writes"]:
+            addr = int(item["address"])
+            if "values" in item:
+                writes.extend((addr + i, int(v)) for i, v in enumerate(item["values"]))
+            else:
+                writes.append((addr, int(item["value"])))
+        ok = await _unit(call).write_batch(writes)
+        _LOGGER.info("write_batch %s (%s registers)", ok, len(writes))
     async def _svc_log_mapping(call: ServiceCall):
-        _LOGGER.info("Mapping path: %s", mapping.get("path"))
-        _LOGGER.info("Sensors cfg: %s", sensors_cfg)
-        _LOGGER.info("Controls cfg: %s", controls_cfg)
+        for u in units:
+            if "unit_id" in call.data and u["unit_id"] != int(call.data["unit_id"]):
+                continue
+            _LOGGER.info("Unit %s mapping path: %s (sha256 %s)", u["unit_id"], u["mapping"].path, u["mapping"].digest)
+            _LOGGER.info("Sensors cfg: %s", u["registers"])
+            _LOGGER.info("Controls cfg: %s", [dict(c) for c in u["controls"]])
     hass.services.async_register(DOMAIN, "write_register", _svc_write_register)
     hass.services.async_register(DOMAIN, "write_registers", _svc_write_registers)
     hass.services.async_register(DOMAIN, "write_u32", _svc_write_u32)
+    hass.services.async_register(DOMAIN, "write_batch", _svc_write_batch)
+    async def _svc_discover_registers(call: ServiceCall):
+        types = ["input", "holding"] if call.data.get("register_type", "both") == "both" else [call.data["register_type"]]
+        first, last = int(call.data.get("first", 0)), int(call.data.get("last", 3249))
+        output = call.data.get("output") or hass.config.path("growatt_modbus_discovered.yaml")
+        async def _run():
+            text = await _unit(call).discover(types, first, last, int(call.data.get("max_gap_step", 16)))
+            def _write():
+                with open(output, "w", encoding="utf-8") as f:
+                    f.write(text)
+            await hass.async_add_executor_job(_write)
+            _LOGGER.info("Register discovery written to %s", output)
+        # a full scan takes minutes; do not block the service call
+        hass.async_create_task(_run())
     hass.services.async_register(DOMAIN, "log_mapping", _svc_log_mapping)
+    hass.services.async_register(DOMAIN, "discover_registers", _svc_discover_registers)
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    coordinator: GrowattModbusCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
-    await coordinator.async_close()
+    data = hass.data[DOMAIN][entry.entry_id]
+    for task in data["tasks"]:
+        task.cancel()
+    for unit in data["units"]:
+        await unit["coordinator"].async_close()
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
     return unload_ok
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    await Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry.entry_id}").async_remove()
+    try:
+        extra_units = parse_extra_units(entry.options.get(CONF_EXTRA_UNITS, ""))
+    except ValueError:
+        extra_units = []
+    for unit, _ in extra_units:
+        await Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry.entry_id}.u{unit}").async_remove()
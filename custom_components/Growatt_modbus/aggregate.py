@@ -0,0 +1,134 @@
+
+from __future__ import annotations
+import logging, math, re
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# power unit * seconds -> kWh
+ENERGY_DIVISOR = {"W": 3_600_000.0, "kW": 3600.0}
+
+# one completed hour: (hour start as unix time, {uid: (mean, min, max)}, {uid: kWh in that hour})
+HourRow = Tuple[float, Dict[str, Tuple[float, float, float]], Dict[str, float]]
+
+def aggregated(reg) -> bool:
+    """Sensors worth aggregating: numeric measurements (no enums, no bit flags)."""
+    return reg.state_class == "measurement" and not reg.options and not reg.binary
+
+class RingAggregator:
+    """
+    Per-sensor running min / max / time-weighted mean (trapezoidal area) in a fixed-size ring of
+    time bins shared by all sensors, stored in flat arrays (sensor-major). Power sensors (device_class
+    power in W/kW) also integrate energy. add() is called once per poll cycle; when the wall-clock hour
+    changes it returns the completed hour, combined from its bins, ready for statistics import.
+    Segments longer than max_gap (outage, failed cycles) are not bridged.
+    """
+    def __init__(self, registers: Iterable, bin_seconds: int = 300, bins: int = 24, max_gap: float = 60.0) -> None:
+        regs = [r for r in registers if aggregated(r)]
+        self.registers = regs; self.uids = [r.unique_id for r in regs]
+        self.bin_seconds = int(bin_seconds); self.bins = max(int(bins), 3600 // self.bin_seconds + 1)
+        self.max_gap = float(max_gap)
+        self._energy = {i: ENERGY_DIVISOR[r.unit_of_measurement] for i, r in enumerate(regs)
+                        if r.device_class == "power" and r.unit_of_measurement in ENERGY_DIVISOR}
+        n = len(regs) * self.bins
+        self._slot_bin = array("q", [-1] * self.bins)  # time bin (unix time // bin_seconds) held by each slot
+        self._min = array("d", [math.inf] * n); self._max = array("d", [-math.inf] * n)
+        self._area = array("d", [0.0] * n); self._time = array("d", [0.0] * n)
+        self._last_t = array("d", [math.nan] * len(regs)); self._last_v = array("d", [math.nan] * len(regs))
+        self._hour: Optional[int] = None
+        self.energy_sums: Dict[str, float] = {}  # cumulative kWh per power uid (statistics "sum")
+        self.last_hour: Optional[int] = None  # last hour handed out for import
+
+    def __bool__(self) -> bool:
+        return bool(self.uids)
+
+    def _slot(self, b: int) -> int:
+        s = b % self.bins
+        if self._slot_bin[s] != b:
+            self._slot_bin[s] = b; k = self.bins
+            for i in range(len(self.uids)):
+                j = i * k + s
+                self._min[j] = math.inf; self._max[j] = -math.inf; self._area[j] = 0.0; self._time[j] = 0.0
+        return s
+
+    def add(self, t: float, data: Dict[str, Any]) -> List[HourRow]:
+        rows: List[HourRow] = []
+        hour = int(t // 3600)
+        if self._hour is not None and hour != self._hour and (self.last_hour is None or self._hour > self.last_hour):
+            rows.append(self._hour_row(self._hour))
+        self._hour = hour
+        b = int(t // self.bin_seconds); s = self._slot(b); k = self.bins
+        for i, uid in enumerate(self.uids):
+            v = data.get(uid)
+            if not isinstance(v, (int, float)) or v != v:
+                self._last_t[i] = math.nan; continue
+            j = i * k + s; lt = self._last_t[i]
+            if v < self._min[j]: self._min[j] = v
+            if v > self._max[j]: self._max[j] = v
+            dt = t - lt
+            if 0 < dt <= self.max_gap:
+                lv = self._last_v[i]; tb = b * self.bin_seconds
+                if lt < tb and self._slot_bin[(b - 1) % k] == b - 1:
+                    # segment crosses into this bin: the part before the boundary belongs to the previous one
+                    vb = lv + (v - lv) * (tb - lt) / dt; jp = i * k + (b - 1) % k
+                    self._area[jp] += (lv + vb) * 0.5 * (tb - lt); self._time[jp] += tb - lt
+                    lt, lv = tb, vb
+                self._area[j] += (v + lv) * 0.5 * (t - lt); self._time[j] += t - lt
+            self._last_t[i] = t; self._last_v[i] = v
+        return rows
+
+    def _hour_row(self, hour: int) -> HourRow:
+        first = hour * 3600 // self.bin_seconds; last = (hour + 1) * 3600 // self.bin_seconds
+        slots = [s for s in range(self.bins) if first <= self._slot_bin[s] < last]
+        stats: Dict[str, Tuple[float, float, float]] = {}; energy: Dict[str, float] = {}; k = self.bins
+        for i, uid in enumerate(self.uids):
+            area = tm = 0.0; lo = math.inf; hi = -math.inf
+            for s in slots:
+                j = i * k + s
+                area += self._area[j]; tm += self._time[j]
+                if self._min[j] < lo: lo = self._min[j]
+                if self._max[j] > hi: hi = self._max[j]
+            if tm > 0:
+                stats[uid] = (area / tm, lo, hi)
+            if i in self._energy and tm > 0:
+                kwh = area / self._energy[i]
+                energy[uid] = kwh; self.energy_sums[uid] = self.energy_sums.get(uid, 0.0) + kwh
+        self.last_hour = hour
+        return float(hour * 3600), stats, energy
+
+    def export(self) -> dict[str, Any]:
+        return {"energy_sums": dict(self.energy_sums), "last_hour": self.last_hour}
+
+    def restore(self, state: dict | None) -> None:
+        if state:
+            self.energy_sums.update({k: float(v) for k, v in (state.get("energy_sums") or {}).items()})
+            self.last_hour = state.get("last_hour")
+
+def statistic_id(prefix: str, uid: str) -> str:
+    return f"{prefix}_{re.sub(r'[^a-z0-9_]', '_', uid.lower())}"
+
+async def async_import_hours(hass, aggregator: RingAggregator, prefix: str, rows: List[HourRow]) -> None:
+    """Import completed hours as external statistics: <prefix>_<uid> (mean/min/max), <prefix>_<uid>_energy (kWh sum)."""
+    from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+    from homeassistant.components.recorder.statistics import async_add_external_statistics
+    domain = prefix.split(":", 1)[0]
+    for r in aggregator.registers:
+        uid = r.unique_id
+        points = [StatisticData(start=datetime.fromtimestamp(ts, timezone.utc), mean=st[uid][0], min=st[uid][1], max=st[uid][2])
+                  for ts, st, _ in rows if uid in st]
+        if points:
+            async_add_external_statistics(hass, StatisticMetaData(
+                has_mean=True, has_sum=False, name=r.name, source=domain,
+                statistic_id=statistic_id(prefix, uid), unit_of_measurement=r.unit_of_measurement), points)
+        if uid in aggregator.energy_sums:
+            total = aggregator.energy_sums[uid]; points = []
+            for ts, _, en in reversed(rows):
+                if uid in en:
+                    points.append(StatisticData(start=datetime.fromtimestamp(ts, timezone.utc), state=total, sum=total)); total -= en[uid]
+            if points:
+                async_add_external_statistics(hass, StatisticMetaData(
+                    has_mean=False, has_sum=True, name=f"{r.name} energy", source=domain,
+                    statistic_id=statistic_id(prefix, uid) + "_energy", unit_of_measurement="kWh"), points[::-1])
+    _LOGGER.debug("Imported statistics for %s hour(s) of %s sensors", len(rows), len(aggregator.uids))
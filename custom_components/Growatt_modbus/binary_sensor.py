@@ -0,0 +1,44 @@
+
+from __future__ import annotations
+from typing import Any
+from homeassistant.components.binary_sensor import BinarySensorEntity, BinarySensorDeviceClass
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+import logging
+from .const import DOMAIN
+from .coordinator import GrowattModbusCoordinator, RegisterDef
+from .device_helper import build_device_info, entity_unique_id
+_LOGGER = logging.getLogger(__name__)
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
+    entities = [GrowattBitSensor(unit["coordinator"], entry, r)
+                for unit in hass.data[DOMAIN][entry.entry_id]["units"] for r in unit["registers"] if r.binary]
+    _LOGGER.info("Adding %s binary_sensor entities", len(entities))
+    if entities: async_add_entities(entities)
+
+class GrowattBitSensor(CoordinatorEntity[dict[str, Any]], BinarySensorEntity):
+    """One bit of a status/fault word; decoded by the coordinator from the parent register's read."""
+    _attr_has_entity_name = True
+
+    def __init__(self, coordinator: GrowattModbusCoordinator, entry: ConfigEntry, reg: RegisterDef) -> None:
+        super().__init__(coordinator)
+        self._reg = reg
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, reg.unique_id)
+        self._attr_name = reg.name
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
+        if reg.device_class:
+            try:
+                self._attr_device_class = BinarySensorDeviceClass(reg.device_class)
+            except Exception:
+                self._attr_device_class = None
+
+    @property
+    def is_on(self) -> bool | None:
+        return (self.coordinator.data or {}).get(self._reg.unique_id)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        if self.coordinator.changed(self._reg.unique_id):
+            self.async_write_ha_state()
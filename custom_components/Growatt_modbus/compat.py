@@ -0,0 +1,77 @@
+
+from __future__ import annotations
+import inspect, logging
+from functools import partial
+from typing import Any, Dict, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# keyword that carries the Modbus unit id, per pymodbus API generation
+_UNIT_KWARGS = ("device_id", "slave", "unit")
+_METHODS = ("read_input_registers", "read_holding_registers", "write_register", "write_registers", "write_coil")
+_DETECTED: Dict[Tuple[type, str], str | None] = {}
+
+def _kw_from_version() -> str | None:
+    try:
+        import pymodbus
+        major, minor = (int(p) for p in str(pymodbus.__version__).split(".")[:2])
+    except Exception:
+        return None
+    if major < 3:
+        return "unit"
+    return "slave" if minor < 10 else "device_id"
+
+def _kw_from_code(fn: Any) -> str | None:
+    """Unit keyword a **kwargs method looks up itself (e.g. a wrapper doing kwargs.pop("slave"))."""
+    code = getattr(inspect.unwrap(fn), "__code__", None)
+    if code is None:
+        return None
+    names = set(code.co_names) | {c for c in code.co_consts if isinstance(c, str)}
+    return next((k for k in _UNIT_KWARGS if k in names), None)
+
+def unit_kwarg(client: Any, method_name: str) -> str | None:
+    """
+    Name of the unit-id keyword accepted by client.<method_name>, detected once per client class from
+    the client itself: an explicit parameter (3.0-3.9 slave=, 3.10+ device_id=), else for a **kwargs
+    signature the keyword its body looks up, else unit= (the 2.x convention). The installed pymodbus
+    version is only consulted when the method has no inspectable signature.
+    """
+    key = (type(client), method_name)
+    if key in _DETECTED:
+        return _DETECTED[key]
+    kw: str | None = None
+    fn = getattr(client, method_name)
+    try:
+        params = inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        kw = _kw_from_version()
+    else:
+        kw = next((k for k in _UNIT_KWARGS if k in params), None)
+        if kw is None and any(p.kind is inspect.Parameter.VAR_KEYWORD for p in params.values()):
+            kw = _kw_from_code(fn) or "unit"
+    if kw is None:
+        _LOGGER.warning("%s.%s accepts no unit id; requests go to the client's default unit", type(client).__name__, method_name)
+    _DETECTED[key] = kw
+    return kw
+
+class ModbusCalls:
+    """
+    Direct callables for one client + unit id, bound once instead of probing call variants per request.
+    Address is always positional; count/unit are passed as keywords (keyword-only since pymodbus 3.7).
+    """
+    __slots__ = ("client", "unit_id", "read_input_registers", "read_holding_registers", "write_register", "write_registers", "write_coil")
+
+    def __init__(self, client: Any, unit_id: int) -> None:
+        self.client = client; self.unit_id = int(unit_id)
+        for name in _METHODS:
+            fn = getattr(client, name, None)
+            if fn is None:
+                setattr(self, name, None); continue
+            kw = unit_kwarg(client, name)
+            setattr(self, name, partial(fn, **{kw: self.unit_id}) if kw else fn)
+
+    def read(self, method_name: str, address: int, count: int):
+        return getattr(self, method_name)(address, count=count)
+
+    def write(self, method_name: str, address: int, value: Any):
+        return getattr(self, method_name)(address, value)
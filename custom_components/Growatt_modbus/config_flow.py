@@ -11,7 +11,17 @@ from .const import (
     CONF_BAUDRATE, DEFAULT_BAUDRATE, CONF_BYTESIZE, DEFAULT_BYTESIZE,
     CONF_PARITY, DEFAULT_PARITY, CONF_STOPBITS, DEFAULT_STOPBITS,
     CONF_ADDR_OFFSET, DEFAULT_ADDR_OFFSET, MIN_SCAN_SECONDS, MAX_SCAN_SECONDS,
+    CONF_MAX_READ_REGISTERS, DEFAULT_MAX_READ_REGISTERS, MODBUS_MAX_READ_REGISTERS,
+    CONF_PIPELINE_DEPTH, DEFAULT_PIPELINE_DEPTH, MAX_PIPELINE_DEPTH,
+    CONF_HOLD_RESYNC, DEFAULT_HOLD_RESYNC_SECONDS, MAX_HOLD_RESYNC_SECONDS, CONF_VERIFY_WRITES, DEFAULT_VERIFY_WRITES,
+    CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS,
+    CONF_RAW_LOG, DEFAULT_RAW_LOG, CONF_RAW_LOG_MAX_MB, DEFAULT_RAW_LOG_MAX_MB, MAX_RAW_LOG_MAX_MB, CONF_EXTRA_UNITS,
+    CONF_MAX_WRITE_LATENCY, DEFAULT_MAX_WRITE_LATENCY_MS, MAX_MAX_WRITE_LATENCY_MS,
+    CONF_IMPORT_STATISTICS, DEFAULT_IMPORT_STATISTICS, CONF_STATE_INTERVAL, DEFAULT_STATE_INTERVAL, MAX_STATE_INTERVAL,
+    CONF_METRICS_ENDPOINT, DEFAULT_METRICS_ENDPOINT, CONF_RAW_ATTRIBUTES, DEFAULT_RAW_ATTRIBUTES,
+    CONF_NATIVE_READS, DEFAULT_NATIVE_READS,
 )
+from .device_helper import parse_extra_units
 
 DATA_SCHEMA = vol.Schema({
     vol.Required(CONF_HOST): str,
@@ -54,7 +64,7 @@ class GrowattModbusOptionsFlow(config_entries.OptionsFlow):
 
     def _options_schema(self) -> vol.Schema:
         transport = str(self._entry_default(CONF_TRANSPORT, DEFAULT_TRANSPORT)).lower()
-        if transport not in {"tcp", "rtutcp"}:
+        if transport not in {"tcp", "rtutcp", "rtu"}:
             transport = DEFAULT_TRANSPORT
         parity = str(self._entry_default(CONF_PARITY, DEFAULT_PARITY)).upper()
         if parity not in {"N", "E", "O"}:
@@ -66,14 +76,46 @@ class GrowattModbusOptionsFlow(config_entries.OptionsFlow):
                 vol.Coerce(int), vol.Range(min=MIN_SCAN_SECONDS, max=MAX_SCAN_SECONDS)
             ),
             vol.Optional(CONF_MAPPING_PATH, default=mapping_path): str,
-            vol.Optional(CONF_TRANSPORT, default=transport): vol.In(["tcp", "rtutcp"]),
+            vol.Optional(CONF_TRANSPORT, default=transport): vol.In(["tcp", "rtutcp", "rtu"]),
             vol.Optional(CONF_ADDR_OFFSET, default=self._entry_int_default(CONF_ADDR_OFFSET, DEFAULT_ADDR_OFFSET)): vol.Coerce(int),
             vol.Optional(CONF_BAUDRATE, default=self._entry_int_default(CONF_BAUDRATE, DEFAULT_BAUDRATE)): vol.Coerce(int),
             vol.Optional(CONF_BYTESIZE, default=self._entry_int_default(CONF_BYTESIZE, DEFAULT_BYTESIZE)): vol.Coerce(int),
             vol.Optional(CONF_PARITY, default=parity): vol.In(["N", "E", "O"]),
             vol.Optional(CONF_STOPBITS, default=self._entry_int_default(CONF_STOPBITS, DEFAULT_STOPBITS)): vol.Coerce(int),
+            vol.Optional(CONF_MAX_READ_REGISTERS, default=self._entry_int_default(CONF_MAX_READ_REGISTERS, DEFAULT_MAX_READ_REGISTERS)): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=MODBUS_MAX_READ_REGISTERS)
+            ),
+            vol.Optional(CONF_PIPELINE_DEPTH, default=self._entry_int_default(CONF_PIPELINE_DEPTH, DEFAULT_PIPELINE_DEPTH)): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=MAX_PIPELINE_DEPTH)
+            ),
+            vol.Optional(CONF_HOLD_RESYNC, default=self._entry_int_default(CONF_HOLD_RESYNC, DEFAULT_HOLD_RESYNC_SECONDS)): vol.All(
+                vol.Coerce(int), vol.Range(min=0, max=MAX_HOLD_RESYNC_SECONDS)
+            ),
+            vol.Optional(CONF_VERIFY_WRITES, default=bool(self._entry_default(CONF_VERIFY_WRITES, DEFAULT_VERIFY_WRITES))): bool,
+            vol.Optional(CONF_DIAGNOSTIC_SENSORS, default=bool(self._entry_default(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS))): bool,
+            vol.Optional(CONF_RAW_LOG, default=bool(self._entry_default(CONF_RAW_LOG, DEFAULT_RAW_LOG))): bool,
+            vol.Optional(CONF_RAW_LOG_MAX_MB, default=self._entry_int_default(CONF_RAW_LOG_MAX_MB, DEFAULT_RAW_LOG_MAX_MB)): vol.All(
+                vol.Coerce(int), vol.Range(min=1, max=MAX_RAW_LOG_MAX_MB)
+            ),
+            vol.Optional(CONF_NATIVE_READS, default=bool(self._entry_default(CONF_NATIVE_READS, DEFAULT_NATIVE_READS))): bool,
+            vol.Optional(CONF_MAX_WRITE_LATENCY, default=self._entry_int_default(CONF_MAX_WRITE_LATENCY, DEFAULT_MAX_WRITE_LATENCY_MS)): vol.All(
+                vol.Coerce(int), vol.Range(min=0, max=MAX_MAX_WRITE_LATENCY_MS)
+            ),
+            vol.Optional(CONF_IMPORT_STATISTICS, default=bool(self._entry_default(CONF_IMPORT_STATISTICS, DEFAULT_IMPORT_STATISTICS))): bool,
+            vol.Optional(CONF_STATE_INTERVAL, default=self._entry_int_default(CONF_STATE_INTERVAL, DEFAULT_STATE_INTERVAL)): vol.All(
+                vol.Coerce(int), vol.Range(min=0, max=MAX_STATE_INTERVAL)
+            ),
+            vol.Optional(CONF_METRICS_ENDPOINT, default=bool(self._entry_default(CONF_METRICS_ENDPOINT, DEFAULT_METRICS_ENDPOINT))): bool,
+            vol.Optional(CONF_RAW_ATTRIBUTES, default=bool(self._entry_default(CONF_RAW_ATTRIBUTES, DEFAULT_RAW_ATTRIBUTES))): bool,
+            vol.Optional(CONF_EXTRA_UNITS, default=str(self._entry_default(CONF_EXTRA_UNITS, ""))): str,
         })
     async def async_step_init(self, user_input=None):
+        errors = {}
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
-        return self.async_show_form(step_id="init", data_schema=self._options_schema())
+            try:
+                parse_extra_units(user_input.get(CONF_EXTRA_UNITS, ""))
+            except ValueError:
+                errors[CONF_EXTRA_UNITS] = "invalid_units"
+            else:
+                return self.async_create_entry(title="", data=user_input)
+        return self.async_show_form(step_id="init", data_schema=self._options_schema(), errors=errors)
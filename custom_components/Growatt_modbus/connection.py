@@ -0,0 +1,157 @@
+
+from __future__ import annotations
+import asyncio, heapq, inspect, itertools, logging, time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+try:
+    from pymodbus.client import AsyncModbusTcpClient, AsyncModbusSerialClient
+except Exception as exc:
+    _LOGGER.error("pymodbus import failed: %s", exc); raise
+
+from .const import GATEWAY_MARGIN_MS, SERIAL_TURNAROUND_MS
+from .framer import NativeModbusClient, SerialRtuClient, serial_timing
+from .rawlog import ReplayClient
+
+LinkKey = Tuple[str, str, int]
+
+# Transaction priorities on a link (lower is served first)
+PRIORITY_WRITE = 0
+PRIORITY_READ = 10
+
+class ModbusLink:
+    """
+    One pymodbus client shared by every coordinator talking to the same transport/host/port.
+    Transactions are admitted by priority, FIFO within a priority: a queued write goes out before
+    every queued read, so polling pauses between windows (never inside a frame) while writes pass.
+    depth > 1 lets Modbus TCP pipeline requests (pymodbus matches responses by transaction id),
+    serial framing always uses depth 1.
+    Transport "replay" serves reads from a raw log (host = log path) instead of a device.
+    Transport "rtu" drives a local serial port (host = device path) with the built-in RTU master
+    (framer.SerialRtuClient); rtutcp timeouts follow the same serial timing.
+    With native=True, tcp/rtutcp links use the built-in framer (framer.NativeModbusClient) instead of
+    pymodbus for every request, so reads fill the decode buffers directly and there is still one
+    socket per gateway.
+    """
+    def __init__(self, key: LinkKey, serial_params: dict | None = None, depth: int = 1, native: bool = False) -> None:
+        self.key = key; self.transport, self.host, self.port = key
+        self._serial_params = dict(serial_params or {})
+        self.depth = _link_depth(self.transport, depth)
+        self._busy = 0; self._waiters: list = []; self._seq = itertools.count()
+        self._connect_lock = asyncio.Lock()
+        self.client = None; self.refs = 0; self.connects = 0
+        self.native = _link_native(self.transport, native)
+        self.wait_ms_max: Dict[int, float] = {}  # priority -> longest wait for a slot
+
+    def _create_client(self):
+        if self.transport == "replay":
+            return ReplayClient(self.host)
+        if self.transport == "rtu":
+            return SerialRtuClient(self.host, self._serial_params)
+        if self.native:
+            if self.transport == "rtutcp":
+                return NativeModbusClient(self.host, self.port, "rtu", timing=self._gateway_timing())
+            return NativeModbusClient(self.host, self.port, "tcp")
+        if self.transport == "rtutcp":
+            url = f"socket://{self.host}:{self.port}"
+            params = {"method":"rtu","port":url,"baudrate":int(self._serial_params.get("baudrate",9600)),"bytesize":int(self._serial_params.get("bytesize",8)),"parity":str(self._serial_params.get("parity","N")),"stopbits":int(self._serial_params.get("stopbits",1)),"timeout":self._gateway_timing().timeout(8)}
+            return AsyncModbusSerialClient(**params)
+        try: return AsyncModbusTcpClient(self.host, port=self.port, timeout=5)
+        except TypeError: return AsyncModbusTcpClient(self.host, port=self.port)
+
+    async def ensure_connected(self):
+        async with self._connect_lock:
+            if self.client is None:
+                self.client = self._create_client()
+            if not bool(getattr(self.client, "connected", False)):
+                self.connects += 1
+                await self.client.connect()
+        return self.client
+
+    def _gateway_timing(self):
+        return serial_timing(self._serial_params, SERIAL_TURNAROUND_MS + GATEWAY_MARGIN_MS)
+
+    @property
+    def connected(self) -> bool:
+        return bool(getattr(self.client, "connected", False))
+
+    async def _acquire(self, priority: int) -> None:
+        if self._busy < self.depth and not self._waiters:
+            self._busy += 1; return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release()  # slot was handed over just as we got cancelled
+            raise
+
+    def _release(self) -> None:
+        self._busy -= 1
+        while self._waiters and self._busy < self.depth:
+            fut = heapq.heappop(self._waiters)[2]
+            if not fut.done():
+                self._busy += 1; fut.set_result(None)
+
+    @asynccontextmanager
+    async def transaction(self, priority: int = PRIORITY_READ):
+        started = time.perf_counter()
+        await self._acquire(priority)
+        waited = (time.perf_counter() - started) * 1000.0
+        if waited > self.wait_ms_max.get(priority, 0.0):
+            self.wait_ms_max[priority] = waited
+        try:
+            yield self.client
+        finally:
+            self._release()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for w in self._waiters if not w[2].done())
+
+    async def close(self) -> None:
+        client, self.client = self.client, None
+        if client is None:
+            return
+        try:
+            res = client.close()
+            if inspect.isawaitable(res):
+                await res
+        except Exception:
+            pass
+
+def _link_depth(transport: str, depth: int) -> int:
+    return 1 if transport != "tcp" else max(1, int(depth or 1))
+
+def _link_native(transport: str, native: bool) -> bool:
+    return transport == "rtu" or (bool(native) and transport in ("tcp", "rtutcp"))
+
+_LINKS: Dict[LinkKey, ModbusLink] = {}
+
+def acquire_link(transport: str, host: str, port: int, serial_params: dict | None = None, depth: int = 1, native: bool = False) -> ModbusLink:
+    """Return the process-wide link for transport/host/port, creating it on first use."""
+    transport = (transport or "tcp").lower(); host = str(host).strip()
+    key: LinkKey = (transport, host if transport in ("replay", "rtu") else host.lower(), int(port))
+    link = _LINKS.get(key)
+    if link is None:
+        link = _LINKS[key] = ModbusLink(key, serial_params, depth, native)
+    elif serial_params and link._serial_params and dict(serial_params) != link._serial_params:
+        _LOGGER.warning("Link %s already open with serial params %s; ignoring %s", key, link._serial_params, serial_params)
+    if link.refs and _link_depth(transport, depth) != link.depth:
+        _LOGGER.warning("Link %s already open with pipeline depth %s; ignoring %s", key, link.depth, depth)
+    if link.refs and _link_native(transport, native) != link.native:
+        _LOGGER.warning("Link %s already open with native framing %s; ignoring %s", key, link.native, native)
+    link.refs += 1
+    _LOGGER.debug("Link %s acquired (%s users)", key, link.refs)
+    return link
+
+async def async_release_link(link: ModbusLink) -> None:
+    """Drop one reference; the socket is closed when the last coordinator lets go."""
+    link.refs = max(0, link.refs - 1)
+    if link.refs == 0:
+        if _LINKS.get(link.key) is link:
+            _LINKS.pop(link.key)
+        await link.close()
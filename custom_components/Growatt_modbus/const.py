@@ -15,6 +15,20 @@ CONF_BYTESIZE: Final = "bytesize"
 CONF_PARITY: Final = "parity"
 CONF_STOPBITS: Final = "stopbits"
 CONF_ADDR_OFFSET: Final = "address_offset"
+CONF_MAX_READ_REGISTERS: Final = "max_read_registers"
+CONF_PIPELINE_DEPTH: Final = "pipeline_depth"
+CONF_HOLD_RESYNC: Final = "hold_resync"
+CONF_VERIFY_WRITES: Final = "verify_writes"
+CONF_DIAGNOSTIC_SENSORS: Final = "diagnostic_sensors"
+CONF_RAW_LOG: Final = "raw_log"
+CONF_RAW_LOG_MAX_MB: Final = "raw_log_max_mb"
+CONF_EXTRA_UNITS: Final = "extra_units"
+CONF_MAX_WRITE_LATENCY: Final = "max_write_latency_ms"
+CONF_IMPORT_STATISTICS: Final = "import_statistics"
+CONF_STATE_INTERVAL: Final = "state_interval"
+CONF_METRICS_ENDPOINT: Final = "metrics_endpoint"
+CONF_RAW_ATTRIBUTES: Final = "raw_value_attributes"
+CONF_NATIVE_READS: Final = "native_reads"
 
 DEFAULT_PORT: Final = 502
 DEFAULT_UNIT_ID: Final = 1
@@ -23,8 +37,62 @@ MIN_SCAN_SECONDS: Final = 1
 MAX_SCAN_SECONDS: Final = 60
 DEFAULT_TRANSPORT: Final = "tcp"
 DEFAULT_ADDR_OFFSET: Final = 0
+DEFAULT_PIPELINE_DEPTH: Final = 1
+MAX_PIPELINE_DEPTH: Final = 16
+DEFAULT_HOLD_RESYNC_SECONDS: Final = 300
+MAX_HOLD_RESYNC_SECONDS: Final = 86400
+DEFAULT_VERIFY_WRITES: Final = True
+DEFAULT_DIAGNOSTIC_SENSORS: Final = False
+DEFAULT_RAW_LOG: Final = False
+DEFAULT_RAW_LOG_MAX_MB: Final = 16
+MAX_RAW_LOG_MAX_MB: Final = 1024
+RAW_LOG_KEEP: Final = 3
+# Writes jump ahead of queued reads; with a budget set, read windows are capped so one in-flight read fits it.
+# 0 (default) = no cap: the planner keeps its full windows unless the user trades read size for write latency
+DEFAULT_MAX_WRITE_LATENCY_MS: Final = 0
+MAX_MAX_WRITE_LATENCY_MS: Final = 5000
+# Downsampling: hourly statistics aggregated from every poll (5 min bins), live measurement states at most every state_interval s (0 = every change)
+DEFAULT_IMPORT_STATISTICS: Final = False
+AGGREGATE_BIN_SECONDS: Final = 300
+DEFAULT_STATE_INTERVAL: Final = 0
+MAX_STATE_INTERVAL: Final = 3600
+# OpenMetrics scrape endpoint (/api/growatt_modbus/metrics), rendered once per poll cycle
+DEFAULT_METRICS_ENDPOINT: Final = False
+DEFAULT_RAW_ATTRIBUTES: Final = False  # raw_value state attribute on sensors (diagnostics only)
+# tcp/rtutcp through the built-in framer instead of pymodbus (one socket; poll reads go straight into the decode buffers).
+# The rtu transport (local serial port) always uses the built-in framer.
+DEFAULT_NATIVE_READS: Final = False
 
 DEFAULT_BAUDRATE: Final = 9600
 DEFAULT_BYTESIZE: Final = 8
 DEFAULT_PARITY: Final = "N"
 DEFAULT_STOPBITS: Final = 1
+# Serial timing: timeouts are the frames' wire time + t3.5 gaps + this slave turnaround allowance (+ gateway margin for rtutcp)
+SERIAL_TURNAROUND_MS: Final = 200
+GATEWAY_MARGIN_MS: Final = 1000
+
+# Read planner: Modbus PDU limit for FC03/FC04 and per-transport cost model (ms)
+MODBUS_MAX_READ_REGISTERS: Final = 125
+MODBUS_MAX_WRITE_REGISTERS: Final = 123
+DEFAULT_MAX_READ_REGISTERS: Final = MODBUS_MAX_READ_REGISTERS
+# Growatt firmware serves reads in 125-register blocks (0-124, 125-249, ..., 3000-3124, 3125-3249): a read may not cross a block edge
+READ_BLOCK_REGISTERS: Final = 125
+LINK_REQUEST_COST_MS: Final = {"tcp": 15.0, "rtutcp": 60.0, "rtu": 20.0}
+LINK_BYTE_COST_MS: Final = {"tcp": 0.01, "rtutcp": 11000.0 / DEFAULT_BAUDRATE}
+
+# Poll tiers: seconds between reads (0 = every cycle). A sensor's poll_interval overrides its tier.
+POLL_TIER_SECONDS: Final = {"fast": 0, "medium": 30, "slow": 300}
+DEFAULT_POLL_TIER: Final = "fast"
+
+# Warm start: per-entry snapshot of caches + read plan in HA storage
+STORAGE_VERSION: Final = 1
+STORAGE_KEY: Final = f"{DOMAIN}.warm_start"
+STORE_SAVE_DELAY: Final = 60
+
+# Failed read windows: retry after scan_interval * 2^(n-1) seconds, capped; split on these exception codes
+WINDOW_BACKOFF_MAX_SECONDS: Final = 900
+WINDOW_SPLIT_EXCEPTION_CODES: Final = (2, 3)  # illegal data address / illegal data value
+
+# Cycle budget: share of scan_interval a poll may take. The every-cycle tier is always read in full;
+# slower tiers (and the holding resync) get what is left and continue in later cycles.
+CYCLE_BUDGET_FRACTION: Final = 0.8
@@ -1,219 +1,657 @@
 
 from __future__ import annotations
-import asyncio, logging
-from dataclasses import dataclass
+import asyncio, hashlib, json, logging, time
+from dataclasses import asdict
 from datetime import timedelta
-from typing import Any, Dict, List, DefaultDict, Optional
+from typing import Any, Dict, List, DefaultDict, Optional, Set
 from collections import defaultdict
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from .const import DEFAULT_MAX_READ_REGISTERS, DEFAULT_MAX_WRITE_LATENCY_MS, DEFAULT_PIPELINE_DEPTH, MODBUS_MAX_WRITE_REGISTERS, READ_BLOCK_REGISTERS, DEFAULT_HOLD_RESYNC_SECONDS, STORE_SAVE_DELAY, CYCLE_BUDGET_FRACTION, WINDOW_BACKOFF_MAX_SECONDS, WINDOW_SPLIT_EXCEPTION_CODES
+from .framer import READ_FUNCTIONS, ModbusExceptionResponse
+from .connection import PRIORITY_READ, PRIORITY_WRITE, ModbusLink, acquire_link, async_release_link
+from .compat import ModbusCalls
+from .mapping import RegisterDef
+from .planner import PollGroup, ReadWindow, group_by_interval, link_cost, plan_windows, plan_cost
+from .decoder import WindowLayout, compile_windows, decode_bits, decode_value, raw_value
+from .metrics import PollMetrics
+from .discovery import RegisterScanner, render_skeleton
+from .derived import DerivedPlan
+from .aggregate import aggregated, async_import_hours
+from .exporter import render_families
 _LOGGER = logging.getLogger(__name__)
 
-try:
-    from pymodbus.client import AsyncModbusTcpClient, AsyncModbusSerialClient
-except Exception as exc:
-    _LOGGER.error("pymodbus import failed: %s", exc); raise
-
-@dataclass
-class RegisterDef:
-    name: str
-    unique_id: str
-    register_type: str  # "input" or "holding"
-    address: int
-    count: int = 1
-    scale: float = 1.0
-    unit_of_measurement: str | None = None
-    device_class: str | None = None
-    state_class: str | None = None
-    signed: bool = False
-    options: dict[int, str] | None = None  # enum mapping for sensor (0->"text")
+class WindowReadError(Exception):
+    """A window read answered with an error response (exception_code set) or too few registers."""
+    def __init__(self, register_type: str, start: int, count: int, exception_code: int | None = None) -> None:
+        super().__init__(f"{register_type} {start}..{start + count - 1}: " + (f"Modbus exception {exception_code}" if exception_code is not None else "no/short response"))
+        self.exception_code = exception_code
+
+class WindowHealth:
+    """Backoff state of a failing read window; parts = smaller windows read meanwhile to isolate a bad address."""
+    __slots__ = ("failures", "retry_at", "stale_since", "last_error", "parts")
+    def __init__(self) -> None:
+        self.failures = 0; self.retry_at = 0.0; self.stale_since = time.time()
+        self.last_error = ""; self.parts: Optional[List[WindowLayout]] = None
 
 class GrowattModbusCoordinator(DataUpdateCoordinator[dict[str, Any]]):
     """
-    First cycle after startup: HOLDING registers are read FIRST (one-time).
-    Next cycles: only INPUTs are polled; holdings come from cache.
-    Writes update cache immediately (16b & 32b) and trigger UI refresh.
+    First cycle after startup: HOLDING registers are read FIRST, then resynced every hold_resync seconds.
+    Next cycles: only INPUTs that are due (per poll tier) are polled; the rest come from cache.
+    Writes update cache immediately (16b & 32b), are read back and published without a full refresh.
     """
-    def __init__(self, hass: HomeAssistant, host: str, port: int, unit_id: int, registers, scan_interval: int, transport="tcp", serial_params=None, address_offset: int = 0) -> None:
-        super().__init__(hass, _LOGGER, name="growatt_modbus coordinator", update_interval=timedelta(seconds=scan_interval))
+    def __init__(self, hass: HomeAssistant, host: str, port: int, unit_id: int, registers, scan_interval: int, transport="tcp", serial_params=None, address_offset: int = 0, max_read_registers: int = DEFAULT_MAX_READ_REGISTERS, pipeline_depth: int = DEFAULT_PIPELINE_DEPTH, hold_resync: int = DEFAULT_HOLD_RESYNC_SECONDS, verify_writes: bool = True, store=None, warm_state: dict | None = None, recorder=None, unit_key: str = "", max_write_latency_ms: int = DEFAULT_MAX_WRITE_LATENCY_MS, aggregator=None, statistic_prefix: str = "", state_interval: int = 0, native_reads: bool = False) -> None:
+        super().__init__(hass, _LOGGER, name=f"growatt_modbus coordinator {unit_key}".rstrip(), update_interval=timedelta(seconds=scan_interval))
+        self.unit_key = unit_key  # "" for the entry's first unit, "u<id>" for extra unit ids on the same link
+        self.poll_phase: float | None = None  # seconds into each interval this unit polls at (units sharing a link)
         self._host, self._port, self._unit_id = host, port, unit_id
         self._registers: List[RegisterDef] = registers; self._transport = (transport or "tcp").lower()
-        self._serial_params = serial_params or {}; self._client = None; self._lock = asyncio.Lock()
+        self._serial_params = serial_params or {}; self._lock = asyncio.Lock()
+        self._link: Optional[ModbusLink] = None; self._pipeline_depth = int(pipeline_depth or 1); self._native_reads = bool(native_reads)
+        self._calls: Optional[ModbusCalls] = None
         self._addr_off = int(address_offset or 0)
+        self.metrics = PollMetrics()
+        self._recorder = recorder
+        self._health: Dict[tuple[str, int, int], WindowHealth] = {}
+        self._stale: Dict[str, float] = {}  # unique_id -> wall time its window started failing
+        self._stale_flips: Set[str] = set()  # uids that became stale/fresh since the last notification
+        self._cycle_ok = 0; self._cycle_failed = 0; self._link_down = False
+        self._aggregator = aggregator; self._statistic_prefix = statistic_prefix
+        if aggregator is not None:
+            aggregator.restore((warm_state or {}).get("aggregate"))
+        self._state_interval = float(state_interval or 0)
+        self._throttled = frozenset(r.unique_id for r in registers if aggregated(r)) if self._state_interval else frozenset()
+        self._held: Set[str] = set(); self._next_state_write = 0.0
+        self.openmetrics: Optional[Dict[str, str]] = None  # per-family sample lines, see enable_export()
+        self.export_generation = 0; self._export_labels: List[tuple[str, Any]] = []
 
-        self._hold_once_done = False
+        self._verify_writes = bool(verify_writes)
         self._hold_cache: Dict[str, Any] = {}
-        self._hold_regs_by_addr: DefaultDict[int, List[RegisterDef]] = defaultdict(list)
+        self._hold_regs_by_word: DefaultDict[int, List[RegisterDef]] = defaultdict(list)  # every word address a holding covers
+        self._bitfields: Dict[str, List[RegisterDef]] = defaultdict(list)
+        for r in self._registers:
+            if r.register_type == "bitfield":
+                self._bitfields[r.parent].append(r)
+        self._bitfields = dict(self._bitfields)
         for r in self._registers:
             if r.register_type == "holding":
-                self._hold_regs_by_addr[int(r.address)].append(r)
+                for k in range(int(r.count)):
+                    self._hold_regs_by_word[int(r.address) + k].append(r)
+
+        self._cost = link_cost(self._transport, self._serial_params.get("baudrate"))
+        self._max_read = max(1, min(DEFAULT_MAX_READ_REGISTERS, int(max_read_registers or DEFAULT_MAX_READ_REGISTERS)))
+        self._write_budget_ms = float(max_write_latency_ms or 0)
+        if self._write_budget_ms:
+            # a write waits at most for the read in flight: keep every window short enough that both fit the budget
+            fit = int((self._write_budget_ms - 2 * self._cost.request_ms) / self._cost.word_ms) if self._cost.word_ms else self._max_read
+            if fit < 1:
+                _LOGGER.warning("Write latency budget %.0f ms is below two round trips on this link; windows not capped", self._write_budget_ms)
+            elif fit < self._max_read:
+                _LOGGER.info("Read windows capped at %s registers to keep writes within %.0f ms", fit, self._write_budget_ms)
+                self._max_read = fit
+        self._store = store; self._save_requested = 0.0
+        self.fingerprint = self._fingerprint(scan_interval)
+        warm_plan = (warm_state or {}).get("plan") if (warm_state or {}).get("fingerprint") == self.fingerprint else None
+        self._plan: Dict[str, List[WindowLayout]] = {"holding": [], "input": []}
+        self._input_groups: List[PollGroup] = []
+        try:
+            if warm_plan: self._load_plan(warm_plan)
+        except (KeyError, TypeError, ValueError) as err:
+            _LOGGER.warning("Stored read plan unusable, re-planning: %s", err); warm_plan = None
+        if not warm_plan:
+            self._plan = {"holding": [], "input": []}; self._input_groups = []
+            holdings = [r for r in self._registers if r.register_type == "holding"]
+            inputs = [r for r in self._registers if r.register_type == "input"]
+            self._plan["holding"] = self._compile(holdings, "holding")
+            for interval, regs in group_by_interval(inputs, scan_interval).items():
+                layouts = self._compile(regs, "input")
+                self._input_groups.append(PollGroup(interval, layouts))
+                self._plan["input"].extend(layouts)
+        self._hold_group = PollGroup(float(hold_resync) if hold_resync and int(hold_resync) > 0 else float("inf"), self._plan["holding"])
+        self._input_cache: Dict[str, Any] = {}
+        self._derived = DerivedPlan(self._registers)
+        self._published: Dict[str, Any] = {}
+        self._changed: Optional[Set[str]] = None  # None = notify everything (first cycle / failure)
+        self._deadbands: Dict[str, tuple[float, float]] = {
+            r.unique_id: (float(r.deadband or 0.0), float(r.deadband_pct or 0.0) / 100.0)
+            for r in self._registers if r.deadband or r.deadband_pct
+        }
+        _LOGGER.info(
+            "Read plan: %s holding / %s input windows in %s poll groups (est. %.0f ms per fast cycle)",
+            len(self._plan["holding"]), len(self._plan["input"]), len(self._input_groups),
+            plan_cost(self._input_groups[0].windows if self._input_groups and self._input_groups[0].interval <= 0 else [], self._cost),
+        )
+
+    def _compile(self, regs: List[RegisterDef], rtype: str) -> List[WindowLayout]:
+        return compile_windows(plan_windows(regs, rtype, self._cost, self._max_read, READ_BLOCK_REGISTERS, self._addr_off), self._bitfields)
+
+    def _fingerprint(self, scan_interval: int) -> str:
+        """Hash of everything the read plan depends on: mapping, window limit, block alignment (address offset), link cost, scan interval."""
+        blob = json.dumps({
+            "registers": [asdict(r) for r in self._registers], "max_read": self._max_read, "block": READ_BLOCK_REGISTERS, "offset": self._addr_off,
+            "cost": [self._cost.request_ms, self._cost.word_ms], "scan": int(scan_interval),
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _dump_plan(self) -> dict[str, Any]:
+        win = lambda w: [w.start, w.count, [r.unique_id for r in w.registers]]
+        return {"holding": [win(w) for w in self._plan["holding"]],
+                "input": [[g.interval, [win(w) for w in g.windows]] for g in self._input_groups]}
+
+    def _load_plan(self, plan: dict[str, Any]) -> None:
+        by_uid: DefaultDict[tuple[str, str], List[RegisterDef]] = defaultdict(list)
+        for r in self._registers:
+            by_uid[(r.register_type, r.unique_id)].append(r)
+        def layout(rtype: str, item) -> WindowLayout:
+            start, count, uids = item
+            regs = tuple(r for uid in dict.fromkeys(uids) for r in by_uid[(rtype, uid)])
+            return WindowLayout(ReadWindow(rtype, int(start), int(count), regs), self._bitfields)
+        self._plan["holding"] = [layout("holding", w) for w in plan["holding"]]
+        for interval, windows in plan["input"]:
+            layouts = [layout("input", w) for w in windows]
+            self._input_groups.append(PollGroup(float(interval), layouts))
+            self._plan["input"].extend(layouts)
+        _LOGGER.debug("Read plan restored from storage")
+
+    def restore_state(self, warm_state: dict | None) -> bool:
+        """Seed caches and data from a stored snapshot of the same mapping; True if entities can start warm."""
+        if not warm_state or warm_state.get("fingerprint") != self.fingerprint:
+            return False
+        self._hold_cache.update(warm_state.get("holding") or {})
+        self._input_cache.update(warm_state.get("input") or {})
+        data = {**self._input_cache, **self._hold_cache}
+        if not data:
+            return False
+        self._derived.evaluate(data)
+        self._apply_changes(data)
+        self.data = data
+        return True
+
+    def export_state(self) -> dict[str, Any]:
+        state = {"fingerprint": self.fingerprint, "plan": self._dump_plan(),
+                 "holding": dict(self._hold_cache), "input": dict(self._input_cache)}
+        if self._aggregator is not None:
+            state["aggregate"] = self._aggregator.export()
+        return state
+
+    def _schedule_save(self) -> None:
+        """Persist lazily; the snapshot is taken when the store writes (and on HA shutdown)."""
+        if self._store is None:
+            return
+        now = time.monotonic()
+        if now - self._save_requested < STORE_SAVE_DELAY:
+            return
+        self._save_requested = now
+        self._store.async_delay_save(self.export_state, STORE_SAVE_DELAY)
 
     def _addr(self, addr: int) -> int: return int(addr) - self._addr_off if self._addr_off else int(addr)
 
+    def _get_link(self) -> ModbusLink:
+        if self._link is None:
+            self._link = acquire_link(self._transport, self._host, self._port, self._serial_params, self._pipeline_depth, self._native_reads)
+        return self._link
+
     async def _ensure_client(self):
-        if self._client is None:
-            if self._transport == "rtutcp":
-                url = f"socket://{self._host}:{self._port}"
-                params = {"method":"rtu","port":url,"baudrate":int(self._serial_params.get("baudrate",9600)),"bytesize":int(self._serial_params.get("bytesize",8)),"parity":str(self._serial_params.get("parity","N")),"stopbits":int(self._serial_params.get("stopbits",1)),"timeout":5}
-                self._client = AsyncModbusSerialClient(**params)
-            else:
-                try: self._client = AsyncModbusTcpClient(self._host, port=self._port, timeout=5)
-                except TypeError: self._client = AsyncModbusTcpClient(self._host, port=self._port)
-        if not bool(getattr(self._client, "connected", False)):
-            try: res = await self._client.connect()
-            except Exception as e: raise UpdateFailed(f"Modbus connect failed: {e}") from e
-        return self._client
+        link = self._get_link()
+        try: return await link.ensure_connected()
+        except Exception as e: raise UpdateFailed(f"Modbus connect failed: {e}") from e
+        finally: self.metrics.reconnects = max(0, self._link.connects - 1)
+
+    async def _ensure_calls(self) -> ModbusCalls:
+        """Callables bound to the current client and unit id; rebound only when the link creates a new client."""
+        client = await self._ensure_client()
+        if self._calls is None or self._calls.client is not client:
+            self._calls = ModbusCalls(client, self._unit_id)
+        return self._calls
 
     async def _async_update_data(self) -> dict[str, Any]:
         async with self._lock:
+            started = time.perf_counter(); ok = False; result: dict[str, Any] = {}
             try:
-                result: dict[str, Any] = {}
-                inputs = [r for r in self._registers if r.register_type == "input"]
-                holdings = [r for r in self._registers if r.register_type == "holding"]
-
-                # First cycle: read HOLDINGS FIRST, then inputs
-                if not self._hold_once_done and holdings:
-                    _LOGGER.info("First cycle: reading HOLDING registers first")
-                    await self._read_grouped(holdings, result, self._read_holding)
-                    for r in holdings:
-                        self._hold_cache[r.unique_id] = result.get(r.unique_id)
-                    self._hold_once_done = True
-
-                    if inputs:
-                        await self._read_grouped(inputs, result, self._read_input)
-                else:
-                    # Later cycles: inputs only; holdings from cache
-                    if inputs:
-                        await self._read_grouped(inputs, result, self._read_input)
-                    for r in holdings:
-                        result[r.unique_id] = self._hold_cache.get(r.unique_id)
+                holdings = self._plan["holding"]
+                self._cycle_ok = self._cycle_failed = 0; self._link_down = False
 
+                # HOLDINGS first on startup; afterwards their resync is the lowest-priority tier
+                now = time.monotonic()
+                if holdings and not self._hold_cache and self._hold_group.due(now):
+                    _LOGGER.info("Reading HOLDING registers (first cycle)")
+                    fresh: dict[str, Any] = {}; before = (self._cycle_ok, self._cycle_failed)
+                    await self._read_grouped(holdings, fresh, self._read_holding)
+                    self._hold_cache.update(fresh)
+                    if self._pass_ok(before):  # otherwise still due: retried next cycle
+                        self._hold_group.mark_read(now)
+                        self.metrics.tier("holding", self._hold_group.interval).completed(now)
+
+                await self._read_due(started)
+                result.update(self._input_cache)
+                if self._cycle_failed and not self._cycle_ok:
+                    # nothing to isolate when everything fails: retry all windows next cycle
+                    for h in self._health.values():
+                        h.retry_at = 0.0
+                    raise UpdateFailed(f"All {self._cycle_failed} read windows failed")
+                for w in holdings:
+                    for uid in w.uids:
+                        result[uid] = self._hold_cache.get(uid)
+                self._derived.evaluate(result)
+                if self._aggregator:
+                    rows = self._aggregator.add(time.time(), result)
+                    if rows:
+                        self.hass.async_create_task(async_import_hours(self.hass, self._aggregator, self._statistic_prefix, rows))
+                        self._save_requested = 0.0  # persist the new energy sums
+
+                self._apply_changes(result)
+                self._schedule_save()
+                ok = True
                 return result
             except Exception as err:
+                self._changed = None
                 raise UpdateFailed(err) from err
+            finally:
+                interval = self.update_interval.total_seconds() if self.update_interval else 0.0
+                self.metrics.record_cycle(time.perf_counter() - started, interval, ok)
+                self._commit_raw()
+                self._render_export(result if ok else self.data)
+
+    def enable_export(self, labels: List[tuple[str, Any]]) -> None:
+        self._export_labels = list(labels); self._render_export(self.data)
+
+    def _render_export(self, data: dict[str, Any] | None) -> None:
+        if self._export_labels:
+            self.openmetrics = render_families(self._export_labels, self._registers, data, self._stale, self.metrics)
+            self.export_generation += 1
+
+    def _apply_changes(self, result: dict[str, Any]) -> None:
+        """Record which unique_ids changed; values inside their deadband keep the last published value."""
+        changed: Set[str] = set(); published = self._published; deadbands = self._deadbands
+        for uid, v in result.items():
+            if uid in published:
+                old = published[uid]
+                if v == old:
+                    continue
+                db = deadbands.get(uid)
+                if db and v is not None and old is not None:
+                    try:
+                        if abs(v - old) <= max(db[0], db[1] * abs(old)):
+                            result[uid] = old; continue
+                    except TypeError:
+                        pass
+            published[uid] = v; changed.add(uid)
+        changed |= self._stale_flips; self._stale_flips.clear()
+        if self._throttled:
+            # reduced state rate: hold measurement changes back until the next state write is due
+            now = time.monotonic()
+            if now < self._next_state_write:
+                self._held |= changed & self._throttled; changed -= self._throttled
+            else:
+                changed |= self._held; self._held.clear(); self._next_state_write = now + self._state_interval
+        # after a failed cycle every entity must refresh its availability
+        self._changed = changed if self.last_update_success and self.data is not None else None
+
+    def _schedule_refresh(self) -> None:
+        """
+        With a poll_phase, the next poll is the first phase + k * interval slot after now on the event
+        loop clock, so a unit keeps its slot however long the last poll took. HA schedules at
+        int(loop.time()) + _microsecond + interval; _microsecond carries the (possibly negative) offset.
+        """
+        if self.poll_phase is not None and self.update_interval:
+            iv = self.update_interval.total_seconds(); now = self.hass.loop.time()
+            at = now + (self.poll_phase - now) % iv
+            if at <= now:
+                at += iv
+            self._microsecond = at - (int(now) + iv)
+        super()._schedule_refresh()
+
+    def changed(self, uid: str | None = None) -> bool:
+        """True if the last cycle changed uid (uid=None: only when all entities must be refreshed)."""
+        if self._changed is None:
+            return True
+        return uid is not None and uid in self._changed
 
-    async def _read_grouped(self, regs: list[RegisterDef], out: dict[str, Any], fn):
-        regs = sorted(regs, key=lambda r: r.address)
-        GAP = 4; start=None; end=None; acc=[]
-        for r in regs:
-            if start is None: start=r.address; end=r.address+r.count; acc=[r]; continue
-            if r.address <= end+GAP: end=max(end, r.address+r.count); acc.append(r)
-            else: await self._read_window(fn, out, start, end, acc); start=r.address; end=r.address+r.count; acc=[r]
-        if start is not None: await self._read_window(fn, out, start, end, acc)
-
-    async def _read_window(self, fn, out, start, end, regs):
-        raw = await fn(self._addr(start), end-start)
-        for r in regs:
-            val=None
-            if raw:
-                off = r.address-start; chunk = raw[off:off+r.count]
-                if len(chunk) >= r.count:
-                    if r.count==1:
-                        v=chunk[0]; 
-                        if r.signed and v>=0x8000: v-=0x10000
-                        val = v * r.scale
-                    elif r.count==2:
-                        high,low=chunk[0],chunk[1]; v=(high<<16)|low
-                        if r.signed and v>=0x80000000: v-=0x100000000
-                        val = v * r.scale
-            out[r.unique_id]=val
-
-    async def _call_read(self, method_name, address, count):
-        client = await self._ensure_client(); method = getattr(client, method_name)
-        a = self._addr(address)
-        for args in ((a, count, self._unit_id), (a, count)):
-            try: return await method(*args)
-            except TypeError:
-                try: return await method(address=a, count=count, unit=self._unit_id)
-                except TypeError:
-                    try: return await method(address=a, count=count)
-                    except TypeError: continue
-        return None
-
-    async def _read_input(self, address, count):
-        rr = await self._call_read("read_input_registers", address, count)
-        return None if rr is None or (getattr(rr,"isError",None) and rr.isError()) else getattr(rr,"registers",None)
-
-    async def _read_holding(self, address, count):
-        rr = await self._call_read("read_holding_registers", address, count)
-        return None if rr is None or (getattr(rr,"isError",None) and rr.isError()) else getattr(rr,"registers",None)
+    def _window_ms(self, w: WindowLayout) -> float:
+        return self.metrics.window_ms(w.register_type, w.start, w.count, self._cost.window(w.count))
+
+    async def _read_due(self, started: float) -> None:
+        """
+        Read due groups in priority order (input tiers fast to slow, then the holding resync) within the
+        cycle budget; values of groups not due come from the last-known cache. The every-cycle tier is
+        never cut; a cut group keeps its cursor and continues next cycle before it counts as read.
+        At least one deferred window is read per cycle so slow tiers cannot starve.
+        """
+        interval = self.update_interval.total_seconds() if self.update_interval else 0.0
+        now = time.monotonic(); slack = interval / 2; budget_ms = interval * CYCLE_BUDGET_FRACTION * 1000.0
+        progressed = False
+        groups = [(g, self._read_input, self._input_cache) for g in self._input_groups]
+        if self._hold_cache:
+            groups.append((self._hold_group, self._read_holding, self._hold_cache))
+        for g, fn, cache in groups:
+            if not g.windows or not g.due(now, slack):
+                continue
+            rtype = g.windows[0].register_type
+            windows = g.windows[g.cursor:]
+            if g.interval > 0 and budget_ms:
+                left = budget_ms - (time.perf_counter() - started) * 1000.0; cost = 0.0; n = 0
+                for w in windows:
+                    cost += self._window_ms(w)
+                    if cost > left and (n or progressed):
+                        break
+                    n += 1
+                if n < len(windows):
+                    self.metrics.record_deferred(rtype, g.interval, len(windows) - n)
+                windows = windows[:n]; progressed = progressed or bool(n)
+            if not windows:
+                continue
+            if g is self._hold_group and not g.cursor:
+                _LOGGER.info("Reading HOLDING registers (resync)")
+            fresh: dict[str, Any] = {}; before = (self._cycle_ok, self._cycle_failed)
+            await self._read_grouped(windows, fresh, fn)
+            cache.update(fresh)
+            if not self._pass_ok(before):
+                continue  # same windows again next cycle
+            g.cursor += len(windows)
+            if g.cursor >= len(g.windows):
+                g.cursor = 0; g.mark_read(now)
+                self.metrics.tier(rtype, g.interval).completed(now)
+
+    def _pass_ok(self, before: tuple[int, int]) -> bool:
+        """A read pass counts as done unless the link went down or none of its windows could be read."""
+        ok, failed = before
+        return not self._link_down and (self._cycle_ok > ok or self._cycle_failed == failed)
+
+    async def _read_grouped(self, windows: list[WindowLayout], out: dict[str, Any], fn):
+        if self._link is not None and self._link.depth > 1 and len(windows) > 1:
+            # pipelined TCP link: keep several windows in flight
+            await asyncio.gather(*(self._read_isolated(fn, out, w) for w in windows))
+            return
+        for w in windows:
+            await self._read_isolated(fn, out, w)
+
+    async def _read_window(self, fn, out, layout: WindowLayout):
+        """Read and decode one window; raises WindowReadError on an error/short response (out untouched)."""
+        started = time.perf_counter()
+        try:
+            rr = await fn(layout.start, layout.count, into=layout.buf)
+        except ModbusExceptionResponse as err:
+            self.metrics.record_window(layout.register_type, layout.start, layout.count, time.perf_counter() - started, False, err.exception_code)
+            raise WindowReadError(layout.register_type, layout.start, layout.count, err.exception_code) from err
+        except Exception as err:
+            self.metrics.record_window(layout.register_type, layout.start, layout.count, time.perf_counter() - started, False, error=err)
+            raise
+        if isinstance(rr, memoryview):  # native read: the words are already in layout.buf
+            self.metrics.record_window(layout.register_type, layout.start, layout.count, time.perf_counter() - started, True)
+            if self._recorder is not None:
+                self._recorder.add(layout.register_type, self._addr(layout.start), rr)
+            layout.decode(rr, out); return
+        raw = None if rr is None or (getattr(rr, "isError", None) and rr.isError()) else getattr(rr, "registers", None)
+        if not raw or len(raw) < layout.count:
+            code = getattr(rr, "exception_code", None)
+            self.metrics.record_window(layout.register_type, layout.start, layout.count, time.perf_counter() - started, False, code)
+            raise WindowReadError(layout.register_type, layout.start, layout.count, code)
+        self.metrics.record_window(layout.register_type, layout.start, layout.count, time.perf_counter() - started, True)
+        buf = layout.pack(raw)
+        if self._recorder is not None:
+            self._recorder.add(layout.register_type, self._addr(layout.start), buf)
+        layout.decode(buf, out)
+
+    def _commit_raw(self) -> None:
+        """Close the raw-log frame of this cycle; file writes happen in the executor."""
+        rec = self._recorder
+        if rec is not None and rec.commit():
+            self.hass.async_add_executor_job(rec.flush, rec.take())
+
+    async def _read_isolated(self, fn, out, layout: WindowLayout) -> None:
+        """
+        Read one window without letting its failure spill over: on error the window's registers
+        keep their cached values, it backs off exponentially, and on illegal address it is split
+        so the readable part still gets polled while the bad register is narrowed down.
+        """
+        if self._link_down:
+            self._cycle_failed += 1; return
+        key = (layout.register_type, layout.start, layout.count); h = self._health.get(key)
+        if h is not None and time.monotonic() < h.retry_at:
+            if h.parts:
+                for part in h.parts:
+                    await self._read_isolated(fn, out, part)
+            else:
+                self._cycle_failed += 1
+            return
+        try:
+            await self._read_window(fn, out, layout)
+        except Exception as err:
+            self._cycle_failed += 1
+            if not isinstance(err, WindowReadError) and not (self._link and self._link.connected):
+                # connection lost: skip the rest of this cycle instead of reconnecting per window
+                self._link_down = True
+            h = self._window_failed(key, layout, err)
+            if h.parts:
+                for part in h.parts:
+                    await self._read_isolated(fn, out, part)
+            return
+        self._cycle_ok += 1
+        if h is not None:
+            _LOGGER.info("Window %s %s..%s readable again after %s failures", layout.register_type, layout.start, layout.end - 1, h.failures)
+            self._clear_health(key)
+        for uid in layout.uids:
+            if self._stale.pop(uid, None) is not None:
+                self._stale_flips.add(uid)
+
+    def _window_failed(self, key, layout: WindowLayout, err: Exception) -> WindowHealth:
+        h = self._health.get(key)
+        if h is None:
+            h = self._health[key] = WindowHealth()
+        h.failures += 1; h.last_error = str(err) or type(err).__name__
+        base = self.update_interval.total_seconds() if self.update_interval else 1.0
+        h.retry_at = time.monotonic() + min(WINDOW_BACKOFF_MAX_SECONDS, base * 2 ** (h.failures - 1))
+        code = getattr(err, "exception_code", None)
+        if h.parts is None and code in WINDOW_SPLIT_EXCEPTION_CODES and len(layout.registers) > 1:
+            regs = sorted(layout.registers, key=lambda r: r.address); mid = len(regs) // 2
+            h.parts = self._compile(regs[:mid], layout.register_type) + self._compile(regs[mid:], layout.register_type)
+            _LOGGER.info("Window %s %s..%s: %s; splitting into %s", layout.register_type, layout.start, layout.end - 1, err, [(p.start, p.count) for p in h.parts])
+        elif not h.parts:
+            if h.failures == 1:
+                _LOGGER.warning("Read of %s failed (%s); keeping last values, retrying with backoff", [r.unique_id for r in layout.registers], h.last_error)
+            now = time.time()
+            for uid in layout.uids:
+                if uid not in self._stale:
+                    self._stale[uid] = now; self._stale_flips.add(uid)
+        return h
+
+    def _clear_health(self, key) -> None:
+        h = self._health.pop(key, None)
+        for part in (h.parts or []) if h else []:
+            self._clear_health((part.register_type, part.start, part.count))
+
+    def stale_since(self, uid: str) -> float | None:
+        """Wall time since which uid's value is the last good one (its window keeps failing), else None."""
+        return self._stale.get(uid)
+
+    async def _call_read(self, method_name, address, count, priority: int = PRIORITY_READ, into: bytearray | None = None):
+        """One read transaction; on a native link with a buffer to fill, returns a memoryview of it instead of a response."""
+        if into is not None and self._get_link().native:
+            client = await self._ensure_client()
+            async with self._link.transaction(priority):
+                return await client.read_into(READ_FUNCTIONS[method_name], self._unit_id, self._addr(address), count, into)
+        calls = await self._ensure_calls()
+        async with self._link.transaction(priority):
+            return await calls.read(method_name, self._addr(address), count)
+
+    async def _call_write(self, method_name: str, address: int, value) -> bool:
+        """One write transaction, queued ahead of poll reads; refresh happens after the slot is released."""
+        started = time.perf_counter(); sent = started; ok = False
+        try:
+            calls = await self._ensure_calls()
+            async with self._link.transaction(PRIORITY_WRITE):
+                sent = time.perf_counter()
+                rr = await calls.write(method_name, self._addr(address), value)
+            ok = not getattr(rr, "isError", lambda: False)()
+        except Exception as err:
+            _LOGGER.warning("%s @%s failed: %s", method_name, address, err)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.record_write(sent - started, elapsed, ok, self._write_budget_ms)
+            if self._write_budget_ms and elapsed * 1000.0 > self._write_budget_ms:
+                _LOGGER.debug("%s @%s took %.0f ms (%.0f ms queued), budget %.0f ms", method_name, address, elapsed * 1000.0, (sent - started) * 1000.0, self._write_budget_ms)
+        return ok
+
+    async def _readback_holding(self, address, count, into=None):
+        return await self._call_read("read_holding_registers", address, count, PRIORITY_WRITE, into)
+
+    async def _read_input(self, address, count, into=None):
+        return await self._call_read("read_input_registers", address, count, PRIORITY_READ, into)
+
+    async def _read_holding(self, address, count, into=None):
+        return await self._call_read("read_holding_registers", address, count, PRIORITY_READ, into)
+
+    async def probe(self, register_type: str, address: int, count: int) -> list[int]:
+        """One read outside the plan (register discovery); raises WindowReadError on error/short responses."""
+        rr = await (self._read_input if register_type == "input" else self._read_holding)(address, count)
+        raw = None if rr is None or (getattr(rr, "isError", None) and rr.isError()) else getattr(rr, "registers", None)
+        if not raw or len(raw) < count:
+            raise WindowReadError(register_type, address, count, getattr(rr, "exception_code", None))
+        return list(raw[:count])
+
+    async def discover(self, register_types: list[str], first: int, last: int, max_gap_step: int = 16) -> str:
+        """Scan address ranges through probe() and return a skeleton map.yaml with the read plan for this link."""
+        scanner = RegisterScanner(self.probe, self._max_read, max_gap_step)
+        results = [await scanner.scan(t, first, last) for t in register_types]
+        return render_skeleton(results, self._cost, self._max_read)
+
+    def _holdings_in(self, address: int, count: int) -> Dict[int, RegisterDef]:
+        """Holding registers sharing at least one word with address..address+count-1 (by id)."""
+        return {id(r): r for i in range(count) for r in self._hold_regs_by_word.get(address + i, [])}
+
+    def _update_hold_cache(self, address: int, values: list[int]) -> None:
+        """Write-through: update every holding register fully covered by the written words."""
+        for r in self._holdings_in(address, len(values)).values():
+            i = int(r.address) - address
+            if i >= 0 and i + r.count <= len(values):
+                self._hold_cache[r.unique_id] = decode_value(r, values[i:i + r.count])
+                if r.unique_id in self._bitfields:
+                    self._hold_cache.update(decode_bits(self._bitfields[r.unique_id], raw_value(values[i:i + r.count], r.word_order)))
+
+    async def _after_write(self, spans: list[tuple[int, int]]) -> None:
+        """Read back only the holding registers touched by the written spans and publish them."""
+        touched = {k: r for a, n in spans for k, r in self._holdings_in(a, n).items()}
+        # only registers whose every word was written have an expected value (same rule as _update_hold_cache)
+        written = {r.unique_id for a, n in spans for r in self._holdings_in(a, n).values() if a <= r.address and r.address + r.count <= a + n}
+        written |= {c.unique_id for uid in written for c in self._bitfields.get(uid, ())}
+        if self._verify_writes and touched:
+            for layout in self._compile(list(touched.values()), "holding"):
+                fresh: dict[str, Any] = {}
+                try:
+                    await self._read_window(self._readback_holding, fresh, layout)
+                except Exception as err:
+                    _LOGGER.warning("Readback of %s..%s failed: %s", layout.start, layout.end - 1, err); continue
+                for uid, v in fresh.items():
+                    if v is None:
+                        continue
+                    if uid in written and self._hold_cache.get(uid) != v:
+                        _LOGGER.warning("Readback %s = %s differs from written %s", uid, v, self._hold_cache.get(uid))
+                    self._hold_cache[uid] = v
+        self._publish_holdings()
+
+    def _publish_holdings(self) -> None:
+        """Push the holding cache to entities without re-reading inputs."""
+        if self.data is None:
+            return
+        data = dict(self.data)
+        for w in self._plan["holding"]:
+            for uid in w.uids:
+                data[uid] = self._hold_cache.get(uid)
+        self._derived.evaluate(data)
+        self._apply_changes(data)
+        self.data = data
+        self._render_export(data)
+        self._schedule_save()
+        self.async_update_listeners()
 
     async def write_single_register(self, address: int, value: int) -> bool:
-        a=self._addr(address); client=await self._ensure_client()
-        for variant in (lambda: client.write_register(a,value,self._unit_id), lambda: client.write_register(address=a,value=value,unit=self._unit_id), lambda: client.write_register(a,value), lambda: client.write_register(address=a,value=value)):
-            try:
-                rr = await variant()
-                if getattr(rr,"isError",lambda: False)(): continue
-                # update cache for 16-bit sensors at this address
-                for r in self._hold_regs_by_addr.get(int(address), []):
-                    if r.count == 1:
-                        self._hold_cache[r.unique_id] = (value * r.scale)
-                await self.async_request_refresh()
-                return True
-            except TypeError: continue
-            except Exception: return False
-        return False
+        if not await self._call_write("write_register", address, value):
+            return False
+        self._update_hold_cache(int(address), [value])
+        await self._after_write([(int(address), 1)])
+        return True
 
     async def write_multiple_registers(self, address: int, values: list[int]) -> bool:
-        a=self._addr(address); client=await self._ensure_client()
-        for variant in (lambda: client.write_registers(a,values,self._unit_id),
-                        lambda: client.write_registers(address=a, values=values, unit=self._unit_id),
-                        lambda: client.write_registers(a,values),
-                        lambda: client.write_registers(address=a, values=values)):
-            try:
-                rr = await variant()
-                if getattr(rr,"isError",lambda: False)(): continue
-
-                # 16b cache updates
-                for i, val in enumerate(values):
-                    addr_i = address + i
-                    for r in self._hold_regs_by_addr.get(addr_i, []):
-                        if r.count == 1:
-                            self._hold_cache[r.unique_id] = (val * r.scale)
-
-                # 32b cache update at base address if two or more values provided
-                if len(values) >= 2:
-                    hi, lo = values[0] & 0xFFFF, values[1] & 0xFFFF
-                    u32 = ((hi << 16) | lo)
-                    for r in self._hold_regs_by_addr.get(int(address), []):
-                        if r.count == 2:
-                            self._hold_cache[r.unique_id] = (u32 * r.scale)
-
-                await self.async_request_refresh()
-                return True
-            except TypeError: continue
-            except Exception: return False
-        return False
+        if not await self._call_write("write_registers", address, values):
+            return False
+        self._update_hold_cache(int(address), values)
+        await self._after_write([(int(address), len(values))])
+        return True
+
+    @staticmethod
+    def coalesce_writes(writes: list[tuple[int, int]]) -> list[tuple[int, list[int]]]:
+        """Merge address/value pairs into runs of contiguous addresses (last value wins, FC16 size limit)."""
+        by_addr: dict[int, int] = {}
+        for address, value in writes:
+            by_addr[int(address)] = int(value) & 0xFFFF
+        runs: list[tuple[int, list[int]]] = []
+        for address in sorted(by_addr):
+            if runs and runs[-1][0] + len(runs[-1][1]) == address and len(runs[-1][1]) < MODBUS_MAX_WRITE_REGISTERS:
+                runs[-1][1].append(by_addr[address])
+            else:
+                runs.append((address, [by_addr[address]]))
+        return runs
+
+    async def write_batch(self, writes: list[tuple[int, int]]) -> bool:
+        """
+        Write many holding registers with as few transactions as possible:
+        contiguous addresses go out as one FC16, isolated ones as FC06.
+        Stops at the first failed transaction; written spans are read back once at the end.
+        """
+        ok = True; written: list[tuple[int, int]] = []
+        for address, values in self.coalesce_writes(writes):
+            if len(values) == 1:
+                ok = await self._call_write("write_register", address, values[0])
+            else:
+                ok = await self._call_write("write_registers", address, values)
+            if not ok:
+                _LOGGER.warning("write_batch stopped at %s (%s registers); %s transactions done", address, len(values), len(written))
+                break
+            self._update_hold_cache(address, values); written.append((address, len(values)))
+        if written:
+            await self._after_write(written)
+        return ok
 
     async def write_u32(self, base_address: int, value: int, word_order: str = "high_low") -> bool:
         v = int(value) & 0xFFFFFFFF
         hi = (v >> 16) & 0xFFFF; lo = v & 0xFFFF
         values = [hi, lo] if word_order == "high_low" else [lo, hi]
-        ok = await self.write_multiple_registers(base_address, values)
-        if ok:
-            for r in self._hold_regs_by_addr.get(int(base_address), []):
-                if r.count == 2:
-                    self._hold_cache[r.unique_id] = (v * r.scale)
-        return ok
+        return await self.write_multiple_registers(base_address, values)
 
     async def write_coil(self, address: int, value: int) -> bool:
-        a = self._addr(address); client = await self._ensure_client()
-        for variant in (lambda: client.write_coil(a, bool(value), self._unit_id),
-                        lambda: client.write_coil(address=a, value=bool(value), unit=self._unit_id),
-                        lambda: client.write_coil(a, bool(value)),
-                        lambda: client.write_coil(address=a, value=bool(value))):
-            try:
-                rr = await variant()
-                if getattr(rr,"isError",lambda: False)(): continue
-                await self.async_request_refresh()
-                return True
-            except TypeError: continue
-            except Exception: return False
-        return False
+        if not await self._call_write("write_coil", address, bool(value)):
+            return False
+        await self.async_request_refresh()
+        return True
+
+    def diagnostics(self) -> dict[str, Any]:
+        """Read plan + poll metrics for HA diagnostics."""
+        link = self._link
+        return {
+            "transport": self._transport, "unit_id": self._unit_id, "address_offset": self._addr_off,
+            "max_read_registers": self._max_read, "link_cost_ms": [self._cost.request_ms, self._cost.word_ms],
+            "max_write_latency_ms": self._write_budget_ms,
+            "link": None if link is None else {"depth": link.depth, "users": link.refs, "connects": link.connects, "queued": link.queued,
+                                               "wait_ms_max": {str(p): round(v, 2) for p, v in link.wait_ms_max.items()},
+                                               "connected": link.connected, "native": link.native},
+            "plan": self._dump_plan(), "metrics": self.metrics.as_dict(),
+            "failing_windows": [{"register_type": k[0], "start": k[1], "count": k[2], "failures": h.failures, "last_error": h.last_error,
+                                 "retry_in_s": round(max(0.0, h.retry_at - time.monotonic()), 1), "stale_since": h.stale_since,
+                                 "parts": [[p.start, p.count] for p in h.parts or []]} for k, h in self._health.items()],
+            "stale": dict(self._stale),
+            "aggregate": None if self._aggregator is None else {"sensors": len(self._aggregator.uids), "prefix": self._statistic_prefix,
+                                                                **self._aggregator.export()},
+            "state_interval": self._state_interval, "held_back": len(self._held),
+        }
 
     async def async_close(self):
-        try:
-            if self._client:
-                await self._client.close()
-        except Exception:
-            pass
+        if self._recorder is not None:
+            self._recorder.commit()
+            try: await self.hass.async_add_executor_job(self._recorder.flush, self._recorder.take())
+            except OSError as err: _LOGGER.warning("Writing raw log failed: %s", err)
+        if self._store is not None and self.data is not None:
+            try: await self._store.async_save(self.export_state())
+            except Exception as err: _LOGGER.warning("Saving warm-start cache failed: %s", err)
+        link, self._link = self._link, None
+        if link is not None:
+            await async_release_link(link)
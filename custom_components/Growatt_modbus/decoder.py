@@ -0,0 +1,153 @@
+
+from __future__ import annotations
+import struct
+from typing import Any, Callable, Sequence
+
+# data_type -> (words, struct code for high_low word order)
+DATA_TYPES: dict[str, tuple[int, str]] = {
+    "uint16": (1, "H"), "int16": (1, "h"),
+    "uint32": (2, "I"), "int32": (2, "i"), "float32": (2, "f"),
+    "uint64": (4, "Q"), "int64": (4, "q"),
+}
+WORD_ORDERS = ("high_low", "low_high")
+INTEGER_TYPES = ("uint16", "int16", "uint32", "int32", "uint64", "int64")
+_UNSIGNED = {1: "H", 2: "I", 4: "Q"}
+
+def resolve_data_type(reg) -> str | None:
+    """Explicit data_type wins; otherwise derive it from count/signed like the legacy decoder."""
+    dt = getattr(reg, "data_type", None)
+    if dt:
+        return dt if dt in DATA_TYPES else None
+    signed = bool(getattr(reg, "signed", False))
+    return {1: "int16" if signed else "uint16", 2: "int32" if signed else "uint32",
+            4: "int64" if signed else "uint64"}.get(int(reg.count))
+
+def _swapped(code: str, words: int) -> Callable[[tuple, int], Any]:
+    """Converter for low_high word order: re-pack the words high word first, then reinterpret."""
+    repack = struct.Struct(f">{words}H"); conv = struct.Struct(f">{code}")
+    def _conv(vals: tuple, i: int) -> Any:
+        return conv.unpack(repack.pack(*reversed(vals[i:i + words])))[0]
+    return _conv
+
+class WindowLayout:
+    """
+    A planned read window compiled into a fixed struct layout.
+    decode() unpacks the whole window with a single Struct call and writes
+    scaled values straight into the result dict. Bitfield children of a register
+    (bitfields = {parent uid: [child RegisterDef]}) are taken from the same buffer
+    through a precomputed (mask, shift) table: one unpack per parent word.
+    """
+    __slots__ = ("register_type", "start", "count", "registers", "_pack", "_struct", "_ops", "_extra", "_bits", "_uids", "_undecodable", "buf")
+
+    def __init__(self, window, bitfields: dict[str, list] | None = None) -> None:
+        self.register_type = window.register_type
+        self.start = int(window.start); self.count = int(window.count)
+        self.registers = tuple(window.registers)
+        self._pack = struct.Struct(f">{self.count}H")
+        self.buf = bytearray(self.count * 2)  # reused receive buffer for native reads
+        fmt = [">"]; pos = 0; idx = 0
+        slots: dict[tuple[int, str, str], int] = {}
+        ops: list[tuple[str, int, Callable | None, float]] = []
+        extra: list[tuple[str, struct.Struct, int, Callable | None, float]] = []
+        bits: list[tuple[struct.Struct, int, bool, tuple]] = []
+        uids: list[str] = []; undecodable: list[str] = []
+        for r in sorted(self.registers, key=lambda r: int(r.address)):
+            children = (bitfields or {}).get(r.unique_id, ())
+            uids.append(r.unique_id); uids.extend(c.unique_id for c in children)
+            dt = resolve_data_type(r)
+            if dt is None:
+                undecodable.append(r.unique_id); undecodable.extend(c.unique_id for c in children); continue
+            words, code = DATA_TYPES[dt]
+            off = int(r.address) - self.start
+            if off < 0 or off + words > self.count:
+                undecodable.append(r.unique_id); undecodable.extend(c.unique_id for c in children); continue
+            order = getattr(r, "word_order", "high_low") or "high_low"
+            swap = order == "low_high" and words > 1
+            if children:
+                rows = tuple((c.unique_id, int(c.mask), int(c.shift or 0), bool(c.binary), float(c.scale)) for c in children)
+                bits.append((struct.Struct(f">{words}H" if swap else f">{_UNSIGNED[words]}"), off * 2, swap, rows))
+            conv = _swapped(code, words) if swap else None
+            key = (off, dt, order)
+            if key in slots:
+                ops.append((r.unique_id, slots[key], conv, float(r.scale)))
+            elif off >= pos:
+                if off > pos:
+                    fmt.append(f"{(off - pos) * 2}x")
+                fmt.append(f"{words}H" if swap else code)
+                slots[key] = idx
+                ops.append((r.unique_id, idx, conv, float(r.scale)))
+                idx += words if swap else 1; pos = off + words
+            else:
+                # overlaps a field already in the layout: unpack it separately
+                extra.append((r.unique_id, struct.Struct(f">{words}H" if swap else f">{code}"), off * 2, conv, float(r.scale)))
+        self._struct = struct.Struct("".join(fmt))
+        self._ops = tuple(ops); self._extra = tuple(extra); self._bits = tuple(bits); self._uids = tuple(uids)
+        self._undecodable = tuple(undecodable)
+
+    @property
+    def end(self) -> int:
+        return self.start + self.count
+
+    @property
+    def uids(self) -> tuple[str, ...]:
+        """Every unique_id decode() writes: registers and their bitfield children."""
+        return self._uids
+
+    def pack(self, raw: Sequence[int]) -> bytes:
+        return self._pack.pack(*(int(v) & 0xFFFF for v in raw[:self.count]))
+
+    def decode(self, buf, out: dict[str, Any]) -> None:
+        """Decode a big-endian window buffer; None for every register when buf is missing/short."""
+        if buf is None or len(buf) < self.count * 2:
+            for uid in self._uids:
+                out[uid] = None
+            return
+        for uid in self._undecodable:
+            out[uid] = None
+        vals = self._struct.unpack_from(buf, 0)
+        for uid, i, conv, scale in self._ops:
+            out[uid] = (conv(vals, i) if conv else vals[i]) * scale
+        for uid, st, off, conv, scale in self._extra:
+            v = st.unpack_from(buf, off)
+            out[uid] = (conv(v, 0) if conv else v[0]) * scale
+        for st, off, swap, rows in self._bits:
+            v = st.unpack_from(buf, off)
+            raw = sum(w << (16 * i) for i, w in enumerate(v)) if swap else v[0]
+            for uid, mask, shift, binary, scale in rows:
+                out[uid] = bool(raw & mask) if binary else ((raw & mask) >> shift) * scale
+
+    def decode_registers(self, raw: Sequence[int] | None, out: dict[str, Any]) -> None:
+        if not raw or len(raw) < self.count:
+            self.decode(None, out)
+        else:
+            self.decode(self.pack(raw), out)
+
+def compile_windows(windows, bitfields: dict[str, list] | None = None) -> list[WindowLayout]:
+    return [WindowLayout(w, bitfields) for w in windows]
+
+def decode_bits(children, raw: int) -> dict[str, Any]:
+    """Bitfield children from the parent's unsigned raw value (write-through cache updates)."""
+    return {c.unique_id: bool(raw & c.mask) if c.binary else ((raw & c.mask) >> (c.shift or 0)) * float(c.scale) for c in children}
+
+def raw_value(words: Sequence[int], word_order: str = "high_low") -> int:
+    """Unsigned integer of a register's words."""
+    w = [int(v) & 0xFFFF for v in words]
+    if word_order == "low_high":
+        w.reverse()
+    v = 0
+    for x in w:
+        v = (v << 16) | x
+    return v
+
+def decode_value(reg, words: Sequence[int]) -> Any:
+    """Decode one register from a list of 16-bit words (used for write-through cache updates)."""
+    dt = resolve_data_type(reg)
+    if dt is None:
+        return None
+    n, code = DATA_TYPES[dt]
+    if len(words) < n:
+        return None
+    w = [int(v) & 0xFFFF for v in words[:n]]
+    if n > 1 and (getattr(reg, "word_order", "high_low") or "high_low") == "low_high":
+        w.reverse()
+    return struct.unpack(f">{code}", struct.pack(f">{n}H", *w))[0] * float(reg.scale)
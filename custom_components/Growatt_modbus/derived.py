@@ -0,0 +1,85 @@
+
+from __future__ import annotations
+import ast, math
+from types import CodeType
+from typing import Any, Dict, Iterable, List, Tuple
+
+# whitelisted calls; everything else (attributes, subscripts, lambdas, comprehensions...) is rejected
+FUNCTIONS: Dict[str, Any] = {"abs": abs, "min": min, "max": max, "round": round, "sqrt": math.sqrt}
+_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+class ExpressionError(ValueError):
+    """Expression uses unsupported syntax or cannot be parsed."""
+
+def parse_expression(expression: str) -> Tuple[CodeType, Tuple[str, ...]]:
+    """Compile an arithmetic expression over sensor unique_ids; returns the code and the names it reads."""
+    try:
+        tree = ast.parse(str(expression), mode="eval")
+    except SyntaxError as err:
+        raise ExpressionError(f"cannot parse {expression!r}: {err.msg}") from err
+    names: List[str] = []
+    for node in ast.walk(tree):
+        if not isinstance(node, _NODES):
+            raise ExpressionError(f"{type(node).__name__} not allowed in {expression!r}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ExpressionError(f"only numeric constants allowed in {expression!r}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ExpressionError(f"only {sorted(FUNCTIONS)} can be called in {expression!r}")
+        elif isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in names:
+            names.append(node.id)
+    return compile(tree, f"<derived {expression}>", "eval"), tuple(names)
+
+def evaluation_order(exprs: Dict[str, Tuple[str, ...]]) -> List[str]:
+    """Derived uids ordered so each comes after the derived values it reads; raises ExpressionError on a cycle."""
+    order: List[str] = []; state: Dict[str, int] = {}
+    def visit(uid: str, path: Tuple[str, ...]) -> None:
+        if state.get(uid) == 2:
+            return
+        if state.get(uid) == 1:
+            raise ExpressionError("circular derived sensors: " + " -> ".join(path + (uid,)))
+        state[uid] = 1
+        for dep in exprs[uid]:
+            if dep in exprs:
+                visit(dep, path + (uid,))
+        state[uid] = 2; order.append(uid)
+    for uid in exprs:
+        visit(uid, ())
+    return order
+
+class DerivedPlan:
+    """
+    Derived sensors compiled once into dependency order. evaluate() fills them into the
+    cycle's data and re-runs an expression only when one of its inputs changed.
+    Missing/None inputs and arithmetic errors give None.
+    """
+    __slots__ = ("_steps", "_last")
+
+    def __init__(self, registers: Iterable) -> None:
+        regs = {r.unique_id: r for r in registers if r.register_type == "derived"}
+        compiled = {uid: parse_expression(r.expression) for uid, r in regs.items()}
+        self._steps = tuple((uid, compiled[uid][0], compiled[uid][1], float(regs[uid].scale))
+                            for uid in evaluation_order({u: c[1] for u, c in compiled.items()}))
+        self._last: Dict[str, Tuple[tuple, Any]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._steps)
+
+    def evaluate(self, data: Dict[str, Any]) -> None:
+        last = self._last
+        for uid, code, names, scale in self._steps:
+            inputs = tuple(data.get(n) for n in names)
+            prev = last.get(uid)
+            if prev is not None and prev[0] == inputs:
+                data[uid] = prev[1]; continue
+            value = None
+            if None not in inputs:
+                try:
+                    value = eval(code, {"__builtins__": {}}, {**FUNCTIONS, **dict(zip(names, inputs))}) * scale  # noqa: S307 - AST whitelisted above
+                except (ArithmeticError, TypeError, ValueError):
+                    value = None
+            last[uid] = (inputs, value); data[uid] = value
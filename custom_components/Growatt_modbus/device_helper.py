@@ -2,12 +2,30 @@
 from homeassistant.const import CONF_HOST
 from homeassistant.helpers.entity import DeviceInfo
 from .const import DOMAIN
-def build_device_info(entry):
+def build_device_info(entry, unit_key: str = ""):
+    """Device of the entry's first unit, or of an extra unit_id on the same link (unit_key "u<id>")."""
     host = entry.data.get(CONF_HOST)
-    return DeviceInfo(
-        identifiers={(DOMAIN, entry.entry_id)},
-        name="Growatt MOD/MID Modbus",
+    info = DeviceInfo(
+        identifiers={(DOMAIN, f"{entry.entry_id}_{unit_key}" if unit_key else entry.entry_id)},
+        name=f"Growatt MOD/MID Modbus {unit_key}" if unit_key else "Growatt MOD/MID Modbus",
         manufacturer="Growatt",
         model="MOD/MID",
         configuration_url=(f"http://{host}" if host else None)
     )
+    if unit_key:
+        info["via_device"] = (DOMAIN, entry.entry_id)
+    return info
+def entity_unique_id(entry, unit_key: str, uid: str) -> str:
+    return f"{entry.entry_id}_{unit_key}_{uid}" if unit_key else f"{entry.entry_id}_{uid}"
+def parse_extra_units(text: str | None) -> list[tuple[int, str]]:
+    """'2, 3:/config/meter.yaml' -> [(2, ""), (3, "/config/meter.yaml")]; "" = the entry's mapping. Raises ValueError."""
+    units: list[tuple[int, str]] = []
+    for item in str(text or "").replace(";", ",").split(","):
+        if not item.strip():
+            continue
+        uid, _, path = item.partition(":")
+        unit = int(uid.strip())
+        if not 0 <= unit <= 247 or unit in (u for u, _ in units):
+            raise ValueError(f"invalid or duplicate unit id {unit}")
+        units.append((unit, path.strip()))
+    return units
@@ -0,0 +1,20 @@
+
+from __future__ import annotations
+from typing import Any
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+from .const import DOMAIN
+from .coordinator import GrowattModbusCoordinator
+
+TO_REDACT = {CONF_HOST}
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    data = hass.data[DOMAIN][entry.entry_id]
+    coordinator: GrowattModbusCoordinator = data["coordinator"]
+    return {
+        "entry": {"data": async_redact_data(dict(entry.data), TO_REDACT), "options": dict(entry.options)},
+        "coordinator": coordinator.diagnostics(),
+        "extra_units": [u["coordinator"].diagnostics() for u in data["units"][1:]],
+    }
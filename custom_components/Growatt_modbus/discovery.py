@@ -0,0 +1,181 @@
+
+from __future__ import annotations
+import logging, time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+
+from .const import MODBUS_MAX_READ_REGISTERS
+from .mapping import RegisterDef
+from .planner import LinkCost, ReadWindow, plan_cost, plan_windows
+_LOGGER = logging.getLogger(__name__)
+
+ProbeFn = Callable[[str, int, int], Awaitable[List[int]]]
+
+@dataclass
+class ReadableRange:
+    """Registers [start, start+len(values)) that answered to one read request."""
+    register_type: str
+    start: int
+    values: List[int]
+    latency_ms: float = 0.0
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.values)
+
+@dataclass
+class ScanResult:
+    register_type: str
+    first: int
+    last: int
+    ranges: List[ReadableRange] = field(default_factory=list)
+    requests: int = 0
+    failed: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def readable(self) -> int:
+        return sum(len(r.values) for r in self.ranges)
+
+class RegisterScanner:
+    """
+    Find readable register ranges with few requests:
+    - readable stretches are read in windows that double up to max_count;
+    - a failing window is bisected to its longest readable prefix;
+    - unreadable gaps are skipped with exponentially growing steps (capped at max_gap_step)
+      and the first readable address after them is found by binary search.
+    Readable islands shorter than max_gap_step inside a gap can be missed; use max_gap_step=1 to be exhaustive.
+    """
+    def __init__(self, probe: ProbeFn, max_count: int = MODBUS_MAX_READ_REGISTERS, max_gap_step: int = 16) -> None:
+        self._probe = probe; self.max_count = max(1, min(MODBUS_MAX_READ_REGISTERS, int(max_count)))
+        self.max_gap_step = max(1, int(max_gap_step))
+
+    async def _read(self, res: ScanResult, address: int, count: int) -> tuple[Optional[List[int]], float]:
+        res.requests += 1; t0 = time.perf_counter()
+        try:
+            values = await self._probe(res.register_type, address, count)
+        except Exception as err:
+            res.failed += 1
+            _LOGGER.debug("probe %s %s+%s: %s", res.register_type, address, count, err)
+            return None, (time.perf_counter() - t0) * 1000.0
+        return values, (time.perf_counter() - t0) * 1000.0
+
+    def _add(self, res: ScanResult, address: int, values: List[int], ms: float) -> None:
+        # kept per request until _coalesce verifies that neighbours can be read as one window
+        res.ranges.append(ReadableRange(res.register_type, address, list(values), ms))
+
+    async def _next_readable(self, res: ScanResult, bad: int) -> int:
+        """First readable address after the unreadable one at bad (res.last + 1 if none)."""
+        step = 1
+        while True:
+            q = bad + step
+            if q > res.last:
+                return res.last + 1
+            values, ms = await self._read(res, q, 1)
+            if values is not None:
+                lo, hi = bad + 1, q; found = (q, values, ms)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    v, m = await self._read(res, mid, 1)
+                    if v is not None:
+                        hi = mid; found = (mid, v, m)
+                    else:
+                        lo = mid + 1
+                self._add(res, *found)
+                return found[0] + 1
+            bad = q; step = min(step * 2, self.max_gap_step)
+
+    async def _coalesce(self, res: ScanResult) -> None:
+        """Re-cut runs of adjacent ranges into full windows where the device accepts them, so the plan is not cut at probe boundaries."""
+        merged: List[ReadableRange] = []
+        for run in _runs(res.ranges):
+            pos, end = run[0].start, run[-1].end
+            while pos < end:
+                piece = next(r for r in run if r.start <= pos < r.end)
+                n = min(self.max_count, end - pos)
+                if n > piece.end - pos:
+                    values, ms = await self._read(res, pos, n)
+                    if values is not None:
+                        merged.append(ReadableRange(res.register_type, pos, list(values), ms)); pos += n
+                        continue
+                merged.append(ReadableRange(res.register_type, pos, piece.values[pos - piece.start:], piece.latency_ms)); pos = piece.end
+        res.ranges = merged
+
+    async def scan(self, register_type: str, first: int, last: int) -> ScanResult:
+        res = ScanResult(register_type, int(first), int(last)); t0 = time.monotonic()
+        p = res.first; size = self.max_count
+        while p <= res.last:
+            n = min(size, res.last - p + 1)
+            values, ms = await self._read(res, p, n)
+            if values is not None:
+                self._add(res, p, values, ms); p += n; size = min(self.max_count, size * 2)
+                continue
+            # longest readable prefix of the failed window
+            lo, hi, best = 0, n - 1, None
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                v, m = await self._read(res, p, mid)
+                if v is not None:
+                    lo = mid; best = (v, m)
+                else:
+                    hi = mid - 1
+            if best is not None:
+                self._add(res, p, *best)
+                p += lo; size = max(1, lo)
+                # the next address is readable on its own (block boundary) or starts a gap
+                values, ms = await self._read(res, p, 1)
+                if values is not None:
+                    self._add(res, p, values, ms); p += 1
+                    continue
+            p = await self._next_readable(res, p); size = self.max_count
+        await self._coalesce(res)
+        res.elapsed_s = time.monotonic() - t0
+        _LOGGER.info("Scan %s %s..%s: %s readable registers in %s ranges, %s requests (%s failed), %.1f s",
+                     register_type, first, last, res.readable, len(res.ranges), res.requests, res.failed, res.elapsed_s)
+        return res
+
+def _runs(ranges: List[ReadableRange]) -> List[List[ReadableRange]]:
+    """Group ranges into runs of adjacent addresses."""
+    runs: List[List[ReadableRange]] = []
+    for r in ranges:
+        if runs and runs[-1][-1].end == r.start:
+            runs[-1].append(r)
+        else:
+            runs.append([r])
+    return runs
+
+def skeleton_registers(results: List[ScanResult]) -> List[RegisterDef]:
+    return [RegisterDef(f"{r.register_type.capitalize()} {a}", f"{r.register_type}_{a}", r.register_type, a)
+            for res in results for r in res.ranges for a in range(r.start, r.end)]
+
+def read_plan(results: List[ScanResult], cost: LinkCost, max_count: int = MODBUS_MAX_READ_REGISTERS) -> List[ReadWindow]:
+    """Cheapest windows over the discovered registers; a window never spans more than one verified range."""
+    windows: List[ReadWindow] = []
+    for res in results:
+        for r in res.ranges:
+            regs = [RegisterDef(f"{r.register_type} {a}", f"{r.register_type}_{a}", r.register_type, a) for a in range(r.start, r.end)]
+            windows.extend(plan_windows(regs, r.register_type, cost, max_count))
+    return windows
+
+def render_skeleton(results: List[ScanResult], cost: LinkCost, max_count: int = MODBUS_MAX_READ_REGISTERS, nonzero_only: bool = False) -> str:
+    """map.yaml skeleton (one uint16 sensor per readable register, raw value as comment) with the read plan in the header."""
+    plan = read_plan(results, cost, max_count)
+    lines = ["# Generated by growatt_modbus register discovery. Rename, scale and type the registers you need; delete the rest."]
+    for res in results:
+        lines.append(f"# {res.register_type} {res.first}..{res.last}: {res.readable} readable in {len(res.ranges)} ranges, "
+                     f"{res.requests} requests ({res.failed} failed), {res.elapsed_s:.1f} s")
+        for run in _runs(res.ranges):
+            lat = sum(r.latency_ms for r in run) / len(run)
+            lines.append(f"#   {run[0].start}..{run[-1].end - 1} ({run[-1].end - run[0].start} registers, {lat:.1f} ms per read)")
+    lines.append(f"# Read plan: {len(plan)} windows, est. {plan_cost(plan, cost):.0f} ms per full poll")
+    lines.extend(f"#   {w.register_type} {w.start}+{w.count}" for w in plan)
+    lines.append("sensors:")
+    for res in results:
+        for r in res.ranges:
+            for i, v in enumerate(r.values):
+                if nonzero_only and not v:
+                    continue
+                a = r.start + i; t = r.register_type
+                lines.append(f"  - {{name: \"{t.capitalize()} {a}\", unique_id: {t}_{a}, register_type: {t}, address: {a}, count: 1, scale: 1}}  # raw {v}")
+    lines.append("controls: []")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,127 @@
+
+from __future__ import annotations
+import logging, time
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .metrics import LATENCY_BUCKETS_MS
+
+_LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+METRICS_URL = "/api/growatt_modbus/metrics"
+
+# (family, type, help) in output order; counters get the _total suffix on their samples
+FAMILIES: Tuple[Tuple[str, str, str], ...] = (
+    ("growatt_modbus_value", "gauge", "Last polled value of a mapped register or derived sensor."),
+    ("growatt_modbus_stale", "gauge", "1 while the value is the last good one because its read window keeps failing."),
+    ("growatt_modbus_poll_cycles", "counter", "Poll cycles run."),
+    ("growatt_modbus_poll_failed_cycles", "counter", "Poll cycles in which every read window failed."),
+    ("growatt_modbus_poll_overruns", "counter", "Poll cycles that took longer than the scan interval."),
+    ("growatt_modbus_poll_cycle_seconds", "gauge", "Duration of the last poll cycle."),
+    ("growatt_modbus_poll_deferred_windows", "counter", "Read windows pushed to a later cycle by the cycle budget."),
+    ("growatt_modbus_reconnects", "counter", "Reconnects of the Modbus link."),
+    ("growatt_modbus_tier_achieved_seconds", "gauge", "Achieved interval between complete passes of a poll tier."),
+    ("growatt_modbus_window_requests", "counter", "Read requests per planned window."),
+    ("growatt_modbus_window_timeouts", "counter", "Timed out read requests per window."),
+    ("growatt_modbus_window_exceptions", "counter", "Modbus exception responses per window."),
+    ("growatt_modbus_window_errors", "counter", "Other failed read requests per window."),
+    ("growatt_modbus_window_latency_seconds", "histogram", "Read latency per window."),
+    ("growatt_modbus_writes", "counter", "Write transactions."),
+    ("growatt_modbus_write_errors", "counter", "Failed write transactions."),
+    ("growatt_modbus_write_seconds", "gauge", "Latency of the last write, queueing included."),
+)
+_BUCKETS_S = [f"{ms / 1000.0:g}" for ms in LATENCY_BUCKETS_MS] + ["+Inf"]
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(pairs: Iterable[Tuple[str, Any]]) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _num(v: Any) -> str:
+    return str(int(v)) if isinstance(v, int) else repr(float(v))
+
+def render_families(base: List[Tuple[str, Any]], registers: Iterable, data: Dict[str, Any] | None,
+                    stale: Dict[str, float], metrics) -> Dict[str, str]:
+    """Sample lines of one coordinator per family (no headers), rendered once per cycle."""
+    out: Dict[str, List[str]] = {f[0]: [] for f in FAMILIES}
+    b = _labels(base)[1:-1]
+    def add(family: str, value: Any, extra: str = "", suffix: str = "") -> None:
+        out[family].append(f"{family}{suffix}{{{b}{',' + extra if extra else ''}}} {_num(value)}")
+    data = data or {}
+    for r in registers:
+        v = data.get(r.unique_id)
+        if isinstance(v, (int, float)) and v == v:
+            add("growatt_modbus_value", v, _labels((("uid", r.unique_id), ("unit", r.unit_of_measurement or "")))[1:-1])
+    for uid in stale:
+        add("growatt_modbus_stale", 1, f'uid="{_escape(uid)}"')
+    m = metrics
+    add("growatt_modbus_poll_cycles", m.cycles, suffix="_total")
+    add("growatt_modbus_poll_failed_cycles", m.failed_cycles, suffix="_total")
+    add("growatt_modbus_poll_overruns", m.overruns, suffix="_total")
+    add("growatt_modbus_poll_cycle_seconds", m.cycle_ms_last / 1000.0)
+    add("growatt_modbus_poll_deferred_windows", m.deferred, suffix="_total")
+    add("growatt_modbus_reconnects", m.reconnects, suffix="_total")
+    for t in m.tiers.values():
+        if t.completions > 1:
+            add("growatt_modbus_tier_achieved_seconds", t.achieved_s, f'register_type="{t.register_type}",interval="{t.interval_s:g}"')
+    for w in m.windows.values():
+        wl = f'register_type="{w.register_type}",start="{w.start}",count="{w.count}"'
+        add("growatt_modbus_window_requests", w.requests, wl, "_total")
+        add("growatt_modbus_window_timeouts", w.timeouts, wl, "_total")
+        add("growatt_modbus_window_exceptions", sum(w.exceptions.values()), wl, "_total")
+        add("growatt_modbus_window_errors", w.errors, wl, "_total")
+        cum = 0
+        for le, n in zip(_BUCKETS_S, w.buckets):
+            cum += n; add("growatt_modbus_window_latency_seconds", cum, f'{wl},le="{le}"', "_bucket")
+        add("growatt_modbus_window_latency_seconds", w.requests, wl, "_count")
+        add("growatt_modbus_window_latency_seconds", w.latency_ms_sum / 1000.0, wl, "_sum")
+    add("growatt_modbus_writes", m.writes, suffix="_total")
+    add("growatt_modbus_write_errors", m.write_errors, suffix="_total")
+    if m.writes:
+        add("growatt_modbus_write_seconds", m.write_ms_last / 1000.0)
+    return {k: "\n".join(v) + "\n" for k, v in out.items() if v}
+
+class ExportCache:
+    """Assembled exposition of every exporting coordinator; rebuilt only when one of them rendered a new cycle."""
+    def __init__(self) -> None:
+        self._key: tuple = (); self._body = b"# EOF\n"; self.scrapes = 0
+
+    def body(self, coordinators: List[Any]) -> bytes:
+        self.scrapes += 1
+        key = tuple((id(c), c.export_generation) for c in coordinators)
+        if key != self._key:
+            parts: List[str] = []
+            for family, kind, help_ in FAMILIES:
+                chunks = [c.openmetrics[family] for c in coordinators if family in c.openmetrics]
+                if chunks:
+                    parts.append(f"# TYPE {family} {kind}\n# HELP {family} {help_}\n"); parts.extend(chunks)
+            parts.append("# EOF\n")
+            self._body = "".join(parts).encode("utf-8"); self._key = key
+        return self._body
+
+def exporting_coordinators(hass, domain: str) -> List[Any]:
+    return [u["coordinator"] for d in hass.data.get(domain, {}).values() if isinstance(d, dict)
+            for u in d.get("units", ()) if u["coordinator"].openmetrics is not None]
+
+def register_view(hass, domain: str) -> None:
+    """Register the scrape endpoint once per HA instance (authenticated like the rest of /api)."""
+    from aiohttp import web
+    from homeassistant.components.http import HomeAssistantView
+    key = f"{domain}_metrics_view"
+    if hass.data.get(key):
+        return
+    cache = ExportCache()
+
+    class GrowattMetricsView(HomeAssistantView):
+        url = METRICS_URL
+        name = "api:growatt_modbus:metrics"
+
+        async def get(self, request):
+            started = time.perf_counter()
+            body = cache.body(exporting_coordinators(hass, domain))
+            _LOGGER.debug("Metrics scrape served from cache in %.2f ms (%s bytes)", (time.perf_counter() - started) * 1000.0, len(body))
+            return web.Response(body=body, headers={"Content-Type": CONTENT_TYPE})
+
+    hass.http.register_view(GrowattMetricsView)
+    hass.data[key] = True
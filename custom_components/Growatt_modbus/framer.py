@@ -0,0 +1,332 @@
+
+from __future__ import annotations
+import asyncio, itertools, logging, os, struct, time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from .const import SERIAL_TURNAROUND_MS
+from .rawlog import ReplayResponse
+
+_LOGGER = logging.getLogger(__name__)
+
+FC_READ_HOLDING = 3
+FC_READ_INPUT = 4
+READ_FUNCTIONS = {"read_holding_registers": FC_READ_HOLDING, "read_input_registers": FC_READ_INPUT}
+
+FC_WRITE_COIL = 5
+FC_WRITE_REGISTER = 6
+FC_WRITE_REGISTERS = 16
+
+_PDU = struct.Struct(">BHH")  # fc, address, count/value
+_MBAP = struct.Struct(">HHHB")  # tid, protocol 0, length, unit
+_MBAP_HEADER = struct.Struct(">HHHBB")  # tid, protocol, length, unit, fc
+_MAX_RESPONSE = 256  # largest RTU frame
+
+@dataclass(frozen=True)
+class SerialTiming:
+    """Wire timing of a serial line: one character, the t3.5 inter-frame silence and the slave's turnaround allowance."""
+    char_s: float
+    gap_s: float
+    turnaround_s: float
+
+    def timeout(self, request_bytes: int, response_bytes: int = _MAX_RESPONSE) -> float:
+        """Longest a request can take when the slave answers at all: both frames on the wire, the gaps and the turnaround."""
+        return (request_bytes + response_bytes) * self.char_s + 2 * self.gap_s + self.turnaround_s
+
+def serial_timing(params: dict | None, turnaround_ms: float = SERIAL_TURNAROUND_MS) -> SerialTiming:
+    """Timing from baudrate/bytesize/parity/stopbits; t3.5 is fixed at 1.75 ms above 19200 baud (Modbus serial line spec)."""
+    p = params or {}
+    baud = max(1, int(p.get("baudrate") or 9600))
+    bits = 1 + int(p.get("bytesize") or 8) + (str(p.get("parity") or "N").upper() != "N") + int(p.get("stopbits") or 1)
+    char_s = bits / baud
+    return SerialTiming(char_s, 0.00175 if baud > 19200 else 3.5 * char_s, turnaround_ms / 1000.0)
+
+def _crc_table() -> Tuple[int, ...]:
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+_CRC_TABLE = _crc_table()
+
+def crc16(data) -> int:
+    """Modbus RTU CRC-16 (poly 0xA001, init 0xFFFF); sent low byte first."""
+    crc = 0xFFFF; table = _CRC_TABLE
+    for b in data:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return crc
+
+class ModbusExceptionResponse(Exception):
+    """The device answered with a Modbus exception (function code | 0x80)."""
+    def __init__(self, function_code: int, exception_code: int) -> None:
+        super().__init__(f"Modbus exception {exception_code} on function {function_code}")
+        self.exception_code = exception_code
+
+class ModbusFrameError(Exception):
+    """Malformed, mismatched or corrupted response frame."""
+
+class _Protocol(asyncio.Protocol):
+    def __init__(self, client: "NativeModbusClient") -> None:
+        self._client = client
+
+    def connection_made(self, transport) -> None:
+        self._client._transport = transport
+
+    def data_received(self, data: bytes) -> None:
+        self._client._feed(data)
+
+    def connection_lost(self, exc) -> None:
+        self._client._lost(exc)
+
+class NativeModbusClient:
+    """
+    Minimal asyncio Modbus client: FC3/FC4 reads and FC5/FC6/FC16 writes.
+    framing "tcp": MBAP frames matched by transaction id (pipelining safe);
+    framing "rtu": RTU frames with CRC over a TCP socket (RTU-over-TCP gateways), one request at a time.
+    read_into copies response data once from the receive buffer into the caller's bytearray and returns
+    a memoryview of it: no response objects and no per-register ints. The pymodbus client calls the
+    coordinator uses (read_*_registers, write_*) are offered too, answering ReplayResponse objects, so
+    writes and probes share the same socket.
+    With timing set, each request's timeout follows from its frame sizes instead of the fixed timeout.
+    """
+    def __init__(self, host: str, port: int, framing: str = "tcp", timeout: float = 5.0, timing: SerialTiming | None = None) -> None:
+        self.host = host; self.port = int(port); self.framing = framing; self.timeout = float(timeout); self.timing = timing
+        self._transport: Optional[asyncio.Transport] = None
+        self._rx = bytearray(); self._tids = itertools.count(1)
+        self._pending: Dict[int, Tuple[asyncio.Future, int, int, bytearray | None, int]] = {}  # tid (0 for rtu) -> (future, fc, count, into, unit)
+        self._gap = 0.0; self._idle_at = 0.0  # silence to keep before the next frame, and since when the line is idle
+
+    @property
+    def connected(self) -> bool:
+        return self._transport is not None and not self._transport.is_closing()
+
+    async def connect(self) -> bool:
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(loop.create_connection(lambda: _Protocol(self), self.host, self.port), self.timeout)
+        return True
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+
+    def _lost(self, exc) -> None:
+        self._transport = None; self._rx.clear()
+        err = ConnectionError(f"connection to {self.host}:{self.port} lost" + (f": {exc}" if exc else ""))
+        for fut, *_ in self._pending.values():
+            if not fut.done():
+                fut.set_exception(err)
+        self._pending.clear()
+
+    async def read_into(self, fc: int, unit: int, address: int, count: int, into: bytearray) -> memoryview:
+        return await self._request(unit, _PDU.pack(fc, address, count), 5 + 2 * count, fc, count, into)
+
+    async def write(self, unit: int, pdu: bytes) -> None:
+        """FC5/FC6/FC16 request; returns once the slave echoed it, raises ModbusExceptionResponse on a refusal."""
+        await self._request(unit, pdu, 8, pdu[0], 0, None)
+
+    async def _read(self, fc: int, address: int, count: int, kw: Dict[str, Any]) -> ReplayResponse:
+        buf = bytearray(count * 2)
+        try:
+            view = await self.read_into(fc, _unit(kw), address, count, buf)
+        except ModbusExceptionResponse as err:
+            return ReplayResponse(exception_code=err.exception_code)
+        return ReplayResponse(list(struct.unpack(f">{count}H", view)))
+
+    async def _write(self, pdu: bytes, kw: Dict[str, Any]) -> ReplayResponse:
+        try:
+            await self.write(_unit(kw), pdu)
+        except ModbusExceptionResponse as err:
+            return ReplayResponse(exception_code=err.exception_code)
+        return ReplayResponse()
+
+    async def read_input_registers(self, address: int, count: int = 1, **kw) -> ReplayResponse:
+        return await self._read(FC_READ_INPUT, address, count, kw)
+
+    async def read_holding_registers(self, address: int, count: int = 1, **kw) -> ReplayResponse:
+        return await self._read(FC_READ_HOLDING, address, count, kw)
+
+    async def write_register(self, address: int, value: int, **kw) -> ReplayResponse:
+        return await self._write(_PDU.pack(FC_WRITE_REGISTER, address, int(value) & 0xFFFF), kw)
+
+    async def write_registers(self, address: int, values, **kw) -> ReplayResponse:
+        words = [int(v) & 0xFFFF for v in values]
+        return await self._write(struct.pack(f">BHHB{len(words)}H", FC_WRITE_REGISTERS, address, len(words), 2 * len(words), *words), kw)
+
+    async def write_coil(self, address: int, value, **kw) -> ReplayResponse:
+        return await self._write(_PDU.pack(FC_WRITE_COIL, address, 0xFF00 if value else 0), kw)
+
+    async def _request(self, unit: int, pdu: bytes, response_bytes: int, fc: int, count: int, into: bytearray | None):
+        if not self.connected:
+            raise ConnectionError(f"not connected to {self.host}:{self.port}")
+        if self.framing == "rtu":
+            tid = 0
+            if self._pending:
+                raise ModbusFrameError("RTU framing allows one request at a time")
+            wait = self._idle_at + self._gap - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            req = bytes((unit,)) + pdu
+            req += struct.pack("<H", crc16(req))
+            self._rx.clear()
+        else:
+            tid = next(self._tids) % 0xFFFF + 1
+            req = _MBAP.pack(tid, 0, len(pdu) + 1, unit) + pdu
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[tid] = (fut, fc, count, into, unit)
+        self._transport.write(req)
+        try:
+            return await asyncio.wait_for(fut, self.timing.timeout(len(req), response_bytes) if self.timing else self.timeout)
+        finally:
+            self._pending.pop(tid, None); self._idle_at = time.monotonic()
+
+    def _feed(self, data: bytes) -> None:
+        self._rx += data
+        try:
+            (self._parse_rtu if self.framing == "rtu" else self._parse_tcp)()
+        except ModbusFrameError as err:
+            self._rx.clear()
+            for fut, *_ in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(err)
+
+    def _complete(self, tid: int, unit_fc: int, body_off: int, body_len: int) -> None:
+        """Resolve the request tid from the frame body at rx[body_off:body_off + body_len] (after the fc byte)."""
+        entry = self._pending.get(tid)
+        if entry is None:
+            return  # late answer to a timed-out request
+        fut, fc, count, into, _ = entry
+        if fut.done():
+            return
+        rx = self._rx
+        if unit_fc == fc | 0x80:
+            fut.set_exception(ModbusExceptionResponse(fc, rx[body_off] if body_len else 0)); return
+        if into is None:  # write: the echo is the confirmation
+            if unit_fc == fc: fut.set_result(None)
+            else: fut.set_exception(ModbusFrameError(f"unexpected response fc={unit_fc} for fc={fc}"))
+            return
+        n = count * 2
+        if unit_fc != fc or body_len < 1 or rx[body_off] != n or body_len < 1 + n:
+            fut.set_exception(ModbusFrameError(f"unexpected response fc={unit_fc} for fc={fc} count={count}")); return
+        if len(into) < n:
+            into.extend(bytes(n - len(into)))
+        with memoryview(rx) as mv:
+            into[:n] = mv[body_off + 1:body_off + 1 + n]
+        fut.set_result(memoryview(into)[:n])
+
+    def _parse_tcp(self) -> None:
+        rx = self._rx
+        while len(rx) >= 8:
+            tid, proto, length, _unit, fc = _MBAP_HEADER.unpack_from(rx, 0)
+            if proto != 0 or length < 2 or length > 254:
+                raise ModbusFrameError(f"bad MBAP header (protocol {proto}, length {length})")
+            end = 6 + length
+            if len(rx) < end:
+                return
+            self._complete(tid, fc, 8, length - 2)
+            del rx[:end]
+
+    def _parse_rtu(self) -> None:
+        rx = self._rx
+        while len(rx) >= 5 and 0 in self._pending:
+            fc = rx[1]
+            end = 5 if fc & 0x80 else 5 + rx[2] if fc in (FC_READ_HOLDING, FC_READ_INPUT) else 8
+            if len(rx) < end:
+                return
+            with memoryview(rx) as mv:
+                ok = crc16(mv[:end - 2]) == rx[end - 2] | rx[end - 1] << 8
+            if not ok:
+                raise ModbusFrameError("CRC mismatch")
+            if rx[0] == self._pending[0][4]:
+                self._complete(0, fc, 2, end - 4)
+            else:  # valid frame for another unit on the bus (echo, other master): not our answer, keep waiting
+                _LOGGER.debug("Ignoring RTU frame from unit %s while waiting for unit %s", rx[0], self._pending[0][4])
+            del rx[:end]
+
+def _unit(kw: Dict[str, Any]) -> int:
+    return int(next((kw[k] for k in ("device_id", "slave", "unit") if kw.get(k) is not None), 1))
+
+def _open_serial(path: str, params: dict) -> int:
+    """Open a tty non-blocking in raw mode with the given line settings (POSIX termios)."""
+    import termios
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        baud = int(params.get("baudrate") or 9600); speed = getattr(termios, f"B{baud}", None)
+        if speed is None:
+            raise ValueError(f"unsupported baudrate {baud}")
+        cflag = termios.CREAD | termios.CLOCAL | {5: termios.CS5, 6: termios.CS6, 7: termios.CS7}.get(int(params.get("bytesize") or 8), termios.CS8)
+        parity = str(params.get("parity") or "N").upper()
+        if parity in ("E", "O"):
+            cflag |= termios.PARENB | (termios.PARODD if parity == "O" else 0)
+        if int(params.get("stopbits") or 1) == 2:
+            cflag |= termios.CSTOPB
+        cc = termios.tcgetattr(fd)[6]
+        cc[termios.VMIN] = 0; cc[termios.VTIME] = 0
+        termios.tcsetattr(fd, termios.TCSANOW, [0, 0, cflag, 0, speed, speed, cc])
+        termios.tcflush(fd, termios.TCIOFLUSH)
+    except Exception:
+        os.close(fd); raise
+    return fd
+
+class _SerialPort:
+    """Transport-like wrapper (write / close / is_closing) around a non-blocking tty fd watched by the event loop."""
+    def __init__(self, client: "NativeModbusClient", fd: int) -> None:
+        self._client = client; self._fd: int | None = fd; self._loop = asyncio.get_running_loop(); self._tx = bytearray()
+        self._loop.add_reader(fd, self._readable)
+
+    def _readable(self) -> None:
+        try:
+            data = os.read(self._fd, 512)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            self._close(err); return
+        if data:
+            self._client._feed(data)
+
+    def write(self, data: bytes) -> None:
+        self._tx += data; self._flush()
+
+    def _flush(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            del self._tx[:os.write(self._fd, self._tx)]
+        except BlockingIOError:
+            pass
+        except OSError as err:
+            self._close(err); return
+        if self._tx:
+            self._loop.add_writer(self._fd, self._flush)  # tx buffer full: finish when the port drains
+        else:
+            self._loop.remove_writer(self._fd)
+
+    def is_closing(self) -> bool:
+        return self._fd is None
+
+    def close(self) -> None:
+        self._close(None)
+
+    def _close(self, exc) -> None:
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        self._loop.remove_reader(fd); self._loop.remove_writer(fd); os.close(fd); self._tx.clear()
+        self._client._lost(exc)
+
+class SerialRtuClient(NativeModbusClient):
+    """
+    Modbus RTU master on a local serial port (USB-RS485 adapter, or a pty in tests) without a gateway hop.
+    Timeouts and the t3.5 silence come from the line settings (serial_timing), and the next request goes
+    out as soon as that silence has passed.
+    """
+    def __init__(self, path: str, serial_params: dict | None = None) -> None:
+        self._params = dict(serial_params or {}); timing = serial_timing(self._params)
+        super().__init__(path, 0, "rtu", timing.timeout(8), timing)
+        self._gap = timing.gap_s
+
+    async def connect(self) -> bool:
+        self._transport = _SerialPort(self, _open_serial(self.host, self._params))
+        self._idle_at = time.monotonic()
+        return True
@@ -1,9 +1,71 @@
 
 from __future__ import annotations
-import os, yaml, logging
-from typing import Any
+import hashlib, json, os, yaml, logging
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+from typing import Any, Mapping
+from .const import POLL_TIER_SECONDS
+from .decoder import DATA_TYPES, INTEGER_TYPES, WORD_ORDERS, resolve_data_type
+from .derived import ExpressionError, evaluation_order, parse_expression
 _LOGGER = logging.getLogger(__name__)
 
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+CACHE_FORMAT = 3
+REGISTER_TYPES = ("input", "holding")
+DERIVED = "derived"  # register_type of sensors computed from other sensors (expression, no address)
+BITFIELD = "bitfield"  # register_type of sub-sensors decoded from their parent's read (flattened from bitfields:)
+BITFIELD_KEYS = frozenset(("name", "unique_id", "bit", "mask", "shift", "scale", "unit_of_measurement", "device_class",
+                           "state_class", "options", "deadband", "deadband_pct"))
+CONTROL_TYPES = ("switch", "number", "number32", "select", "select32")
+
+@dataclass(frozen=True, slots=True)
+class RegisterDef:
+    name: str
+    unique_id: str
+    register_type: str  # "input", "holding" or "derived"
+    address: int
+    count: int = 1
+    scale: float = 1.0
+    unit_of_measurement: str | None = None
+    device_class: str | None = None
+    state_class: str | None = None
+    signed: bool = False
+    options: dict[int, str] | None = None  # enum mapping for sensor (0->"text")
+    data_type: str | None = None  # uint16/int16/uint32/int32/float32/uint64/int64; default from count+signed
+    word_order: str = "high_low"  # for multi-word values: "high_low" or "low_high"
+    poll_tier: str | None = None  # "fast" / "medium" / "slow" (see POLL_TIER_SECONDS)
+    poll_interval: float | None = None  # seconds; overrides poll_tier
+    deadband: float | None = None  # absolute change needed before entities are notified
+    deadband_pct: float | None = None  # relative change (percent of last published value)
+    expression: str | None = None  # derived only: arithmetic over other sensors' unique_ids, e.g. "pv1_power + pv2_power"
+    parent: str | None = None  # bitfield only: unique_id of the register the bits come from
+    mask: int | None = None  # bitfield only: value = (raw & mask) >> shift
+    shift: int | None = None
+    binary: bool = False  # bitfield given as a single bit: exposed as a binary_sensor
+
+# keys accepted on a sensor in map.yaml (bitfield internals are generated from the bitfields: list)
+SENSOR_KEYS = frozenset(f.name for f in fields(RegisterDef)) - {"parent", "mask", "shift", "binary"} | {"bitfields"}
+
+class MappingError(ValueError):
+    """The register mapping failed validation; str() lists every problem found."""
+    def __init__(self, path: str, errors: list[str]) -> None:
+        super().__init__(f"Invalid mapping {path}:\n  " + "\n  ".join(errors))
+        self.path = path; self.errors = errors
+
+class CompiledMapping:
+    """Validated, immutable mapping shared by every entry that uses the same file."""
+    __slots__ = ("path", "digest", "sensors", "controls")
+
+    def __init__(self, path: str, digest: str, sensors: tuple[RegisterDef, ...], controls: tuple[Mapping[str, Any], ...]) -> None:
+        for k, v in (("path", path), ("digest", digest), ("sensors", sensors), ("controls", controls)):
+            object.__setattr__(self, k, v)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("CompiledMapping is immutable")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
 def embedded_path() -> str:
     return os.path.join(os.path.dirname(__file__), "map.yaml")
 
@@ -16,11 +78,298 @@ def resolve_mapping_path(path: str | None) -> str:
     _LOGGER.warning("Mapping not found at %s, falling back to embedded", given)
     return embedded_path()
 
+def _ensure_uid(base: str | None, prefix: str, address: int) -> str:
+    base = (base or "").strip()
+    return base if base else f"{prefix}_{address}"
+
+def _auto_inject_readbacks(sensors: list[dict], controls: list[dict]) -> tuple[list[dict], list[dict]]:
+    for s in sensors:
+        s["unique_id"] = _ensure_uid(s.get("unique_id"), "s", int(s.get("address", 0)))
+    sensor_uids = {s["unique_id"] for s in sensors}
+    for c in controls:
+        addr = c.get("address", c.get("base_address", 0))
+        c["unique_id"] = _ensure_uid(c.get("unique_id"), c.get("type","c"), int(addr))
+        rtype = c.get("register_type", "holding")
+        if c.get("type") == "select32":
+            rb_uid = c.get("read_unique_id") or f"rb_{c['unique_id']}"
+            if rb_uid not in sensor_uids:
+                sensors.append({
+                    "name": f"RB {c.get('name', c['unique_id'])}",
+                    "unique_id": rb_uid,
+                    "register_type": "holding",
+                    "address": int(c["base_address"]),
+                    "count": 2,
+                    "scale": 1.0,
+                    "word_order": c.get("word_order", "high_low"),
+                })
+                sensor_uids.add(rb_uid)
+            c["read_unique_id"] = rb_uid
+            continue
+        if rtype != "holding" or not addr:
+            continue
+        if not c.get("read_unique_id"):
+            rb_uid = f"rb_{c['unique_id']}"
+            if rb_uid not in sensor_uids:
+                sensors.append({
+                    "name": f"RB {c.get('name', c['unique_id'])}",
+                    "unique_id": rb_uid,
+                    "register_type": "holding",
+                    "address": int(addr),
+                    "count": 1,
+                    "scale": 1.0
+                })
+                sensor_uids.add(rb_uid)
+            c["read_unique_id"] = rb_uid
+            c.setdefault("read_factor", 1.0)
+    return sensors, controls
+
+def _check_int(errors: list[str], where: str, value: Any, key: str, lo: int, hi: int) -> None:
+    if isinstance(value, bool) or not isinstance(value, int):
+        errors.append(f"{where}: {key} must be an integer, got {value!r}")
+    elif not lo <= value <= hi:
+        errors.append(f"{where}: {key} {value} out of range {lo}..{hi}")
+
+def validate_mapping(sensors: list, controls: list) -> list[str]:
+    """Return every schema problem in the raw YAML sensors/controls (empty list = valid)."""
+    errors: list[str] = []
+    if not isinstance(sensors, list): return ["sensors: must be a list"]
+    if not isinstance(controls, list): return ["controls: must be a list"]
+    seen_uid: dict[str, str] = {}; spans: list[tuple[str, int, int, str]] = []
+    for i, s in enumerate(sensors):
+        where = f"sensors[{i}]"
+        if not isinstance(s, dict):
+            errors.append(f"{where}: must be a mapping"); continue
+        uid = str(s.get("unique_id") or "").strip(); where = f"{where} ({uid or s.get('name', '?')})"
+        unknown = sorted(set(s) - SENSOR_KEYS)
+        if unknown:
+            errors.append(f"{where}: unknown keys {unknown}")
+        rtype = s.get("register_type")
+        for key in ("name", "register_type") + (("expression",) if rtype == DERIVED else ("address",)):
+            if key not in s:
+                errors.append(f"{where}: missing {key}")
+        if rtype is not None and rtype not in REGISTER_TYPES + (DERIVED,):
+            errors.append(f"{where}: register_type must be one of {REGISTER_TYPES + (DERIVED,)}, got {rtype!r}")
+        if rtype == DERIVED and "expression" in s:
+            try: parse_expression(s["expression"])
+            except ExpressionError as err: errors.append(f"{where}: {err}")
+        elif "expression" in s:
+            errors.append(f"{where}: expression is only allowed with register_type {DERIVED}")
+        if "address" in s: _check_int(errors, where, s["address"], "address", 0, 0xFFFF)
+        count = s.get("count", 1); dt = s.get("data_type")
+        if dt is not None:
+            if dt not in DATA_TYPES:
+                errors.append(f"{where}: data_type must be one of {sorted(DATA_TYPES)}, got {dt!r}")
+            elif "count" in s and count != DATA_TYPES[dt][0]:
+                errors.append(f"{where}: count {count} does not match data_type {dt} ({DATA_TYPES[dt][0]} registers)")
+        elif count not in (1, 2, 4):
+            errors.append(f"{where}: count must be 1, 2 or 4 (or set data_type), got {count!r}")
+        if s.get("word_order", "high_low") not in WORD_ORDERS:
+            errors.append(f"{where}: word_order must be one of {WORD_ORDERS}")
+        if s.get("poll_tier") is not None and s["poll_tier"] not in POLL_TIER_SECONDS:
+            errors.append(f"{where}: poll_tier must be one of {sorted(POLL_TIER_SECONDS)}")
+        for key in ("scale", "poll_interval", "deadband", "deadband_pct"):
+            if s.get(key) is not None and (isinstance(s[key], bool) or not isinstance(s[key], (int, float))):
+                errors.append(f"{where}: {key} must be a number, got {s[key]!r}")
+        if s.get("options") is not None and not isinstance(s["options"], dict):
+            errors.append(f"{where}: options must be a mapping of value -> label")
+        if uid:
+            if uid in seen_uid:
+                errors.append(f"{where}: duplicate unique_id (also {seen_uid[uid]})")
+            seen_uid[uid] = where
+        if "bitfields" in s:
+            _validate_bitfields(errors, where, s, seen_uid)
+        if rtype in REGISTER_TYPES and isinstance(s.get("address"), int) and isinstance(count, int):
+            words = DATA_TYPES[dt][0] if dt in DATA_TYPES else count
+            spans.append((rtype, s["address"], s["address"] + words, where))
+    # partially overlapping registers decode the same words two ways; identical spans are allowed aliases
+    spans.sort()
+    for (t1, a1, e1, w1), (t2, a2, e2, w2) in zip(spans, spans[1:]):
+        if t1 == t2 and a2 < e1 and (a1, e1) != (a2, e2):
+            errors.append(f"{w2}: {t2} {a2}..{e2 - 1} overlaps {w1} ({a1}..{e1 - 1})")
+    for i, c in enumerate(controls):
+        where = f"controls[{i}]"
+        if not isinstance(c, dict):
+            errors.append(f"{where}: must be a mapping"); continue
+        where = f"{where} ({c.get('unique_id') or c.get('name', '?')})"
+        ctype = c.get("type")
+        if ctype not in CONTROL_TYPES:
+            errors.append(f"{where}: type must be one of {CONTROL_TYPES}, got {ctype!r}"); continue
+        key = "base_address" if ctype.endswith("32") else "address"
+        if key not in c:
+            errors.append(f"{where}: missing {key}")
+        else:
+            _check_int(errors, where, c[key], key, 0, 0xFFFF)
+        if ctype.startswith("select"):
+            opts = c.get("options")
+            if not isinstance(opts, list) or not all(isinstance(o, dict) and "label" in o and "value" in o for o in opts):
+                errors.append(f"{where}: options must be a list of {{label, value}}")
+        if c.get("word_order", "high_low") not in WORD_ORDERS:
+            errors.append(f"{where}: word_order must be one of {WORD_ORDERS}")
+    return errors
+
+def _mask_of(b: dict) -> int:
+    return 1 << int(b["bit"]) if "bit" in b else int(str(b["mask"]), 0)
+
+def _validate_bitfields(errors: list[str], where: str, s: dict, seen_uid: dict[str, str]) -> None:
+    bfs = s["bitfields"]
+    if s.get("register_type") not in REGISTER_TYPES:
+        errors.append(f"{where}: bitfields need an input or holding register"); return
+    try:
+        dt = resolve_data_type(RegisterDef(str(s.get("name")), "", s["register_type"], 0, int(s.get("count", 1)),
+                                           signed=bool(s.get("signed", False)), data_type=s.get("data_type")))
+    except (TypeError, ValueError):
+        return  # count/data_type problems are reported above
+    if dt not in INTEGER_TYPES:
+        errors.append(f"{where}: bitfields need an integer register, got {dt}"); return
+    width = 16 * DATA_TYPES[dt][0]
+    if not isinstance(bfs, list):
+        errors.append(f"{where}: bitfields must be a list"); return
+    for j, b in enumerate(bfs):
+        bw = f"{where}.bitfields[{j}]"
+        if not isinstance(b, dict):
+            errors.append(f"{bw}: must be a mapping"); continue
+        unknown = sorted(set(b) - BITFIELD_KEYS)
+        if unknown:
+            errors.append(f"{bw}: unknown keys {unknown}")
+        for key in ("name", "unique_id"):
+            if not b.get(key):
+                errors.append(f"{bw}: missing {key}")
+        if ("bit" in b) == ("mask" in b):
+            errors.append(f"{bw}: give exactly one of bit or mask"); continue
+        if "bit" in b:
+            _check_int(errors, bw, b["bit"], "bit", 0, width - 1)
+        else:
+            try:
+                mask = _mask_of(b)
+                if not 0 < mask < (1 << width):
+                    errors.append(f"{bw}: mask {b['mask']} outside the {width}-bit register")
+            except (TypeError, ValueError):
+                errors.append(f"{bw}: mask must be an integer (e.g. 0x00F0), got {b['mask']!r}")
+        if "shift" in b:
+            _check_int(errors, bw, b["shift"], "shift", 0, width - 1)
+        uid = str(b.get("unique_id") or "")
+        if uid:
+            if uid in seen_uid:
+                errors.append(f"{bw}: duplicate unique_id (also {seen_uid[uid]})")
+            seen_uid[uid] = bw
+
+def _flatten_bitfields(sensors: list[dict]) -> list[dict]:
+    """Replace each sensor's bitfields: list with bitfield sub-sensors that point at it."""
+    out: list[dict] = []
+    for s in sensors:
+        bfs = s.pop("bitfields", None) or []
+        out.append(s)
+        for b in bfs:
+            mask = _mask_of(b)
+            child = {k: v for k, v in b.items() if k not in ("bit", "mask", "shift")}
+            child.update(register_type=BITFIELD, address=int(s["address"]), parent=s["unique_id"], mask=mask,
+                         shift=int(b.get("shift", (mask & -mask).bit_length() - 1)), binary="bit" in b)
+            if "poll_tier" in s: child["poll_tier"] = s["poll_tier"]
+            if "poll_interval" in s: child["poll_interval"] = s["poll_interval"]
+            out.append(child)
+    return out
+
+def validate_derived(sensors: list[dict]) -> list[str]:
+    """Derived expressions may only read existing unique_ids (incl. auto-injected readbacks) and must not form cycles."""
+    errors: list[str] = []; known = {s["unique_id"] for s in sensors}; exprs: dict[str, tuple[str, ...]] = {}
+    for s in sensors:
+        if s.get("register_type") != DERIVED:
+            continue
+        names = parse_expression(s["expression"])[1]
+        missing = [n for n in names if n not in known]
+        if missing:
+            errors.append(f"derived {s['unique_id']}: unknown sensors {missing}")
+        exprs[s["unique_id"]] = names
+    if not errors:
+        try: evaluation_order(exprs)
+        except ExpressionError as err: errors.append(str(err))
+    return errors
+
+def _register(d: dict[str, Any]) -> RegisterDef:
+    d = dict(d)
+    d["address"] = int(d.get("address", 0))
+    if d.get("data_type") in DATA_TYPES and "count" not in d:
+        d["count"] = DATA_TYPES[d["data_type"]][0]
+    d["count"] = int(d.get("count", 1)); d["scale"] = float(d.get("scale", 1.0))
+    if d.get("options") is not None:
+        d["options"] = {int(k): str(v) for k, v in d["options"].items()}
+    return RegisterDef(**d)
+
+def _compile(path: str, digest: str, sensors: list[dict], controls: list[dict]) -> CompiledMapping:
+    return CompiledMapping(path, digest, tuple(_register(s) for s in sensors), tuple(MappingProxyType(dict(c)) for c in controls))
+
+def _parse(path: str, raw: bytes) -> tuple[list[dict], list[dict]]:
+    data = yaml.load(raw.decode("utf-8"), Loader=_YAML_LOADER) or {}
+    if not isinstance(data, dict):
+        raise MappingError(path, ["top level must be a mapping with sensors/controls"])
+    sensors = data.get("sensors", []) or []
+    controls = data.get("controls", []) or []
+    errors = validate_mapping(sensors, controls)
+    if errors:
+        raise MappingError(path, errors)
+    sensors, controls = _auto_inject_readbacks([dict(s) for s in sensors], [dict(c) for c in controls])
+    sensors = _flatten_bitfields(sensors)
+    errors = validate_derived(sensors)
+    if errors:
+        raise MappingError(path, errors)
+    return sensors, controls
+
+def _cache_file(cache_dir: str, path: str) -> str:
+    return os.path.join(cache_dir, f"growatt_modbus_mapping.{hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]}.json")
+
+_COMPILED: dict[str, tuple[int, int, CompiledMapping]] = {}
+
+def load_compiled_mapping(path: str | None, cache_dir: str | None = None) -> CompiledMapping:
+    """
+    Load, validate and compile a mapping. Results are shared in memory per (path, mtime, size)
+    and cached on disk (JSON, keyed by mtime + sha256) so unchanged maps skip YAML parsing.
+    Raises MappingError on schema problems and OSError if the file cannot be read.
+    """
+    use_path = resolve_mapping_path(path)
+    st = os.stat(use_path)
+    hit = _COMPILED.get(use_path)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return hit[2]
+    cache = _cache_file(cache_dir, use_path) if cache_dir else None
+    cached: dict[str, Any] = {}
+    if cache and os.path.exists(cache):
+        try:
+            with open(cache, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as err:
+            _LOGGER.debug("Ignoring unreadable mapping cache %s: %s", cache, err)
+    compiled: CompiledMapping | None = None
+    if cached.get("format") == CACHE_FORMAT and cached.get("mtime_ns") == st.st_mtime_ns and cached.get("size") == st.st_size:
+        compiled = _compile(use_path, cached["sha256"], cached["sensors"], cached["controls"])
+    else:
+        with open(use_path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached.get("format") == CACHE_FORMAT and cached.get("sha256") == digest:
+            sensors, controls = cached["sensors"], cached["controls"]  # touched but unchanged
+        else:
+            sensors, controls = _parse(use_path, raw)
+        compiled = _compile(use_path, digest, sensors, controls)
+        if cache:
+            try:
+                os.makedirs(os.path.dirname(cache), exist_ok=True)
+                tmp = cache + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"format": CACHE_FORMAT, "path": use_path, "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                               "sha256": digest, "sensors": sensors, "controls": controls}, f)
+                os.replace(tmp, cache)
+            except (OSError, TypeError, ValueError) as err:
+                _LOGGER.debug("Could not write mapping cache %s: %s", cache, err)
+    _COMPILED[use_path] = (st.st_mtime_ns, st.st_size, compiled)
+    _LOGGER.info("Mapping loaded from %s: %s sensors, %s controls", use_path, len(compiled.sensors), len(compiled.controls))
+    return compiled
+
 def load_register_mapping(path: str | None) -> dict[str, Any]:
+    """Raw (unvalidated) sensors/controls lists; kept for tools that want the YAML as-is."""
     use_path = resolve_mapping_path(path)
     try:
         with open(use_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
+            data = yaml.load(f, Loader=_YAML_LOADER) or {}
         sensors = data.get("sensors", []) or []
         controls = data.get("controls", []) or []
         _LOGGER.info("Mapping loaded from %s: %s sensors, %s controls", use_path, len(sensors), len(controls))
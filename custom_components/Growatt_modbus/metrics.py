@@ -0,0 +1,149 @@
+
+from __future__ import annotations
+import asyncio
+from bisect import bisect_left
+from typing import Any, Dict
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+_EWMA = 0.2
+
+def is_timeout(err: BaseException) -> bool:
+    """asyncio timeouts and pymodbus 'no response' IO errors both count as timeouts."""
+    return isinstance(err, asyncio.TimeoutError) or type(err).__name__ in ("ModbusIOException", "TimeoutError")
+
+class WindowStats:
+    """Counters for one planned read window."""
+    __slots__ = ("register_type", "start", "count", "requests", "ok", "timeouts", "errors", "exceptions",
+                 "registers", "latency_ms_sum", "latency_ms_max", "latency_ms_last", "buckets", "last_error")
+
+    def __init__(self, register_type: str, start: int, count: int) -> None:
+        self.register_type = register_type; self.start = start; self.count = count
+        self.requests = self.ok = self.timeouts = self.errors = self.registers = 0
+        self.exceptions: Dict[int, int] = {}
+        self.latency_ms_sum = self.latency_ms_max = self.latency_ms_last = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # last bucket = +Inf
+        self.last_error: str | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "register_type": self.register_type, "start": self.start, "count": self.count,
+            "requests": self.requests, "ok": self.ok, "timeouts": self.timeouts, "errors": self.errors,
+            "exception_codes": dict(self.exceptions), "registers": self.registers,
+            "latency_ms_avg": round(self.latency_ms_sum / self.requests, 2) if self.requests else None,
+            "latency_ms_max": round(self.latency_ms_max, 2), "latency_ms_last": round(self.latency_ms_last, 2),
+            "latency_histogram": dict(zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], self.buckets)),
+            "last_error": self.last_error,
+        }
+
+class TierStats:
+    """Target vs achieved interval of one poll tier (one complete pass over its windows = one completion)."""
+    __slots__ = ("register_type", "interval_s", "completions", "deferred", "achieved_s", "_last")
+
+    def __init__(self, register_type: str, interval_s: float) -> None:
+        self.register_type = register_type; self.interval_s = interval_s
+        self.completions = self.deferred = 0; self.achieved_s = 0.0; self._last: float | None = None
+
+    def completed(self, now: float) -> None:
+        if self._last is not None:
+            dt = now - self._last
+            self.achieved_s = dt if self.completions == 1 else self.achieved_s + _EWMA * (dt - self.achieved_s)
+        self._last = now; self.completions += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "register_type": self.register_type, "interval_s": None if self.interval_s == float("inf") else self.interval_s,
+            "achieved_s": round(self.achieved_s, 2) if self.completions > 1 else None,
+            "completions": self.completions, "deferred_windows": self.deferred,
+        }
+
+class PollMetrics:
+    """Per-window and per-cycle instrumentation of the poll loop (diagnostics + optional sensors)."""
+    def __init__(self) -> None:
+        self.windows: Dict[tuple[str, int, int], WindowStats] = {}
+        self.cycles = 0; self.failed_cycles = 0; self.overruns = 0
+        self.cycle_ms_last = 0.0; self.cycle_ms_avg = 0.0; self.cycle_ms_max = 0.0; self.interval_ms = 0.0
+        self.tx_last = 0; self.registers_last = 0; self.reconnects = 0
+        self.writes = 0; self.write_errors = 0; self.slow_writes = 0
+        self.write_ms_last = 0.0; self.write_ms_max = 0.0; self.write_wait_ms_max = 0.0
+        self.tiers: Dict[tuple[str, float], TierStats] = {}; self.deferred = 0
+        self._tx = 0; self._regs = 0
+
+    def window(self, register_type: str, start: int, count: int) -> WindowStats:
+        key = (register_type, start, count)
+        ws = self.windows.get(key)
+        if ws is None:
+            ws = self.windows[key] = WindowStats(register_type, start, count)
+        return ws
+
+    def window_ms(self, register_type: str, start: int, count: int, default: float) -> float:
+        """Average measured latency of a window (default until it has been read)."""
+        ws = self.windows.get((register_type, start, count))
+        return ws.latency_ms_sum / ws.requests if ws is not None and ws.requests else default
+
+    def tier(self, register_type: str, interval_s: float) -> TierStats:
+        key = (register_type, interval_s)
+        ts = self.tiers.get(key)
+        if ts is None:
+            ts = self.tiers[key] = TierStats(register_type, interval_s)
+        return ts
+
+    def record_deferred(self, register_type: str, interval_s: float, windows: int) -> None:
+        self.tier(register_type, interval_s).deferred += windows; self.deferred += windows
+
+    def record_window(self, register_type: str, start: int, count: int, latency_s: float,
+                      ok: bool, exception_code: int | None = None, error: BaseException | None = None) -> None:
+        ws = self.window(register_type, start, count)
+        ms = latency_s * 1000.0
+        ws.requests += 1; ws.latency_ms_last = ms; ws.latency_ms_sum += ms
+        if ms > ws.latency_ms_max: ws.latency_ms_max = ms
+        ws.buckets[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self._tx += 1
+        if ok:
+            ws.ok += 1; ws.registers += count; self._regs += count
+        elif exception_code is not None:
+            ws.exceptions[exception_code] = ws.exceptions.get(exception_code, 0) + 1
+            ws.last_error = f"Modbus exception {exception_code}"
+        elif error is not None and is_timeout(error):
+            ws.timeouts += 1; ws.last_error = f"timeout ({type(error).__name__}) {error}".strip()
+        else:
+            ws.errors += 1; ws.last_error = f"{type(error).__name__}: {error}" if error is not None else "no response"
+
+    def record_cycle(self, duration_s: float, interval_s: float, ok: bool) -> None:
+        ms = duration_s * 1000.0
+        self.cycles += 1; self.cycle_ms_last = ms; self.interval_ms = interval_s * 1000.0
+        self.cycle_ms_avg = ms if self.cycles == 1 else self.cycle_ms_avg + _EWMA * (ms - self.cycle_ms_avg)
+        if ms > self.cycle_ms_max: self.cycle_ms_max = ms
+        if interval_s and duration_s > interval_s: self.overruns += 1
+        if not ok: self.failed_cycles += 1
+        self.tx_last, self._tx = self._tx, 0
+        self.registers_last, self._regs = self._regs, 0
+
+    def record_write(self, wait_s: float, latency_s: float, ok: bool, budget_ms: float = 0.0) -> None:
+        """latency = from the write call until the response (queueing behind reads included)."""
+        ms = latency_s * 1000.0
+        self.writes += 1; self.write_ms_last = ms
+        if ms > self.write_ms_max: self.write_ms_max = ms
+        if wait_s * 1000.0 > self.write_wait_ms_max: self.write_wait_ms_max = wait_s * 1000.0
+        if budget_ms and ms > budget_ms: self.slow_writes += 1
+        if not ok: self.write_errors += 1
+
+    def totals(self) -> dict[str, int]:
+        ws = self.windows.values()
+        return {
+            "timeouts": sum(w.timeouts for w in ws), "errors": sum(w.errors for w in ws),
+            "exceptions": sum(sum(w.exceptions.values()) for w in ws), "requests": sum(w.requests for w in ws),
+        }
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "cycles": self.cycles, "failed_cycles": self.failed_cycles, "overruns": self.overruns, "reconnects": self.reconnects,
+            "cycle_ms_last": round(self.cycle_ms_last, 2), "cycle_ms_avg": round(self.cycle_ms_avg, 2),
+            "cycle_ms_max": round(self.cycle_ms_max, 2), "interval_ms": self.interval_ms,
+            "transactions_last_cycle": self.tx_last, "registers_last_cycle": self.registers_last,
+            "writes": self.writes, "write_errors": self.write_errors, "slow_writes": self.slow_writes,
+            "write_ms_last": round(self.write_ms_last, 2), "write_ms_max": round(self.write_ms_max, 2),
+            "write_wait_ms_max": round(self.write_wait_ms_max, 2), "deferred_windows": self.deferred,
+            "tiers": [t.as_dict() for t in sorted(self.tiers.values(), key=lambda t: (t.register_type != "input", t.interval_s))],
+            **self.totals(),
+            "windows": [w.as_dict() for w in sorted(self.windows.values(), key=lambda w: (w.register_type, w.start))],
+        }
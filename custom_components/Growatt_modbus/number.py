@@ -9,17 +9,18 @@ from homeassistant.helpers.update_coordinator import CoordinatorEntity
 import logging
 from .const import DOMAIN
 from .coordinator import GrowattModbusCoordinator
-from .device_helper import build_device_info
+from .device_helper import build_device_info, entity_unique_id
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
-    data = hass.data[DOMAIN][entry.entry_id]; coord: GrowattModbusCoordinator = data["coordinator"]
     entities = []
-    for c in data.get("controls", []):
-        if c.get("type") == "number":
-            entities.append(GrowattModbusNumber(coord, entry, c))
-        elif c.get("type") == "number32":
-            entities.append(GrowattModbusNumber32(coord, entry, c))
+    for unit in hass.data[DOMAIN][entry.entry_id]["units"]:
+        coord: GrowattModbusCoordinator = unit["coordinator"]
+        for c in unit["controls"]:
+            if c.get("type") == "number":
+                entities.append(GrowattModbusNumber(coord, entry, c))
+            elif c.get("type") == "number32":
+                entities.append(GrowattModbusNumber32(coord, entry, c))
     _LOGGER.info("Adding %s number entities", len(entities))
     if entities: async_add_entities(entities)
 
@@ -30,8 +31,8 @@ class GrowattModbusNumber(CoordinatorEntity[dict[str, Any]], NumberEntity):
         self._address = int(cfg["address"])
         self._attr_name = cfg.get("name")
         uid = cfg.get("unique_id") or f"number_{self._address}"
-        self._attr_unique_id = f"{entry.entry_id}_{uid}"
-        self._attr_device_info = build_device_info(entry)
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, uid)
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
         self._attr_native_min_value = float(cfg.get("min", 0)); self._attr_native_max_value = float(cfg.get("max", 100))
         self._attr_native_step = float(cfg.get("step", 1)); self._attr_mode = NumberMode.SLIDER if cfg.get("mode", "slider") == "slider" else NumberMode.BOX
         self._attr_native_unit_of_measurement = cfg.get("unit_of_measurement")
@@ -46,7 +47,6 @@ class GrowattModbusNumber(CoordinatorEntity[dict[str, Any]], NumberEntity):
         ok = await self._coordinator.write_single_register(self._address, raw)
         if ok:
             self._value = v; self.async_write_ha_state()
-            await self._coordinator.async_request_refresh()
     def _sync_from_sensor(self) -> None:
         if not self._read_uid: return
         raw = (self._coordinator.data or {}).get(self._read_uid)
@@ -56,7 +56,9 @@ class GrowattModbusNumber(CoordinatorEntity[dict[str, Any]], NumberEntity):
             step = self._attr_native_step or 1.0; minv = self._attr_native_min_value; maxv = self._attr_native_max_value
             val = max(minv, min(maxv, round(val / step) * step)); self._value = val
         except Exception: pass
-    def _handle_coordinator_update(self) -> None: self._sync_from_sensor(); self.async_write_ha_state()
+    def _handle_coordinator_update(self) -> None:
+        if not self._coordinator.changed(self._read_uid): return
+        self._sync_from_sensor(); self.async_write_ha_state()
 
 class GrowattModbusNumber32(CoordinatorEntity[dict[str, Any]], NumberEntity):
     _attr_has_entity_name = True
@@ -65,8 +67,8 @@ class GrowattModbusNumber32(CoordinatorEntity[dict[str, Any]], NumberEntity):
         self._base = int(cfg["base_address"]); self._order = cfg.get("word_order", "high_low")
         self._attr_name = cfg.get("name")
         uid = cfg.get("unique_id") or f"number32_{self._base}"
-        self._attr_unique_id = f"{entry.entry_id}_{uid}"
-        self._attr_device_info = build_device_info(entry)
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, uid)
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
         self._attr_native_min_value = float(cfg.get("min", 0)); self._attr_native_max_value = float(cfg.get("max", 4294967295))
         self._attr_native_step = float(cfg.get("step", 1)); self._attr_mode = NumberMode.BOX if cfg.get("mode", "box") == "box" else NumberMode.SLIDER
         self._value: float = 0.0
@@ -77,4 +79,6 @@ class GrowattModbusNumber32(CoordinatorEntity[dict[str, Any]], NumberEntity):
         ok = await self._coordinator.write_u32(self._base, v, self._order)
         if ok:
             self._value = float(v); self.async_write_ha_state()
-            await self._coordinator.async_request_refresh()
+    def _handle_coordinator_update(self) -> None:
+        # no readback: only availability can change
+        if self._coordinator.changed(): self.async_write_ha_state()
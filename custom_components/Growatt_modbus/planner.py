@@ -0,0 +1,121 @@
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+
+from .const import MODBUS_MAX_READ_REGISTERS, READ_BLOCK_REGISTERS, LINK_REQUEST_COST_MS, LINK_BYTE_COST_MS, POLL_TIER_SECONDS, DEFAULT_POLL_TIER
+
+@dataclass(frozen=True)
+class LinkCost:
+    """Estimated cost of one read transaction: fixed round trip + per-word transfer."""
+    request_ms: float
+    word_ms: float
+
+    def window(self, count: int) -> float:
+        return self.request_ms + count * self.word_ms
+
+def link_cost(transport: str, baudrate: int | None = None) -> LinkCost:
+    """Cost model for a transport. Serial framing makes every word cost 2 bytes on the bus."""
+    transport = (transport or "tcp").lower()
+    request_ms = LINK_REQUEST_COST_MS.get(transport, LINK_REQUEST_COST_MS["tcp"])
+    if transport == "tcp":
+        return LinkCost(request_ms, 2 * LINK_BYTE_COST_MS["tcp"])
+    # 1 start + 8 data + parity/stop ~= 11 bit times per byte on RS485
+    byte_ms = 11000.0 / float(baudrate) if baudrate else LINK_BYTE_COST_MS["rtutcp"]
+    if transport == "rtu":
+        # no gateway: the round trip is the slave turnaround + request/response framing (13 bytes) + two t3.5 gaps
+        request_ms += 20 * byte_ms
+    return LinkCost(request_ms, 2 * byte_ms)
+
+@dataclass(frozen=True)
+class ReadWindow:
+    """One planned read transaction covering [start, start+count)."""
+    register_type: str
+    start: int
+    count: int
+    registers: tuple
+
+    @property
+    def end(self) -> int:
+        return self.start + self.count
+
+def _spans(regs: Sequence) -> list[tuple[int, int, list]]:
+    """Collapse overlapping registers into atomic spans that must be read together."""
+    spans: list[tuple[int, int, list]] = []
+    for r in sorted(regs, key=lambda r: (int(r.address), -int(r.count))):
+        a = int(r.address); e = a + max(1, int(r.count))
+        if spans and a < spans[-1][1]:
+            s, se, acc = spans[-1]; acc.append(r); spans[-1] = (s, max(se, e), acc)
+        else:
+            spans.append((a, e, [r]))
+    return spans
+
+def plan_windows(regs: Iterable, register_type: str, cost: LinkCost, max_count: int = MODBUS_MAX_READ_REGISTERS,
+                 block: int = READ_BLOCK_REGISTERS, origin: int = 0) -> list[ReadWindow]:
+    """
+    Partition registers into read windows with minimal total cost.
+    Every window stays within max_count words and within one device read block
+    (addresses origin + k*block .. origin + (k+1)*block - 1; block 0 = no blocks);
+    only a single span that itself straddles an edge is read across it.
+    Gap words are only read when that is cheaper than paying for another round trip
+    (dynamic programming over spans).
+    """
+    spans = _spans(list(regs))
+    n = len(spans)
+    if not n:
+        return []
+    max_count = max(1, int(max_count)); block = int(block or 0)
+    best = [0.0] + [float("inf")] * n
+    cut = [0] * (n + 1)
+    for i in range(1, n + 1):
+        end = spans[i - 1][1]
+        for j in range(i, 0, -1):
+            words = end - spans[j - 1][0]
+            if j < i and (words > max_count or block and (spans[j - 1][0] - origin) // block != (end - 1 - origin) // block):
+                break
+            c = best[j - 1] + cost.window(words)
+            if c < best[i]:
+                best[i] = c; cut[i] = j - 1
+    windows: list[ReadWindow] = []
+    i = n
+    while i > 0:
+        j = cut[i]
+        start = spans[j][0]; end = spans[i - 1][1]
+        regs_in = tuple(r for s in spans[j:i] for r in s[2])
+        windows.append(ReadWindow(register_type, start, end - start, regs_in))
+        i = j
+    windows.reverse()
+    return windows
+
+def plan_cost(windows: Iterable[ReadWindow], cost: LinkCost) -> float:
+    return sum(cost.window(w.count) for w in windows)
+
+def poll_interval_of(reg) -> float:
+    """Seconds between reads of a register: explicit poll_interval, else its tier (unknown tier = default)."""
+    if getattr(reg, "poll_interval", None) is not None:
+        return max(0.0, float(reg.poll_interval))
+    tier = getattr(reg, "poll_tier", None) or DEFAULT_POLL_TIER
+    return float(POLL_TIER_SECONDS.get(tier, POLL_TIER_SECONDS[DEFAULT_POLL_TIER]))
+
+@dataclass
+class PollGroup:
+    """Windows sharing one poll interval; next_due is a monotonic timestamp (0 = due now).
+    cursor = first window not read yet when a deferred pass is continued in later cycles."""
+    interval: float
+    windows: list
+    next_due: float = 0.0
+    cursor: int = 0
+
+    def due(self, now: float, slack: float = 0.0) -> bool:
+        return self.interval <= 0 or now + slack >= self.next_due
+
+    def mark_read(self, now: float) -> None:
+        self.next_due = now + self.interval
+
+def group_by_interval(regs: Iterable, scan_interval: float) -> dict[float, list]:
+    """Bucket registers by effective poll interval; anything at or below scan_interval runs every cycle."""
+    groups: dict[float, list] = {}
+    for r in regs:
+        iv = poll_interval_of(r)
+        groups.setdefault(0.0 if iv <= scan_interval else iv, []).append(r)
+    return dict(sorted(groups.items()))
@@ -0,0 +1,169 @@
+
+from __future__ import annotations
+import logging, mmap, os, struct, time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# File:  MAGIC, then frames (one per poll cycle).
+# Frame: <I payload length> <d unix time> <H window count>, then per window
+#        <B type> <H start> <H count> + count big-endian words (the buffer WindowLayout.decode reads).
+# start is the device address as sent on the wire (map address - address_offset), the space replay is queried in.
+MAGIC = b"GWRAW1\n\0"
+_FRAME = struct.Struct("<IdH")
+_WINDOW = struct.Struct("<BHH")
+TYPES = ("input", "holding")
+_TYPE_CODE = {t: i for i, t in enumerate(TYPES)}
+
+RawWindow = Tuple[str, int, int, memoryview]  # register_type, start, count, big-endian words
+
+class RawRecorder:
+    """
+    Collects the raw windows of each poll cycle and appends them as one frame.
+    Frames are buffered in memory; flush() (blocking, run it in an executor) writes them
+    and rotates path -> path.1 -> ... path.<keep> once the file exceeds max_bytes.
+    """
+    def __init__(self, path: str, max_bytes: int = 16 << 20, keep: int = 3, flush_bytes: int = 64 << 10, flush_seconds: float = 60.0) -> None:
+        self.path = path; self.max_bytes = int(max_bytes); self.keep = max(0, int(keep))
+        self.flush_bytes = int(flush_bytes); self.flush_seconds = float(flush_seconds)
+        self._windows: List[bytes] = []; self._pending = bytearray(); self._last_flush = time.monotonic()
+        self.frames = 0; self.bytes = 0
+
+    def add(self, register_type: str, start: int, buf: bytes) -> None:
+        self._windows.append(_WINDOW.pack(_TYPE_CODE[register_type], start, len(buf) // 2) + bytes(buf))
+
+    def commit(self, ts: float | None = None) -> bool:
+        """Close the current frame; True when enough is buffered that a flush is due."""
+        if self._windows:
+            body = b"".join(self._windows)
+            self._pending += _FRAME.pack(_FRAME.size - 4 + len(body), time.time() if ts is None else ts, len(self._windows)) + body
+            self._windows.clear(); self.frames += 1
+        return bool(self._pending) and (len(self._pending) >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_seconds)
+
+    def take(self) -> bytes:
+        """Hand the buffered frames to flush(); call from the event loop."""
+        data = bytes(self._pending); self._pending.clear(); self._last_flush = time.monotonic()
+        return data
+
+    def flush(self, data: bytes) -> None:
+        if not data:
+            return
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size and size + len(data) > self.max_bytes:
+            self._rotate(); size = 0
+        with open(self.path, "ab") as f:
+            if not size:
+                f.write(MAGIC)
+            f.write(data)
+        self.bytes += len(data)
+
+    def _rotate(self) -> None:
+        if not self.keep:
+            os.remove(self.path); return
+        for i in range(self.keep, 0, -1):
+            src = f"{self.path}.{i - 1}" if i > 1 else self.path
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i}")
+        _LOGGER.debug("Raw log rotated: %s", self.path)
+
+class RawLogReader:
+    """Memory-mapped, zero-copy iteration over a raw log; a truncated last frame (crash) is ignored."""
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a growatt_modbus raw log")
+
+    def __iter__(self) -> Iterator[Tuple[float, List[RawWindow]]]:
+        view = memoryview(self._mm); pos = len(MAGIC); size = len(view)
+        while pos + _FRAME.size <= size:
+            length, ts, n = _FRAME.unpack_from(view, pos)
+            end = pos + 4 + length
+            if end > size:
+                break
+            p = pos + _FRAME.size; windows: List[RawWindow] = []
+            for _ in range(n):
+                code, start, count = _WINDOW.unpack_from(view, p); p += _WINDOW.size
+                windows.append((TYPES[code], start, count, view[p:p + count * 2])); p += count * 2
+            yield ts, windows
+            pos = end
+
+    def close(self) -> None:
+        if isinstance(self._mm, mmap.mmap):
+            try: self._mm.close()
+            except BufferError: pass  # frames still referenced; unmapped when they are released
+
+class ReplayResponse:
+    """Minimal pymodbus-like read/write response."""
+    __slots__ = ("registers", "exception_code")
+    def __init__(self, registers: Optional[List[int]] = None, exception_code: int | None = None) -> None:
+        self.registers = registers or []; self.exception_code = exception_code
+
+    def isError(self) -> bool:
+        return self.exception_code is not None
+
+class ReplayClient:
+    """
+    Stand-in for AsyncModbusTcpClient that answers reads from a raw log.
+    Every recorded window stays known once seen; the client moves to the next frame when a
+    window of the current frame is read again (one poll cycle = one frame), so replay runs as
+    fast as the coordinator polls. Reads not covered by any known window answer illegal address;
+    writes are accepted and change nothing. At the end of the log it wraps around (loop=True).
+    """
+    def __init__(self, path: str, loop: bool = True) -> None:
+        self._reader = RawLogReader(path); self._loop = loop
+        self._frames = iter(self._reader); self._known: Dict[Tuple[str, int], Tuple[int, memoryview]] = {}
+        self._served: set = set(); self.connected = False; self.frame_ts: float | None = None; self.frames = 0
+        self._advance()
+
+    def _advance(self) -> bool:
+        try:
+            ts, windows = next(self._frames)
+        except StopIteration:
+            if not self._loop:
+                return False
+            self._frames = iter(self._reader)
+            try:
+                ts, windows = next(self._frames)
+            except StopIteration:
+                return False
+        self.frame_ts = ts; self.frames += 1; self._served.clear()
+        for rtype, start, count, buf in windows:
+            self._known[(rtype, start)] = (count, buf)
+        return True
+
+    async def connect(self) -> bool:
+        self.connected = True
+        return True
+
+    def close(self) -> None:
+        self.connected = False
+
+    def _read(self, rtype: str, address: int, count: int) -> ReplayResponse:
+        key = (rtype, address, count)
+        if key in self._served:
+            self._advance()
+        self._served.add(key)
+        hit = self._known.get((rtype, address))
+        if hit is None or hit[0] < count:
+            hit = next(((c, b[(address - s) * 2:]) for (t, s), (c, b) in self._known.items()
+                        if t == rtype and s <= address and address + count <= s + c), None)
+            if hit is None:
+                return ReplayResponse(exception_code=2)
+        return ReplayResponse(list(struct.unpack_from(f">{count}H", hit[1])))
+
+    async def read_input_registers(self, address: int, count: int = 1, **_kw) -> ReplayResponse:
+        return self._read("input", address, count)
+
+    async def read_holding_registers(self, address: int, count: int = 1, **_kw) -> ReplayResponse:
+        return self._read("holding", address, count)
+
+    async def write_register(self, address: int, value: int, **_kw) -> ReplayResponse:
+        return ReplayResponse()
+
+    async def write_registers(self, address: int, values, **_kw) -> ReplayResponse:
+        return ReplayResponse()
+
+    async def write_coil(self, address: int, value, **_kw) -> ReplayResponse:
+        return ReplayResponse()
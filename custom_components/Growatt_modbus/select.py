@@ -9,17 +9,18 @@ from homeassistant.helpers.update_coordinator import CoordinatorEntity
 import logging
 from .const import DOMAIN
 from .coordinator import GrowattModbusCoordinator
-from .device_helper import build_device_info
+from .device_helper import build_device_info, entity_unique_id
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
-    data = hass.data[DOMAIN][entry.entry_id]; coord: GrowattModbusCoordinator = data["coordinator"]
     entities = []
-    for c in data.get("controls", []):
-        if c.get("type") == "select":
-            entities.append(GrowattModbusSelect(coord, entry, c))
-        elif c.get("type") == "select32":
-            entities.append(GrowattModbusSelect32(coord, entry, c))
+    for unit in hass.data[DOMAIN][entry.entry_id]["units"]:
+        coord: GrowattModbusCoordinator = unit["coordinator"]
+        for c in unit["controls"]:
+            if c.get("type") == "select":
+                entities.append(GrowattModbusSelect(coord, entry, c))
+            elif c.get("type") == "select32":
+                entities.append(GrowattModbusSelect32(coord, entry, c))
     _LOGGER.info("Adding %s select entities", len(entities))
     if entities: async_add_entities(entities)
 
@@ -33,8 +34,8 @@ class GrowattModbusSelect(CoordinatorEntity[dict[str, Any]], SelectEntity):
         self._value_by_label = {o["label"]: int(o["value"]) for o in opts}; self._label_by_value = {int(o["value"]): o["label"] for o in opts}
         self._attr_name = cfg.get("name")
         uid = cfg.get("unique_id") or f"select_{self._address}"
-        self._attr_unique_id = f"{entry.entry_id}_{uid}"
-        self._attr_device_info = build_device_info(entry)
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, uid)
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
         self._attr_options = self._labels; self._current_option: Optional[str] = None
         self._read_uid: Optional[str] = cfg.get("read_unique_id"); self._read_factor: float = float(cfg.get("read_factor", 1.0))
         self._sync_from_sensor()
@@ -45,14 +46,15 @@ class GrowattModbusSelect(CoordinatorEntity[dict[str, Any]], SelectEntity):
         ok = await self._coordinator.write_single_register(self._address, self._value_by_label[option])
         if ok:
             self._current_option = option; self.async_write_ha_state()
-            await self._coordinator.async_request_refresh()
     def _sync_from_sensor(self) -> None:
         if not self._read_uid: return
         raw = (self._coordinator.data or {}).get(self._read_uid)
         if raw is None: return
         try: v = int(round(float(raw) / self._read_factor)); self._current_option = self._label_by_value.get(v, None)
         except Exception: pass
-    def _handle_coordinator_update(self) -> None: self._sync_from_sensor(); self.async_write_ha_state()
+    def _handle_coordinator_update(self) -> None:
+        if not self._coordinator.changed(self._read_uid): return
+        self._sync_from_sensor(); self.async_write_ha_state()
 
 class GrowattModbusSelect32(CoordinatorEntity[dict[str, Any]], SelectEntity):
     """Select that modifies only a bitfield within a packed 32-bit register (read-modify-write)."""
@@ -70,8 +72,8 @@ class GrowattModbusSelect32(CoordinatorEntity[dict[str, Any]], SelectEntity):
         self._label_by_value = {int(o["value"]): o["label"] for o in opts}
         self._attr_name = cfg.get("name")
         uid = cfg.get("unique_id") or f"select32_{self._base}"
-        self._attr_unique_id = f"{entry.entry_id}_{uid}"
-        self._attr_device_info = build_device_info(entry)
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, uid)
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
         self._attr_options = self._labels
         self._current_option: Optional[str] = None
         self._read_uid: Optional[str] = cfg.get("read_unique_id")
@@ -104,12 +106,13 @@ class GrowattModbusSelect32(CoordinatorEntity[dict[str, Any]], SelectEntity):
         if ok:
             self._recompute_option_from_u32(new)
             self.async_write_ha_state()
-            await self._coordinator.async_request_refresh()
     def _sync_from_sensor(self) -> None:
         v = self._get_u32()
         if v is None:
             return
         self._recompute_option_from_u32(v)
     def _handle_coordinator_update(self) -> None:
+        if not self._coordinator.changed(self._read_uid):
+            return
         self._sync_from_sensor()
         self.async_write_ha_state()
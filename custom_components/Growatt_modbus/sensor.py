@@ -3,35 +3,49 @@ from __future__ import annotations
 from typing import Any, Optional
 from homeassistant.components.sensor import SensorEntity, SensorDeviceClass, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfTime
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.util import dt as dt_util
 import logging
-from .const import DOMAIN
+from .const import DOMAIN, CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS, CONF_RAW_ATTRIBUTES, DEFAULT_RAW_ATTRIBUTES
 from .coordinator import GrowattModbusCoordinator, RegisterDef
-from .device_helper import build_device_info
+from .device_helper import build_device_info, entity_unique_id
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
-    data = hass.data[DOMAIN][entry.entry_id]
-    coord: GrowattModbusCoordinator = data["coordinator"]
-    regs: list[RegisterDef] = data["registers"]
-    entities = [GrowattRegisterSensor(coord, entry, r) for r in regs]
+    entities: list[SensorEntity] = []
+    for unit in hass.data[DOMAIN][entry.entry_id]["units"]:
+        coord: GrowattModbusCoordinator = unit["coordinator"]
+        regs: list[RegisterDef] = unit["registers"]
+        raw_attrs = bool(entry.options.get(CONF_RAW_ATTRIBUTES, DEFAULT_RAW_ATTRIBUTES))
+        entities.extend(GrowattRegisterSensor(coord, entry, r, raw_attrs) for r in regs if not r.binary)
+        if entry.options.get(CONF_DIAGNOSTIC_SENSORS, DEFAULT_DIAGNOSTIC_SENSORS):
+            entities.extend(GrowattPollMetricSensor(coord, entry, *d) for d in POLL_METRIC_SENSORS)
     _LOGGER.info("Adding %s sensor entities", len(entities))
     if entities: async_add_entities(entities)
 
 class GrowattRegisterSensor(CoordinatorEntity[dict[str, Any]], SensorEntity):
+    """
+    Enum maps are published once as the ENUM sensor's options (not recorded per state) instead of
+    an options_map attribute; raw_value is only added with the raw attributes option. The attribute
+    dict is cached and rebuilt only when the value or the stale marker changes.
+    """
     _attr_has_entity_name = True
+    _unrecorded_attributes = frozenset({"raw_value"})
 
-    def __init__(self, coordinator: GrowattModbusCoordinator, entry: ConfigEntry, reg: RegisterDef) -> None:
+    def __init__(self, coordinator: GrowattModbusCoordinator, entry: ConfigEntry, reg: RegisterDef, raw_attributes: bool = False) -> None:
         super().__init__(coordinator)
         self._entry = entry
         self._reg = reg
         self._options = reg.options or None  # enum map if provided
+        self._raw_attributes = raw_attributes
+        self._attrs: dict[str, Any] = {}; self._attrs_key: tuple | None = None
         uid = reg.unique_id or f"s_{reg.address}"
-        self._attr_unique_id = f"{entry.entry_id}_{uid}"
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, uid)
         self._attr_name = reg.name
-        self._attr_device_info = build_device_info(entry)
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
         self._attr_native_unit_of_measurement = reg.unit_of_measurement
         if reg.device_class:
             try:
@@ -43,6 +57,9 @@ class GrowattRegisterSensor(CoordinatorEntity[dict[str, Any]], SensorEntity):
                 self._attr_state_class = SensorStateClass(reg.state_class)
             except Exception:
                 self._attr_state_class = None
+        if self._options is not None and reg.device_class in (None, "enum") and not reg.state_class and not reg.unit_of_measurement:
+            self._attr_device_class = SensorDeviceClass.ENUM
+            self._attr_options = list(dict.fromkeys(self._options.values()))
 
     @property
     def native_value(self) -> Any:
@@ -52,22 +69,70 @@ class GrowattRegisterSensor(CoordinatorEntity[dict[str, Any]], SensorEntity):
                 key = int(round(float(raw)))
             except Exception:
                 return raw
+            if key not in self._options and self._attr_device_class == SensorDeviceClass.ENUM:
+                return None  # ENUM state must be one of the options; the code stays visible as raw_value
             return self._options.get(key, str(key))
         return raw
 
     @property
     def extra_state_attributes(self) -> dict[str, Any]:
-        raw = (self.coordinator.data or {}).get(self._reg.unique_id)
-        attrs = {}
-        if raw is not None:
-            try:
-                attrs["raw_value"] = int(round(float(raw)))
-            except Exception:
-                attrs["raw_value"] = raw
-        if self._options is not None:
-            attrs["options_map"] = self._options
-        return attrs
+        raw = (self.coordinator.data or {}).get(self._reg.unique_id) if self._raw_attributes else None
+        stale = self.coordinator.stale_since(self._reg.unique_id)
+        key = (raw, stale)
+        if key != self._attrs_key:
+            attrs: dict[str, Any] = {}
+            if raw is not None:
+                try:
+                    attrs["raw_value"] = int(round(float(raw)))
+                except Exception:
+                    attrs["raw_value"] = raw
+            if stale is not None:
+                attrs["stale_since"] = dt_util.utc_from_timestamp(stale).isoformat()
+            self._attrs = attrs; self._attrs_key = key
+        return self._attrs
 
     @callback
     def _handle_coordinator_update(self) -> None:
-        self.async_write_ha_state()
+        if self.coordinator.changed(self._reg.unique_id):
+            self.async_write_ha_state()
+
+# (key, name, unit, state_class, getter) for the optional poll diagnostics
+POLL_METRIC_SENSORS = (
+    ("cycle_ms", "Poll cycle duration", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda m: round(m.cycle_ms_last, 1)),
+    ("cycle_ms_avg", "Poll cycle duration (avg)", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda m: round(m.cycle_ms_avg, 1)),
+    ("cycle_load", "Poll cycle load", "%", SensorStateClass.MEASUREMENT, lambda m: round(100.0 * m.cycle_ms_avg / m.interval_ms, 1) if m.interval_ms else None),
+    ("transactions", "Modbus transactions per cycle", None, SensorStateClass.MEASUREMENT, lambda m: m.tx_last),
+    ("registers", "Registers read per cycle", None, SensorStateClass.MEASUREMENT, lambda m: m.registers_last),
+    ("overruns", "Poll cycle overruns", None, SensorStateClass.TOTAL_INCREASING, lambda m: m.overruns),
+    ("timeouts", "Modbus timeouts", None, SensorStateClass.TOTAL_INCREASING, lambda m: m.totals()["timeouts"]),
+    ("exceptions", "Modbus exception responses", None, SensorStateClass.TOTAL_INCREASING, lambda m: m.totals()["exceptions"]),
+    ("errors", "Modbus read errors", None, SensorStateClass.TOTAL_INCREASING, lambda m: m.totals()["errors"]),
+    ("reconnects", "Modbus reconnects", None, SensorStateClass.TOTAL_INCREASING, lambda m: m.reconnects),
+    ("write_ms", "Modbus write latency", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda m: round(m.write_ms_last, 1) if m.writes else None),
+    ("deferred", "Read windows deferred", None, SensorStateClass.TOTAL_INCREASING, lambda m: m.deferred),
+    ("fast_tier_s", "Fast tier achieved interval", UnitOfTime.SECONDS, SensorStateClass.MEASUREMENT,
+     lambda m: round(m.tier("input", 0.0).achieved_s, 2) if m.tier("input", 0.0).completions > 1 else None),
+    ("slow_writes", "Modbus writes over latency budget", None, SensorStateClass.TOTAL_INCREASING, lambda m: m.slow_writes),
+)
+
+class GrowattPollMetricSensor(CoordinatorEntity[dict[str, Any]], SensorEntity):
+    """Communication health from coordinator.metrics; stays available when a cycle fails."""
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: GrowattModbusCoordinator, entry: ConfigEntry, key: str, name: str, unit, state_class, getter) -> None:
+        super().__init__(coordinator)
+        self._getter = getter
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, f"poll_{key}")
+        self._attr_name = name
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @property
+    def native_value(self) -> Any:
+        return self._getter(self.coordinator.metrics)
@@ -9,13 +9,12 @@ from homeassistant.helpers.update_coordinator import CoordinatorEntity
 import logging
 from .const import DOMAIN
 from .coordinator import GrowattModbusCoordinator
-from .device_helper import build_device_info
+from .device_helper import build_device_info, entity_unique_id
 _LOGGER = logging.getLogger(__name__)
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback) -> None:
-    data = hass.data[DOMAIN][entry.entry_id]
-    coord: GrowattModbusCoordinator = data["coordinator"]
-    entities = [GrowattModbusSwitch(coord, entry, c) for c in data.get("controls", []) if c.get("type") == "switch"]
+    entities = [GrowattModbusSwitch(unit["coordinator"], entry, c)
+                for unit in hass.data[DOMAIN][entry.entry_id]["units"] for c in unit["controls"] if c.get("type") == "switch"]
     _LOGGER.info("Adding %s switch entities", len(entities))
     if entities: async_add_entities(entities)
 
@@ -28,8 +27,8 @@ class GrowattModbusSwitch(CoordinatorEntity[dict[str, Any]], SwitchEntity):
         self._state: Optional[bool] = None
         self._attr_name = cfg.get("name")
         uid = cfg.get("unique_id") or f"switch_{self._address}"
-        self._attr_unique_id = f"{entry.entry_id}_{uid}"
-        self._attr_device_info = build_device_info(entry)
+        self._attr_unique_id = entity_unique_id(entry, coordinator.unit_key, uid)
+        self._attr_device_info = build_device_info(entry, coordinator.unit_key)
         self._read_uid: Optional[str] = cfg.get("read_unique_id"); self._read_factor: float = float(cfg.get("read_factor", 1.0))
         self._sync_from_sensor()
     @property
@@ -41,9 +40,7 @@ class GrowattModbusSwitch(CoordinatorEntity[dict[str, Any]], SwitchEntity):
         ok = await self._write(self._off);
         if ok: self._state = False; self.async_write_ha_state()
     async def _write(self, value: int) -> bool:
-        ok = await (self._coordinator.write_coil(self._address, value) if self._register_type == "coil" else self._coordinator.write_single_register(self._address, value))
-        if ok: await self._coordinator.async_request_refresh()
-        return ok
+        return await (self._coordinator.write_coil(self._address, value) if self._register_type == "coil" else self._coordinator.write_single_register(self._address, value))
     def _sync_from_sensor(self) -> None:
         if not self._read_uid: return
         raw = (self._coordinator.data or {}).get(self._read_uid)
@@ -51,4 +48,6 @@ class GrowattModbusSwitch(CoordinatorEntity[dict[str, Any]], SwitchEntity):
         try:
             v = int(round(float(raw) / self._read_factor)); self._state = (v == self._on)
         except Exception: pass
-    def _handle_coordinator_update(self) -> None: self._sync_from_sensor(); self.async_write_ha_state()
+    def _handle_coordinator_update(self) -> None:
+        if not self._coordinator.changed(self._read_uid): return
+        self._sync_from_sensor(); self.async_write_ha_state()
@@ -0,0 +1,15 @@
+"""
+The integration package's __init__ needs Home Assistant. When it is not installed, the
+pure-Python modules (planner, decoder, compat, framer, ...) are loaded without running it;
+tests that need Home Assistant skip themselves.
+"""
+import importlib, os, sys, types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PKG = "custom_components.Growatt_modbus"
+sys.path.insert(0, ROOT)
+try:
+    importlib.import_module(PKG)
+except ImportError:
+    _pkg = types.ModuleType(PKG); _pkg.__path__ = [os.path.join(ROOT, "custom_components", "Growatt_modbus")]
+    sys.modules[PKG] = _pkg
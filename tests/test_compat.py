@@ -0,0 +1,76 @@
+import pytest
+
+from custom_components.Growatt_modbus.compat import ModbusCalls, unit_kwarg
+
+class KeywordOnlyClient:
+    """pymodbus 3.7 - 3.9 style: count and slave keyword-only."""
+    def __init__(self):
+        self.calls = []
+
+    async def read_input_registers(self, address, *, count=1, slave=1, no_response_expected=False):
+        self.calls.append(("read_input_registers", address, count, slave))
+
+    async def write_register(self, address, value, *, slave=1, no_response_expected=False):
+        self.calls.append(("write_register", address, value, slave))
+
+def test_explicit_keyword_is_detected():
+    assert unit_kwarg(KeywordOnlyClient(), "read_input_registers") == "slave"
+
+async def _run(calls):
+    await calls.read("read_input_registers", 10, 4)
+    await calls.write("write_register", 20, 7)
+
+def test_calls_pass_count_and_unit_as_keywords():
+    import asyncio
+    client = KeywordOnlyClient()
+    calls = ModbusCalls(client, 3)
+    asyncio.run(_run(calls))
+    assert client.calls == [("read_input_registers", 10, 4, 3), ("write_register", 20, 7, 3)]
+    assert calls.write_registers is None
+
+class V2Client:
+    """pymodbus 2.x: unit id travels in **kwargs."""
+    def read_input_registers(self, address, count=1, **kwargs):
+        return ("v2", address, count, kwargs)
+
+class V30Client:
+    """pymodbus 3.0 - 3.6: slave= next to **kwargs."""
+    def read_input_registers(self, address, count=1, slave=0, **kwargs):
+        return ("v3.0", address, count, slave)
+
+class V310Client:
+    """pymodbus 3.10+: device_id= keyword-only."""
+    def read_input_registers(self, address, *, count=1, device_id=1, no_response_expected=False):
+        return ("v3.10", address, count, device_id)
+
+class WrappingClient:
+    """A proxy with a **kwargs signature forwarding to a 3.10 client."""
+    def __init__(self):
+        self._inner = V310Client()
+
+    def read_input_registers(self, address, count=1, **kwargs):
+        return self._inner.read_input_registers(address, count=count, device_id=kwargs.pop("device_id", 1))
+
+class NoUnitClient:
+    def read_input_registers(self, address, count=1):
+        return ("none", address, count)
+
+@pytest.mark.parametrize("client, kw, expected", [
+    (V2Client(), "unit", ("v2", 5, 2, {"unit": 9})),
+    (V30Client(), "slave", ("v3.0", 5, 2, 9)),
+    (KeywordOnlyClient(), "slave", None),
+    (V310Client(), "device_id", ("v3.10", 5, 2, 9)),
+    (WrappingClient(), "device_id", ("v3.10", 5, 2, 9)),
+    (NoUnitClient(), None, ("none", 5, 2)),
+])
+def test_unit_keyword_per_api_generation(client, kw, expected):
+    assert unit_kwarg(client, "read_input_registers") == kw
+    if expected is not None:
+        assert ModbusCalls(client, 9).read("read_input_registers", 5, 2) == expected
+
+def test_kwargs_signature_does_not_follow_the_installed_pymodbus(monkeypatch):
+    from custom_components.Growatt_modbus import compat
+    monkeypatch.setattr(compat, "_kw_from_version", lambda: "device_id")
+    class OtherV2Client(V2Client):
+        pass
+    assert unit_kwarg(OtherV2Client(), "read_input_registers") == "unit"
@@ -0,0 +1,18 @@
+import asyncio, logging
+
+import pytest
+
+pytest.importorskip("pymodbus")
+
+from custom_components.Growatt_modbus.connection import acquire_link, async_release_link  # noqa: E402
+
+def test_second_entry_with_other_link_settings_is_warned(caplog):
+    first = acquire_link("tcp", "gateway.test", 502, depth=4, native=True)
+    with caplog.at_level(logging.WARNING):
+        same = acquire_link("TCP", "Gateway.test", 502, depth=4, native=True)
+        assert not [r for r in caplog.records if r.levelno >= logging.WARNING]
+        other = acquire_link("tcp", "gateway.test", 502, depth=1, native=False)
+    assert first is same is other and (first.depth, first.native) == (4, True)
+    assert "pipeline depth 4; ignoring 1" in caplog.text and "native framing True; ignoring False" in caplog.text
+    for link in (first, same, other):
+        asyncio.run(async_release_link(link))
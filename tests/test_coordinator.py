@@ -0,0 +1,133 @@
+"""Coordinator tests; need Home Assistant and its pytest plugin (pytest-homeassistant-custom-component)."""
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.helpers.update_coordinator import UpdateFailed  # noqa: E402
+
+from custom_components.Growatt_modbus import coordinator as coordinator_module  # noqa: E402
+from custom_components.Growatt_modbus.coordinator import GrowattModbusCoordinator  # noqa: E402
+from custom_components.Growatt_modbus.mapping import RegisterDef  # noqa: E402
+from custom_components.Growatt_modbus.rawlog import RawRecorder  # noqa: E402
+
+class Response:
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+class FakeClient:
+    """Answers from register dicts; down=True behaves like an unreachable gateway."""
+    def __init__(self, inputs, holdings):
+        self.inputs = inputs; self.holdings = holdings; self.down = False; self.reads = []
+
+    @property
+    def connected(self):
+        return not self.down
+
+    def _read(self, bank, address, count):
+        if self.down:
+            raise ConnectionError("gateway unreachable")
+        self.reads.append((address, count))
+        return Response([bank.get(address + i, 0) for i in range(count)])
+
+    async def read_input_registers(self, address, count=1, slave=1):
+        return self._read(self.inputs, address, count)
+
+    async def read_holding_registers(self, address, count=1, slave=1):
+        return self._read(self.holdings, address, count)
+
+    async def write_register(self, address, value, slave=1):
+        self.holdings[address] = value
+        return Response([value])
+
+class FakeLink:
+    depth = 1; native = False; connects = 1; refs = 1; queued = 0
+
+    def __init__(self, client):
+        self.client = client; self.wait_ms_max = {}
+
+    @property
+    def connected(self):
+        return self.client.connected
+
+    async def ensure_connected(self):
+        return self.client
+
+    @asynccontextmanager
+    async def transaction(self, priority=10):
+        yield self.client
+
+@pytest.fixture
+def link(monkeypatch):
+    link = FakeLink(FakeClient({3: 997}, {3049: 1}))
+    monkeypatch.setattr(coordinator_module, "acquire_link", lambda *a, **kw: link)
+    return link
+
+REGISTERS = [RegisterDef("PV1 voltage", "pv1_voltage", "input", 3, 1, 0.1),
+             RegisterDef("Grid charge", "rb_grid_charge", "holding", 3049)]
+
+@pytest.mark.parametrize("hold_resync", [300, 0])
+async def test_first_holding_read_is_retried_after_link_failure(hass, link, hold_resync):
+    coord = GrowattModbusCoordinator(hass, "gateway", 502, 1, REGISTERS, 10, hold_resync=hold_resync)
+    link.client.down = True
+    with pytest.raises(UpdateFailed):
+        await coord._async_update_data()
+    link.client.down = False
+    data = await coord._async_update_data()
+    assert data["pv1_voltage"] == pytest.approx(99.7)
+    assert data["rb_grid_charge"] == 1
+    # read once it worked; not again on the following cycle
+    link.client.reads.clear()
+    await coord._async_update_data()
+    assert (3049, 1) not in link.client.reads
+
+@pytest.mark.parametrize(("now", "expected"), [
+    (1003.0, 1003.33),  # before the phase: later in this interval
+    (1003.9, 1013.33),  # poll ended within its phase's second
+    (1004.1, 1013.33),  # poll ran past the phase's second: still the very next slot
+    (1013.33, 1023.33),  # exactly on the slot: the following one
+])
+async def test_units_keep_their_poll_phase_on_every_reschedule(hass, link, monkeypatch, now, expected):
+    coord = GrowattModbusCoordinator(hass, "gateway", 502, 2, REGISTERS, 10, unit_key="u2")
+    coord.poll_phase = 3.33
+    with monkeypatch.context() as m:
+        m.setattr(hass.loop, "time", lambda: now)
+        coord._schedule_refresh()
+    assert int(now) + coord._microsecond + 10 == pytest.approx(expected)
+    coord._async_unsub_refresh()
+
+async def test_readback_of_a_partly_written_register_is_not_a_mismatch(hass, link, caplog):
+    link.client.holdings.update({3050: 1, 3051: 2})
+    regs = REGISTERS + [RegisterDef("Limit", "rb_limit", "holding", 3050, 2)]
+    coord = GrowattModbusCoordinator(hass, "gateway", 502, 1, regs, 10)
+    coord.data = await coord._async_update_data()
+    assert coord.data["rb_limit"] == 0x10002
+    link.client.reads.clear()
+    assert await coord.write_single_register(3051, 5)  # low word only: no expected value for the u32
+    assert (3050, 2) in link.client.reads  # read back as a whole, though the write started inside it
+    assert coord.data["rb_limit"] == 0x10005
+    assert "differs from written" not in caplog.text
+
+async def test_stored_plan_is_not_reused_after_an_address_offset_change(hass, link):
+    first = GrowattModbusCoordinator(hass, "gateway", 502, 1, REGISTERS, 10)
+    shifted = GrowattModbusCoordinator(hass, "gateway", 502, 1, REGISTERS, 10, address_offset=1)
+    bits = GrowattModbusCoordinator(hass, "gateway", 502, 1, REGISTERS + [
+        RegisterDef("Charging", "charging", "bitfield", 3049, parent="rb_grid_charge", mask=0x1, binary=True)], 10)
+    assert len({first.fingerprint, shifted.fingerprint, bits.fingerprint}) == 3
+
+async def test_raw_log_replays_for_an_entry_with_an_address_offset(hass, monkeypatch, tmp_path):
+    device = FakeLink(FakeClient({2: 997}, {3048: 1}))  # map address - 1 on the wire
+    path = str(tmp_path / "raw.gwr")
+    recorder = RawRecorder(path)
+    with monkeypatch.context() as m:
+        m.setattr(coordinator_module, "acquire_link", lambda *a, **kw: device)
+        await GrowattModbusCoordinator(hass, "gateway", 502, 1, REGISTERS, 10, address_offset=1, recorder=recorder)._async_update_data()
+    recorder.commit(); recorder.flush(recorder.take())
+    replay = GrowattModbusCoordinator(hass, path, 0, 1, REGISTERS, 10, transport="replay", address_offset=1)
+    data = await replay._async_update_data()
+    await replay.async_close()
+    assert data["pv1_voltage"] == pytest.approx(99.7) and data["rb_grid_charge"] == 1
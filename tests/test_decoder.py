@@ -0,0 +1,52 @@
+import struct
+
+from custom_components.Growatt_modbus.decoder import WindowLayout, decode_bits, decode_value, raw_value
+from custom_components.Growatt_modbus.mapping import RegisterDef
+from custom_components.Growatt_modbus.planner import ReadWindow
+
+def reg(uid, address, count=1, **kw):
+    return RegisterDef(uid, uid, "input", address, count, **kw)
+
+def layout(regs, start, count, bitfields=None):
+    return WindowLayout(ReadWindow("input", start, count, tuple(regs)), bitfields)
+
+def test_window_decodes_types_scale_and_word_order():
+    regs = [reg("u16", 0, scale=0.1), reg("s16", 1, signed=True), reg("u32", 2, 2),
+            reg("swapped", 4, 2, word_order="low_high"), reg("f32", 6, 2, data_type="float32")]
+    words = [1234, 0xFFFE, 0x0001, 0x0002, 0x0002, 0x0001] + list(struct.unpack(">2H", struct.pack(">f", 1.5)))
+    out = {}
+    layout(regs, 0, 8).decode(struct.pack(">8H", *words), out)
+    assert out == {"u16": 123.4, "s16": -2, "u32": 0x10002, "swapped": 0x10002, "f32": 1.5}
+
+def test_gaps_and_shared_addresses():
+    regs = [reg("a", 10), reg("b", 13), reg("b_scaled", 13, scale=10)]
+    out = {}
+    layout(regs, 10, 4).decode_registers([7, 0, 0, 9], out)
+    assert out == {"a": 7, "b": 9, "b_scaled": 90}
+
+def test_short_buffer_gives_none_for_every_register():
+    out = {}
+    layout([reg("a", 0), reg("b", 1)], 0, 2).decode(b"\x00\x01", out)
+    assert out == {"a": None, "b": None}
+
+def test_memoryview_buffer():
+    lay = layout([reg("a", 0), reg("b", 1)], 0, 2)
+    lay.buf[:] = struct.pack(">2H", 5, 6)
+    out = {}
+    lay.decode(memoryview(lay.buf), out)
+    assert out == {"a": 5, "b": 6}
+
+def test_bitfields_from_the_parent_word():
+    parent = reg("status", 0)
+    children = [RegisterDef("Fault", "fault", "bitfield", 0, parent="status", mask=0x1, binary=True),
+                RegisterDef("Mode", "mode", "bitfield", 0, parent="status", mask=0xF0, shift=4)]
+    out = {}
+    layout([parent], 0, 1, {"status": children}).decode(struct.pack(">H", 0x31), out)
+    assert out == {"status": 0x31, "fault": True, "mode": 3.0}
+    assert decode_bits(children, 0x20) == {"fault": False, "mode": 2.0}
+
+def test_write_through_helpers():
+    assert raw_value([0x0001, 0x0002]) == 0x10002
+    assert raw_value([0x0002, 0x0001], "low_high") == 0x10002
+    assert decode_value(reg("v", 0, 2, signed=True), [0xFFFF, 0xFFFF]) == -1
+    assert decode_value(reg("v", 0, 2), [1]) is None
@@ -0,0 +1,154 @@
+import asyncio, os, struct, sys, time
+
+import pytest
+
+from custom_components.Growatt_modbus.framer import (
+    ModbusExceptionResponse, ModbusFrameError, NativeModbusClient, SerialRtuClient, crc16, serial_timing)
+
+@pytest.fixture(autouse=True)
+def loopback(request):
+    """Home Assistant's pytest plugin blocks sockets (pytest-socket); these tests talk to a local server."""
+    if request.config.pluginmanager.hasplugin("socket"):
+        request.getfixturevalue("socket_enabled")
+
+def test_crc16_reference_frame():
+    # read holding 0x0000 x 2 on unit 1: the CRC bytes on the wire are C4 0B
+    assert struct.pack("<H", crc16(bytes.fromhex("010300000002"))) == bytes.fromhex("c40b")
+
+def test_serial_timing():
+    t = serial_timing({"baudrate": 9600})
+    assert t.char_s == pytest.approx(10 / 9600)
+    assert t.gap_s == pytest.approx(3.5 * 10 / 9600)
+    assert serial_timing({"baudrate": 9600, "parity": "E"}).char_s == pytest.approx(11 / 9600)
+    assert serial_timing({"baudrate": 115200}).gap_s == pytest.approx(0.00175)
+    assert t.timeout(8, 255) < 1.0
+
+async def _server(framing, respond):
+    async def handle(reader, writer):
+        try:
+            while True:
+                req = await reader.readexactly(12 if framing == "tcp" else 8)
+                for chunk in respond(req):
+                    writer.write(chunk); await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+def _tcp_reply(req):
+    tid, _, _, unit, fc, address, count = struct.unpack(">HHHBBHH", req)
+    if address >= 100:
+        pdu = bytes((fc | 0x80, 2))
+    else:
+        pdu = struct.pack(f">BB{count}H", fc, count * 2, *range(address, address + count))
+    frame = struct.pack(">HHHB", tid, 0, len(pdu) + 1, unit) + pdu
+    return [frame[:5], frame[5:]]  # split across segments
+
+def test_tcp_read_into_and_exception():
+    async def run():
+        server, port = await _server("tcp", _tcp_reply)
+        client = NativeModbusClient("127.0.0.1", port, "tcp", timeout=2)
+        await client.connect()
+        buf = bytearray(8)
+        view = await client.read_into(4, 1, 10, 4, buf)
+        assert view.obj is buf and struct.unpack(">4H", view) == (10, 11, 12, 13)
+        views = await asyncio.gather(*(client.read_into(3, 1, a, 2, bytearray(4)) for a in range(5)))
+        assert [struct.unpack(">2H", v) for v in views] == [(a, a + 1) for a in range(5)]
+        with pytest.raises(ModbusExceptionResponse) as err:
+            await client.read_into(3, 1, 120, 1, bytearray(2))
+        assert err.value.exception_code == 2
+        client.close(); server.close()
+    asyncio.run(run())
+
+def test_rtu_over_tcp_rejects_bad_crc():
+    def reply(req):
+        unit, fc, address, count = struct.unpack(">BBHH", req[:6])
+        frame = struct.pack(f">BBB{count}H", unit, fc, count * 2, *range(count))
+        crc = crc16(frame) ^ (0xFFFF if address == 99 else 0)
+        return [frame + struct.pack("<H", crc)]
+    async def run():
+        server, port = await _server("rtu", reply)
+        client = NativeModbusClient("127.0.0.1", port, "rtu", timeout=2)
+        await client.connect()
+        assert struct.unpack(">3H", await client.read_into(3, 1, 0, 3, bytearray(6))) == (0, 1, 2)
+        with pytest.raises(ModbusFrameError):
+            await client.read_into(3, 1, 99, 1, bytearray(2))
+        client.close(); server.close()
+    asyncio.run(run())
+
+def test_tcp_writes_and_pymodbus_calls_share_the_socket():
+    bank = {}
+    async def handle(reader, writer):
+        try:
+            while True:
+                tid, _, length, unit = struct.unpack(">HHHB", await reader.readexactly(7))
+                pdu = await reader.readexactly(length - 1)
+                fc, address, n = struct.unpack(">BHH", pdu[:5])
+                if fc == 6:
+                    bank[address] = n
+                elif fc == 16:
+                    bank.update(zip(range(address, address + n), struct.unpack(f">{n}H", pdu[6:])))
+                elif fc == 3:
+                    pdu = struct.pack(f">BB{n}H", 3, 2 * n, *(bank.get(address + i, 0) for i in range(n)))
+                reply = pdu[:5] if fc in (5, 6, 16) else pdu
+                writer.write(struct.pack(">HHHB", tid, 0, len(reply) + 1, unit) + reply)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+    async def run():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        client = NativeModbusClient("127.0.0.1", server.sockets[0].getsockname()[1], "tcp", timeout=2)
+        await client.connect()
+        assert not (await client.write_register(3000, 7, unit=1)).isError()
+        assert not (await client.write_registers(3001, [1, 2], slave=1)).isError()
+        rr = await client.read_holding_registers(3000, 3, device_id=1)
+        assert rr.registers == [7, 1, 2]
+        client.close(); server.close()
+    asyncio.run(run())
+
+def _rtu(unit, pdu):
+    frame = bytes((unit,)) + pdu
+    return frame + struct.pack("<H", crc16(frame))
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs a POSIX pty")
+def test_serial_rtu_over_pty():
+    """The device end of a pty pair answers: framing, CRC, foreign units, t3.5 before each request, timeout."""
+    async def run():
+        loop = asyncio.get_running_loop()
+        master, slave = os.openpty(); path = os.ttyname(slave)
+        os.set_blocking(master, False)
+        requests, rx = asyncio.Queue(), bytearray()
+        def readable():
+            rx.extend(os.read(master, 512))
+            while len(rx) >= 8:
+                requests.put_nowait((time.monotonic(), bytes(rx[:8]))); del rx[:8]
+        loop.add_reader(master, readable)
+        client = SerialRtuClient(path, {"baudrate": 9600})
+        gap = serial_timing({"baudrate": 9600}).gap_s
+        await client.connect()
+        try:
+            async def device(*replies):
+                at, req = await requests.get()
+                for reply in replies:
+                    os.write(master, reply)
+                return at, req, time.monotonic()
+            dev = asyncio.create_task(device(_rtu(3, bytes.fromhex("030400010002")), _rtu(1, bytes.fromhex("040400070008"))))
+            view = await client.read_into(4, 1, 3000, 2, bytearray(4))
+            _, req, replied = await dev
+            assert req == _rtu(1, struct.pack(">BHH", 4, 3000, 2))  # address, pdu, CRC low byte first
+            assert struct.unpack(">2H", view) == (7, 8)  # unit 3's frame on the bus was skipped
+            dev = asyncio.create_task(device(_rtu(1, bytes.fromhex("030400070008"))[:-1] + b"\x00"))
+            with pytest.raises(ModbusFrameError):
+                await client.read_into(3, 1, 0, 2, bytearray(4))
+            at, _, _ = await dev
+            assert at - replied >= gap  # t3.5 of silence before the next request
+            dev = asyncio.create_task(device())
+            started = time.monotonic()
+            with pytest.raises(asyncio.TimeoutError):
+                await client.read_into(3, 1, 0, 1, bytearray(2))
+            assert time.monotonic() - started < 1.0  # timeout from the line timing, not a fixed seconds-long one
+            await dev
+        finally:
+            loop.remove_reader(master); client.close(); os.close(master); os.close(slave)
+    asyncio.run(run())
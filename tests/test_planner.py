@@ -0,0 +1,74 @@
+from custom_components.Growatt_modbus.mapping import RegisterDef
+from custom_components.Growatt_modbus.planner import LinkCost, PollGroup, group_by_interval, link_cost, plan_windows
+
+def reg(uid, address, count=1, **kw):
+    return RegisterDef(uid, uid, kw.pop("register_type", "input"), address, count, **kw)
+
+def spans(windows):
+    return [(w.start, w.count) for w in windows]
+
+def test_close_registers_share_a_window():
+    windows = plan_windows([reg("a", 0), reg("b", 2, 2), reg("c", 5)], "input", LinkCost(15.0, 0.02))
+    assert spans(windows) == [(0, 6)]
+    assert [r.unique_id for r in windows[0].registers] == ["a", "b", "c"]
+
+def test_gap_is_split_when_reading_it_costs_more_than_a_round_trip():
+    cost = LinkCost(10.0, 1.0)  # a 20 word gap costs 20 ms, a second request 10 ms
+    assert spans(plan_windows([reg("a", 0), reg("b", 21)], "input", cost)) == [(0, 1), (21, 1)]
+    assert spans(plan_windows([reg("a", 0), reg("b", 5)], "input", cost)) == [(0, 6)]
+
+def test_window_size_limit():
+    regs = [reg(f"r{i}", i) for i in range(10)]
+    windows = plan_windows(regs, "input", LinkCost(100.0, 0.01), max_count=4)
+    assert all(w.count <= 4 for w in windows)
+    assert sum(w.count for w in windows) == 10
+
+def test_overlapping_registers_are_read_together():
+    windows = plan_windows([reg("wide", 10, 2), reg("low", 11)], "input", LinkCost(15.0, 0.02), max_count=1)
+    assert spans(windows) == [(10, 2)]
+
+def test_serial_cost_scales_with_baudrate():
+    slow, fast = link_cost("rtutcp", 9600), link_cost("rtutcp", 115200)
+    assert slow.word_ms > fast.word_ms > link_cost("tcp").word_ms
+
+def test_group_by_interval_folds_fast_tiers_into_every_cycle():
+    groups = group_by_interval([reg("a", 0), reg("b", 1, poll_tier="slow"), reg("c", 2, poll_interval=5)], 10)
+    assert sorted(groups) == [0.0, 300.0]
+    assert [r.unique_id for r in groups[0.0]] == ["a", "c"]
+
+def test_poll_group_due():
+    g = PollGroup(30.0, [])
+    assert g.due(100.0)
+    g.mark_read(100.0)
+    assert not g.due(120.0) and g.due(125.0, slack=5.0)
+
+def crosses(w, block=125, origin=0):
+    return (w.start - origin) // block != (w.end - 1 - origin) // block
+
+def test_windows_stay_inside_the_device_read_blocks():
+    regs = [reg(f"lo{a}", a) for a in (120, 122, 124, 125, 127, 130)] + \
+           [reg(f"hi{a}", a, register_type="holding") for a in (3051, 3100, 3124, 3125, 3138)]
+    cheap_gaps = LinkCost(100.0, 0.01)  # would otherwise merge everything
+    low = plan_windows([r for r in regs if r.register_type == "input"], "input", cheap_gaps)
+    high = plan_windows([r for r in regs if r.register_type == "holding"], "holding", cheap_gaps)
+    assert spans(low) == [(120, 5), (125, 6)]
+    assert spans(high) == [(3051, 74), (3125, 14)]
+    assert not any(crosses(w) for w in low + high)
+
+def test_block_edges_follow_the_address_offset():
+    cost = LinkCost(100.0, 0.01)
+    # mapping addresses are one above the wire addresses: the edge sits between mapping 125 and 126
+    assert spans(plan_windows([reg("a", 124), reg("b", 125)], "input", cost, origin=1)) == [(124, 2)]
+    assert spans(plan_windows([reg("a", 125), reg("b", 126)], "input", cost, origin=1)) == [(125, 1), (126, 1)]
+    assert spans(plan_windows([reg("a", 124), reg("b", 125)], "input", cost)) == [(124, 1), (125, 1)]
+
+def test_a_span_straddling_an_edge_is_still_read():
+    assert spans(plan_windows([reg("u32", 124, 2)], "input", LinkCost(15.0, 0.02))) == [(124, 2)]
+
+def test_shipped_map_has_no_window_across_a_block():
+    from custom_components.Growatt_modbus.mapping import load_compiled_mapping
+    regs = load_compiled_mapping(None).sensors
+    for rtype in ("input", "holding"):
+        for cost in (link_cost("tcp"), link_cost("rtutcp", 9600)):
+            windows = plan_windows([r for r in regs if r.register_type == rtype], rtype, cost)
+            assert not any(crosses(w) for w in windows if len(w.registers) > 1), windows
@@ -0,0 +1,153 @@
+
+"""
+End-to-end poll benchmark: GrowattModbusCoordinator._async_update_data against the
+local simulator (tools/growatt_sim.py), across transports and mapping sizes.
+
+Reports cycles/s, Modbus transactions per cycle, p50/p99 cycle latency and the
+coordinator's CPU time per cycle (the simulator runs in its own thread, so its
+CPU is not counted).
+
+    python tools/bench_poll.py --cycles 200 --transport tcp --transport rtutcp --synthetic 0 --synthetic 200
+    python tools/bench_poll.py --cycles 50 --transport rtu --baud 9600
+    python tools/bench_poll.py --latency-ms 15 --jitter-ms 5 --json bench.json
+    python tools/bench_poll.py --replay /config/growatt_modbus_raw.<entry_id>.gwr --cycles 10000
+
+Transport rtu runs the simulator on a pseudo-terminal (serial port stand-in, Linux);
+--baud sets the line speed the coordinator uses and the simulator paces replies at.
+
+--replay feeds the coordinator from a raw log recorded by the integration (raw_log option)
+instead of the simulator, which benchmarks decoding offline at many times real time.
+
+Needs the integration's runtime dependencies (homeassistant, pymodbus).
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, statistics, sys, tempfile, threading, time
+from typing import Any, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE); sys.path.insert(0, os.path.dirname(HERE))
+
+from growatt_sim import Faults, GrowattSimulator, start_pty, start_server  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+from custom_components.Growatt_modbus.coordinator import GrowattModbusCoordinator  # noqa: E402
+from custom_components.Growatt_modbus.mapping import RegisterDef, load_compiled_mapping  # noqa: E402
+
+class SimulatorThread:
+    """Run the simulator on its own event loop so its CPU does not count against the coordinator."""
+    def __init__(self, sim: GrowattSimulator, framer: str) -> None:
+        self.sim = sim; self.framer = framer; self.host = "127.0.0.1"; self.port = 0; self.baudrate = 0
+        self._loop = asyncio.new_event_loop(); self._ready = threading.Event(); self._server = None; self._task = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        if self.framer == "pty":
+            self.host, self._task = self._loop.run_until_complete(start_pty(self.sim, self.baudrate))
+        else:
+            self._server = self._loop.run_until_complete(start_server(self.sim, framer=self.framer))
+            self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def __enter__(self) -> "SimulatorThread":
+        self._thread.start(); self._ready.wait(5); return self
+
+    def __exit__(self, *exc) -> None:
+        self._loop.call_soon_threadsafe(self._task.cancel if self._task else self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+def _pct(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+async def bench_one(hass: HomeAssistant, transport: str, synthetic: int, cycles: int, faults: Faults, baudrate: int = 0) -> Dict[str, Any]:
+    sim = GrowattSimulator(faults=faults, synthetic=synthetic)
+    registers = list(load_compiled_mapping(None).sensors) + [
+        RegisterDef(f"Synthetic {i}", f"syn_{i}", "input", 5000 + i * 2, 2, 0.1) for i in range(synthetic)
+    ]
+    srv = SimulatorThread(sim, {"tcp": "tcp", "rtu": "pty"}.get(transport, "rtu")); srv.baudrate = baudrate if transport == "rtu" else 0
+    with srv:
+        coord = GrowattModbusCoordinator(hass, srv.host, srv.port, 1, registers, 1, transport=transport,
+                                         serial_params={"baudrate": baudrate} if baudrate else None)
+        try:
+            coord.data = await coord._async_update_data()  # connect + first (holding) cycle
+            sim.stats.reset()
+            wall: List[float] = []; cpu: List[float] = []
+            started = time.perf_counter()
+            for _ in range(cycles):
+                t0 = time.perf_counter(); c0 = time.thread_time()
+                coord.data = await coord._async_update_data()
+                cpu.append(time.thread_time() - c0); wall.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - started
+        finally:
+            await coord.async_close()
+    return {
+        "transport": transport, "registers": len(registers), "cycles": cycles,
+        "cycles_per_s": cycles / elapsed if elapsed else 0.0,
+        "tx_per_cycle": sim.stats.requests / cycles, "words_per_cycle": sim.stats.registers / cycles,
+        "p50_ms": _pct(wall, 50) * 1000, "p99_ms": _pct(wall, 99) * 1000,
+        "cpu_ms_per_cycle": statistics.fmean(cpu) * 1000,
+    }
+
+async def bench_replay(hass: HomeAssistant, path: str, mapping: str | None, cycles: int, address_offset: int = 0) -> Dict[str, Any]:
+    registers = list(load_compiled_mapping(mapping).sensors)
+    coord = GrowattModbusCoordinator(hass, path, 0, 1, registers, 1, transport="replay", address_offset=address_offset)
+    try:
+        coord.data = await coord._async_update_data()
+        wall: List[float] = []; cpu: List[float] = []
+        started = time.perf_counter()
+        for _ in range(cycles):
+            t0 = time.perf_counter(); c0 = time.thread_time()
+            coord.data = await coord._async_update_data()
+            cpu.append(time.thread_time() - c0); wall.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    finally:
+        await coord.async_close()
+    m = coord.metrics
+    return {
+        "transport": "replay", "registers": len(registers), "cycles": cycles,
+        "cycles_per_s": cycles / elapsed if elapsed else 0.0,
+        "tx_per_cycle": float(m.tx_last), "words_per_cycle": float(m.registers_last),
+        "p50_ms": _pct(wall, 50) * 1000, "p99_ms": _pct(wall, 99) * 1000,
+        "cpu_ms_per_cycle": statistics.fmean(cpu) * 1000,
+    }
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    faults = Faults(args.latency_ms, args.jitter_ms, args.drop, args.exception)
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        if args.replay:
+            return [await bench_replay(hass, args.replay, args.mapping, args.cycles, args.address_offset)]
+        results = []
+        for transport in args.transport or ["tcp", "rtutcp"]:
+            for synthetic in args.synthetic or [0]:
+                results.append(await bench_one(hass, transport, synthetic, args.cycles, faults, args.baud))
+        return results
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--cycles", type=int, default=100)
+    p.add_argument("--transport", action="append", choices=("tcp", "rtutcp", "rtu"))
+    p.add_argument("--baud", type=int, default=0, help="serial line speed for rtutcp/rtu (rtu: the pty simulator paces replies at it)")
+    p.add_argument("--synthetic", type=int, action="append", help="extra u32 input registers (mapping size)")
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--drop", type=float, default=0.0)
+    p.add_argument("--exception", type=float, default=0.0)
+    p.add_argument("--replay", help="raw log to replay instead of running the simulator")
+    p.add_argument("--mapping", help="mapping for --replay (default: embedded map.yaml)")
+    p.add_argument("--address-offset", type=int, default=0, help="address_offset of the entry that recorded the --replay log")
+    p.add_argument("--json", help="also write results to this file")
+    args = p.parse_args()
+    results = asyncio.run(run(args))
+    cols = ("transport", "registers", "cycles_per_s", "tx_per_cycle", "words_per_cycle", "p50_ms", "p99_ms", "cpu_ms_per_cycle")
+    print(" ".join(f"{c:>16}" for c in cols))
+    for r in results:
+        print(" ".join(f"{r[c]:>16.2f}" if isinstance(r[c], float) else f"{r[c]:>16}" for c in cols))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+
+"""
+Register discovery from the command line: scans input/holding address ranges through
+the coordinator's read path (same transport, unit id and address offset handling as the
+integration), bisects around illegal-address errors and writes a skeleton map.yaml
+with the readable ranges, per-range read latency and the cheapest read plan.
+
+    python tools/growatt_discover.py 192.168.1.50 --out discovered.yaml
+    python tools/growatt_discover.py 192.168.1.60 --port 8899 --transport rtutcp --type input --last 1249
+    python tools/growatt_discover.py 127.0.0.1 --port 5020 --max-gap-step 1   # exhaustive, against tools/growatt_sim.py
+
+Needs the integration's runtime dependencies (homeassistant, pymodbus).
+"""
+from __future__ import annotations
+import argparse, asyncio, logging, os, sys, tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+from custom_components.Growatt_modbus.coordinator import GrowattModbusCoordinator  # noqa: E402
+
+async def run(args: argparse.Namespace) -> str:
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        coord = GrowattModbusCoordinator(
+            hass, args.host, args.port, args.unit, [], 10, transport=args.transport,
+            serial_params={"baudrate": args.baudrate}, address_offset=args.address_offset,
+            max_read_registers=args.max_read,
+        )
+        try:
+            types = ["input", "holding"] if args.type == "both" else [args.type]
+            return await coord.discover(types, args.first, args.last, args.max_gap_step)
+        finally:
+            await coord.async_close()
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("host")
+    p.add_argument("--port", type=int, default=502)
+    p.add_argument("--unit", type=int, default=1)
+    p.add_argument("--transport", choices=("tcp", "rtutcp"), default="tcp")
+    p.add_argument("--baudrate", type=int, default=9600)
+    p.add_argument("--address-offset", type=int, default=0)
+    p.add_argument("--type", choices=("both", "input", "holding"), default="both")
+    p.add_argument("--first", type=int, default=0)
+    p.add_argument("--last", type=int, default=3249)
+    p.add_argument("--max-read", type=int, default=125, help="largest window to try (and to plan with)")
+    p.add_argument("--max-gap-step", type=int, default=16, help="largest jump over unreadable addresses (1 = exhaustive)")
+    p.add_argument("--out", help="write the skeleton here instead of stdout")
+    p.add_argument("-v", "--verbose", action="store_true")
+    args = p.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    text = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+if __name__ == "__main__":
+    main()
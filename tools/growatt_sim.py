@@ -0,0 +1,274 @@
+
+"""
+Simulated Growatt MOD/MID Modbus slave for local development and benchmarks.
+
+Serves Modbus TCP (MBAP) or RTU-over-TCP framing on one port, or RTU on a
+pseudo-terminal standing in for a serial port (point the rtu transport at the
+printed path), with register banks populated from a map.yaml and values that
+drift every second. Faults can be injected per request: latency + jitter,
+dropped frames, exception responses, and address ranges that answer
+"illegal data address". On the pty, --baud delays each reply by the wire time
+of request + reply at that baud rate.
+
+    python tools/growatt_sim.py --port 5020 --framer tcp --latency-ms 20 --jitter-ms 5
+    python tools/growatt_sim.py --port 5021 --framer rtu --drop 0.01 --illegal input:118-118
+    python tools/growatt_sim.py --framer pty --baud 9600 --latency-ms 20
+"""
+from __future__ import annotations
+import argparse, asyncio, logging, os, random, struct, time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+_LOGGER = logging.getLogger("growatt_sim")
+EMBEDDED_MAP = os.path.join(os.path.dirname(__file__), "..", "custom_components", "Growatt_modbus", "map.yaml")
+
+ILLEGAL_FUNCTION = 1
+ILLEGAL_ADDRESS = 2
+ILLEGAL_VALUE = 3
+DEVICE_FAILURE = 4
+
+def crc16(data: bytes) -> int:
+    crc = 0xFFFF
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+def with_crc(frame: bytes) -> bytes:
+    return frame + struct.pack("<H", crc16(frame))
+
+@dataclass
+class Faults:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    drop: float = 0.0  # probability a request gets no answer
+    exception: float = 0.0  # probability of a DEVICE_FAILURE exception response
+    illegal: List[Tuple[str, int, int]] = field(default_factory=list)  # (bank, first, last)
+    max_read: int = 125
+
+@dataclass
+class Stats:
+    requests: int = 0
+    reads: int = 0
+    writes: int = 0
+    registers: int = 0
+    dropped: int = 0
+    exceptions: int = 0
+
+    def reset(self) -> None:
+        self.__init__()
+
+class GrowattSimulator:
+    """Register banks + request handling, independent of the framing."""
+    def __init__(self, mapping_path: str = EMBEDDED_MAP, unit_ids: Tuple[int, ...] = (1,), faults: Optional[Faults] = None, synthetic: int = 0, seed: int = 1) -> None:
+        self.unit_ids = set(unit_ids); self.faults = faults or Faults(); self.stats = Stats()
+        self.banks: Dict[str, Dict[int, int]] = {"input": {}, "holding": {}}
+        self._rng = random.Random(seed); self._live: List[Tuple[str, int, int, bool]] = []
+        self._last_tick = time.monotonic()
+        self.load_mapping(mapping_path, synthetic)
+
+    def load_mapping(self, path: str, synthetic: int = 0) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        for s in data.get("sensors", []) or []:
+            if s.get("register_type") == "derived":
+                continue
+            self._seed_register(s.get("register_type", "input"), int(s["address"]), int(s.get("count", 1)), str(s.get("device_class") or ""))
+        for c in data.get("controls", []) or []:
+            if c.get("register_type", "holding") != "holding":
+                continue
+            if "base_address" in c:
+                v = int(c["options"][0]["value"]) if c.get("options") else 0
+                self.banks["holding"][int(c["base_address"])] = v & 0xFFFF  # low_high: low word first
+                self.banks["holding"][int(c["base_address"]) + 1] = (v >> 16) & 0xFFFF
+            else:
+                self.banks["holding"][int(c["address"])] = int(c.get("min", c.get("off_value", 0)))
+        # synthetic registers for mapping-size benchmarks, placed after the real map
+        for i in range(synthetic):
+            self._seed_register("input", 5000 + i * 2, 2, "power")
+
+    def _seed_register(self, bank: str, address: int, count: int, device_class: str) -> None:
+        counter = device_class == "energy"
+        value = self._rng.randint(1000, 50000) if counter else self._rng.randint(0, 5000)
+        self._write_value(bank, address, count, value)
+        self._live.append((bank, address, count, counter))
+
+    def _write_value(self, bank: str, address: int, count: int, value: int) -> None:
+        regs = self.banks[bank]
+        for i in range(count):
+            regs[address + i] = (value >> (16 * (count - 1 - i))) & 0xFFFF
+
+    def _read_value(self, bank: str, address: int, count: int) -> int:
+        v = 0
+        for i in range(count):
+            v = (v << 16) | self.banks[bank].get(address + i, 0)
+        return v
+
+    def tick(self) -> None:
+        """Let values drift: counters grow, everything else random-walks."""
+        now = time.monotonic()
+        if now - self._last_tick < 1.0:
+            return
+        self._last_tick = now
+        for bank, address, count, counter in self._live:
+            v = self._read_value(bank, address, count)
+            v = v + self._rng.randint(0, 3) if counter else max(0, v + self._rng.randint(-50, 50))
+            self._write_value(bank, address, count, min(v, (1 << (16 * count)) - 1))
+
+    def _illegal(self, bank: str, address: int, count: int) -> bool:
+        return any(b == bank and address <= last and address + count - 1 >= first for b, first, last in self.faults.illegal)
+
+    async def handle(self, unit: int, pdu: bytes) -> Optional[bytes]:
+        """Answer one request PDU; None means the frame is dropped (no reply)."""
+        st = self.stats; f = self.faults; st.requests += 1
+        if f.latency_ms or f.jitter_ms:
+            await asyncio.sleep(max(0.0, f.latency_ms + self._rng.uniform(-f.jitter_ms, f.jitter_ms)) / 1000.0)
+        if unit not in self.unit_ids and unit != 0:
+            st.dropped += 1; return None
+        if f.drop and self._rng.random() < f.drop:
+            st.dropped += 1; return None
+        fc = pdu[0]
+        if f.exception and self._rng.random() < f.exception:
+            st.exceptions += 1; return bytes((fc | 0x80, DEVICE_FAILURE))
+        self.tick()
+        try:
+            if fc in (3, 4):
+                address, count = struct.unpack(">HH", pdu[1:5]); bank = "holding" if fc == 3 else "input"
+                if not 1 <= count <= f.max_read:
+                    st.exceptions += 1; return bytes((fc | 0x80, ILLEGAL_VALUE))
+                if self._illegal(bank, address, count):
+                    st.exceptions += 1; return bytes((fc | 0x80, ILLEGAL_ADDRESS))
+                regs = self.banks[bank]
+                st.reads += 1; st.registers += count
+                return struct.pack(f">BB{count}H", fc, count * 2, *(regs.get(address + i, 0) for i in range(count)))
+            if fc == 6:
+                address, value = struct.unpack(">HH", pdu[1:5])
+                if self._illegal("holding", address, 1):
+                    st.exceptions += 1; return bytes((fc | 0x80, ILLEGAL_ADDRESS))
+                self.banks["holding"][address] = value; st.writes += 1
+                return pdu[:5]
+            if fc == 16:
+                address, count, nbytes = struct.unpack(">HHB", pdu[1:6])
+                if self._illegal("holding", address, count):
+                    st.exceptions += 1; return bytes((fc | 0x80, ILLEGAL_ADDRESS))
+                for i, v in enumerate(struct.unpack(f">{count}H", pdu[6:6 + nbytes])):
+                    self.banks["holding"][address + i] = v
+                st.writes += 1
+                return pdu[:5]
+            if fc == 5:
+                st.writes += 1
+                return pdu[:5]
+        except struct.error:
+            st.exceptions += 1; return bytes((fc | 0x80, ILLEGAL_VALUE))
+        st.exceptions += 1
+        return bytes((fc | 0x80, ILLEGAL_FUNCTION))
+
+async def _serve_tcp(sim: GrowattSimulator, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Modbus TCP: MBAP header (tid, pid, length, unit) + PDU."""
+    try:
+        while True:
+            header = await reader.readexactly(7)
+            tid, pid, length, unit = struct.unpack(">HHHB", header)
+            pdu = await reader.readexactly(length - 1)
+            reply = await sim.handle(unit, pdu)
+            if reply is not None:
+                writer.write(struct.pack(">HHHB", tid, pid, len(reply) + 1, unit) + reply)
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def _serve_rtu(sim: GrowattSimulator, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, char_s: float = 0.0) -> None:
+    """RTU framing over a byte stream (RTU-over-TCP gateways, or a pty for serial tests); char_s paces replies like a serial line."""
+    try:
+        while True:
+            head = await reader.readexactly(2)
+            if head[1] == 16:
+                rest = await reader.readexactly(5)
+                frame = head + rest + await reader.readexactly(rest[4] + 2)
+            else:
+                # FC 3/4/5/6 requests are 8 bytes; anything else is answered as illegal function
+                frame = head + await reader.readexactly(6 if head[1] in (3, 4, 5, 6) else 2)
+            if crc16(frame[:-2]) != struct.unpack("<H", frame[-2:])[0]:
+                _LOGGER.debug("CRC error, frame dropped"); sim.stats.dropped += 1
+                continue
+            reply = await sim.handle(frame[0], frame[1:-2])
+            if reply is not None:
+                if char_s:
+                    await asyncio.sleep((len(frame) + len(reply) + 3) * char_s)
+                writer.write(with_crc(bytes((frame[0],)) + reply))
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_server(sim: GrowattSimulator, host: str = "127.0.0.1", port: int = 0, framer: str = "tcp") -> asyncio.AbstractServer:
+    """Start serving; port 0 picks a free port (see server.sockets[0].getsockname())."""
+    handler = _serve_tcp if framer == "tcp" else _serve_rtu
+    return await asyncio.start_server(lambda r, w: handler(sim, r, w), host, port)
+
+async def start_pty(sim: GrowattSimulator, baudrate: int = 0) -> Tuple[str, asyncio.Task]:
+    """
+    Serve RTU on a new pseudo-terminal; returns the slave path (use it as the rtu transport's host)
+    and the serving task (cancel it to stop). baudrate > 0 paces replies at 11 bit times per byte.
+    """
+    import tty
+    loop = asyncio.get_running_loop()
+    master, slave = os.openpty(); tty.setraw(slave)  # the simulator keeps the slave open so the master never sees EIO
+    reader = asyncio.StreamReader()
+    rt, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(master, "rb", buffering=0))
+    wt, wp = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, os.fdopen(os.dup(master), "wb", buffering=0))
+    writer = asyncio.StreamWriter(wt, wp, reader, loop)
+    task = asyncio.ensure_future(_serve_rtu(sim, reader, writer, 11.0 / baudrate if baudrate else 0.0))
+    path = os.ttyname(slave)
+    def _closed(_task) -> None:
+        rt.close(); os.close(slave)
+    task.add_done_callback(_closed)
+    return path, task
+
+def _parse_illegal(spec: str) -> Tuple[str, int, int]:
+    bank, _, rng = spec.partition(":")
+    first, _, last = rng.partition("-")
+    return bank, int(first), int(last or first)
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=5020)
+    p.add_argument("--framer", choices=("tcp", "rtu", "pty"), default="tcp", help="tcp = Modbus TCP, rtu = RTU over TCP, pty = RTU on a pseudo-terminal")
+    p.add_argument("--baud", type=int, default=0, help="pty: pace replies at this baud rate (0 = instant)")
+    p.add_argument("--mapping", default=EMBEDDED_MAP)
+    p.add_argument("--unit", type=int, action="append", help="unit id(s) to answer (default 1)")
+    p.add_argument("--synthetic", type=int, default=0, help="extra synthetic u32 input registers")
+    p.add_argument("--latency-ms", type=float, default=0.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--drop", type=float, default=0.0)
+    p.add_argument("--exception", type=float, default=0.0)
+    p.add_argument("--illegal", action="append", default=[], help="bank:first-last answering illegal address, e.g. input:118-118")
+    a = p.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    faults = Faults(a.latency_ms, a.jitter_ms, a.drop, a.exception, [_parse_illegal(s) for s in a.illegal])
+    sim = GrowattSimulator(a.mapping, tuple(a.unit or [1]), faults, a.synthetic)
+
+    async def run() -> None:
+        if a.framer == "pty":
+            path, task = await start_pty(sim, a.baud)
+            _LOGGER.info("Growatt simulator (RTU) on %s", path)
+            await task
+            return
+        server = await start_server(sim, a.host, a.port, a.framer)
+        _LOGGER.info("Growatt simulator (%s) on %s", a.framer, server.sockets[0].getsockname())
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()